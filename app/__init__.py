@@ -1,18 +1,41 @@
 import os
 import instana  # 啟用 Instana 自動追蹤
 
-from flask import Flask, g, session
+from flask import Flask
+from werkzeug.local import LocalProxy
 from app.config import Config
-from app.database import db
-from app.models.user import User
+from app.database import db, is_sqlite_memory, QUEUE_POOL_OPTIONS
 
 
-def create_app():
+def create_app(config_overrides=None):
+    """
+    config_overrides：蓋掉 Config 的設定（seed.py / index_advisor.py 這類離線腳本用來關掉只有 server 該做的事）
+    """
     app = Flask(__name__, static_folder="static", template_folder="templates")
     app.config.from_object(Config)
+    app.config.update(config_overrides or {})
     app.config.setdefault("SECRET_KEY", "change-this-in-production")
-    # 初始化 DB
+    # 初始化 DB（QueuePool 換成會量「等連線時間」的版本，再掛上 pool event 收統計）
+    from app.services import pool_metrics_service
+    engine_options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    if is_sqlite_memory(app.config["SQLALCHEMY_DATABASE_URI"]):
+        # in-memory SQLite 由 Flask-SQLAlchemy 換成 StaticPool，QueuePool 的參數不能帶
+        for key in QUEUE_POOL_OPTIONS:
+            engine_options.pop(key, None)
+    else:
+        engine_options.setdefault("poolclass", pool_metrics_service.TimedQueuePool)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
     db.init_app(app)
+    with app.app_context():
+        pool_metrics_service.install(db.engine)
+
+        # 每個 request 的 SQL 次數 / DB 時間 / template 時間（Server-Timing header + 各 endpoint 統計）
+        from app.services import request_metrics_service
+        request_metrics_service.install(app, db.engine)
+
+        # slow query log：SQL 正規化成 fingerprint 累計次數 / p95 / max（給 index_advisor.py 用）
+        from app.services import slow_query_service
+        slow_query_service.install(app, db.engine)
 
     # 註冊藍圖
     from app.controllers.home_controller import home_bp
@@ -24,6 +47,8 @@ def create_app():
     from app.controllers.cart_controller import cart_bp
     from app.controllers.order_controller import order_bp
     from app.controllers.admin_order_controller import admin_order_bp
+    from app.controllers.admin_stats_controller import admin_stats_bp
+    from app.controllers.admin_metrics_controller import admin_metrics_bp
 
 
     app.register_blueprint(home_bp)
@@ -35,6 +60,8 @@ def create_app():
     app.register_blueprint(cart_bp)
     app.register_blueprint(order_bp)
     app.register_blueprint(admin_order_bp)
+    app.register_blueprint(admin_stats_bp)
+    app.register_blueprint(admin_metrics_bp)
 
 
     # 健康檢查
@@ -46,21 +73,27 @@ def create_app():
     with app.app_context():
         db.create_all() 
 
+        # 商品搜尋的倒排索引：啟動時全量建一次，之後 admin 改商品時增量更新
+        from app.services import search_service
+        search_service.build_index()
+
+        # 上次關機前還在 pending 的訂單，重新丟給背景金流 worker；之後每 PAYMENT_RECOVER_INTERVAL 秒再撿一次
+        # （只有 server 要做；離線腳本要傳 PAYMENT_RECOVER_ON_STARTUP=False，不然會順手把付款跑完。
+        #   多個 worker 同時啟動會撿到同一批，但 finalize 靠 pending → processing 原子搶單，只有一個會處理）
+        if app.config.get("PAYMENT_RECOVER_ON_STARTUP", True):
+            from app.services import payment_service
+            payment_service.recover_pending_orders()
+            payment_service.start_recovery_timer()
 
-    # ---- 每次 request 前載入 current_user ----
-    @app.before_request
-    def load_current_user():
-        user_id = session.get("user_id")
-        if user_id is None:
-            g.current_user = None
-        else:
-            g.current_user = User.query.get(user_id)
 
     # ---- 注入到 template（current_user / page_name） ----
+    # current_user 是 lazy proxy：template 真的用到才查（走 identity_service 快取）
+    from app.services import identity_service
+
     @app.context_processor
     def inject_common():
         return {
-            "current_user": getattr(g, "current_user", None),
+            "current_user": LocalProxy(identity_service.current_user),
             # 預設 page_name 讓 base.html 可以用，個別頁面也可以 override
             "page_name": None,
         }
@@ -15,15 +15,124 @@ class Config:
     # 這裡非常重要：把 @ 做 URL encode
     MSSQL_PWD = quote_plus(MSSQL_PWD_RAW)
 
-    SQLALCHEMY_DATABASE_URI = (
+    # DATABASE_URL 有設就直接用（例如 sqlite:///bench.db，在筆電 / CI 上不用 MSSQL 也能跑）
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL") or (
         f"mssql+pymssql://{MSSQL_USER}:{MSSQL_PWD}"
         f"@{MSSQL_HOST}:{MSSQL_PORT}/{MSSQL_DB}"
     )
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # ===== DB 連線池（QueuePool）=====
+    # 常駐連線數 / 尖峰可多開幾條 / 拿不到連線最多等幾秒 / 連線用多久就換新（秒）/ 借出前先 ping 一下
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "10"))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes", "on")
+
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+    # chaos flag 在每個 worker 內的快取秒數（到期才回 DB 對版本）
+    CHAOS_FLAG_TTL = float(os.environ.get("CHAOS_FLAG_TTL", "5"))
+
+    # 登入者快照（id / username / email / is_admin）在每個 worker 內的快取秒數
+    IDENTITY_CACHE_TTL = float(os.environ.get("IDENTITY_CACHE_TTL", "30"))
+
+    # 密碼雜湊 process pool：子 process 數（0 = 在 request thread 直接算）/ 最多排隊幾筆 / 等待秒數上限
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_QUEUE_MAX = int(os.environ.get("PASSWORD_HASH_QUEUE_MAX", "16"))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", "10"))
+    # 目前的雜湊參數（Werkzeug method 字串）；登入時舊參數的雜湊會自動升級成這個
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+
+    # 商品列表 HTML 片段快取：記憶體上限（bytes）與存活秒數
+    FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get("FRAGMENT_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+    FRAGMENT_CACHE_TTL = float(os.environ.get("FRAGMENT_CACHE_TTL", "60"))
+    # 多久跟 DB 對一次 catalog 版本戳記（其他 worker purge 過就整包丟掉）；0 = 每次 get 都對
+    FRAGMENT_CACHE_VERSION_TTL = float(os.environ.get("FRAGMENT_CACHE_VERSION_TTL", "1"))
+
+    # 搜尋索引最多多久全量重建一次（追上 seed.py 之類不經過 admin 直接改 DB 的修改）
+    SEARCH_INDEX_MAX_AGE = float(os.environ.get("SEARCH_INDEX_MAX_AGE", "300"))
+    # 背景 thread 多久檢查一次搜尋索引的版本戳記（其他 worker 改過商品就重建）
+    SEARCH_INDEX_REFRESH_INTERVAL = float(os.environ.get("SEARCH_INDEX_REFRESH_INTERVAL", "5"))
+
+    # 購物車存放位置：db（cart_items 表，預設）/ memory（單 process LRU）
+    CART_STORE = os.environ.get("CART_STORE", "db")
+    CART_MEMORY_MAX_CARTS = int(os.environ.get("CART_MEMORY_MAX_CARTS", "10000"))
+    # CART_STORE=db：整台車超過幾天沒動就刪掉 / 背景多久清一次
+    CART_TTL_DAYS = float(os.environ.get("CART_TTL_DAYS", "30"))
+    CART_SWEEP_INTERVAL = float(os.environ.get("CART_SWEEP_INTERVAL", "3600"))
+
+    # 背景金流 worker：thread 數 / 最多排隊（含處理中）幾筆 / 是否撿回 pending 訂單（啟動時 + 之後每 PAYMENT_RECOVER_INTERVAL 秒）
+    PAYMENT_WORKERS = int(os.environ.get("PAYMENT_WORKERS", "4"))
+    PAYMENT_QUEUE_MAX = int(os.environ.get("PAYMENT_QUEUE_MAX", "100"))
+    PAYMENT_RECOVER_ON_STARTUP = os.environ.get("PAYMENT_RECOVER_ON_STARTUP", "true").lower() in ("1", "true", "yes", "on")
+    # processing 的 lease 秒數：搶到單後超過這麼久還沒回寫結果（process 掛了 / 被重啟），會被改回 pending 重跑
+    PAYMENT_PROCESSING_LEASE = float(os.environ.get("PAYMENT_PROCESSING_LEASE", "60"))
+    # 背景多久撿一次 lease 過期 / 沒人處理的 pending 訂單（0 = 只在啟動時撿）
+    PAYMENT_RECOVER_INTERVAL = float(os.environ.get("PAYMENT_RECOVER_INTERVAL", "30"))
+
+    # 訂單狀態 long-poll：最多 hold 幾秒 / 等待中多久回 DB 看一次（其他 worker 改的狀態）
+    ORDER_STATUS_LONGPOLL_TIMEOUT = float(os.environ.get("ORDER_STATUS_LONGPOLL_TIMEOUT", "15"))
+    PAYMENT_STATUS_POLL_INTERVAL = float(os.environ.get("PAYMENT_STATUS_POLL_INTERVAL", "1"))
+    # 每個 process 同時最多 hold 幾個 long-poll（每個佔一條 WSGI thread，要比 thread 數少）/ 滿了叫 client 幾秒後再問
+    ORDER_STATUS_LONGPOLL_MAX_WAITERS = int(os.environ.get("ORDER_STATUS_LONGPOLL_MAX_WAITERS", "8"))
+    ORDER_STATUS_LONGPOLL_RETRY_AFTER = int(os.environ.get("ORDER_STATUS_LONGPOLL_RETRY_AFTER", "5"))
+
+    # 建立後幾秒還沒按付款就轉 failed、庫存還回去 / 背景多久檢查一次
+    ORDER_UNPAID_TTL = float(os.environ.get("ORDER_UNPAID_TTL", "1800"))
+    ORDER_EXPIRE_INTERVAL = float(os.environ.get("ORDER_EXPIRE_INTERVAL", "60"))
+
+    # admin 訂單列表總筆數快取秒數（過期後背景重算）
+    ADMIN_ORDER_COUNT_TTL = float(os.environ.get("ADMIN_ORDER_COUNT_TTL", "60"))
+
+    # 銷售統計 rollup：結帳 / 付款的計數先記在記憶體，每幾秒合併寫回一次（不讓每筆交易都搶同一筆 rollup row）
+    STATS_FLUSH_INTERVAL = float(os.environ.get("STATS_FLUSH_INTERVAL", "5"))
+
+    # 訂單匯出：每次從 DB cursor 拿幾列（也是每次吐給 client 的列數）
+    ORDER_EXPORT_BATCH_SIZE = int(os.environ.get("ORDER_EXPORT_BATCH_SIZE", "1000"))
+
+    # admin 會員搜尋：是否建記憶體 n-gram 索引（子字串搜尋不掃表）/ 索引多久全量重建一次
+    USER_SEARCH_NGRAM_INDEX = os.environ.get("USER_SEARCH_NGRAM_INDEX", "false").lower() in ("1", "true", "yes", "on")
+    USER_SEARCH_INDEX_MAX_AGE = float(os.environ.get("USER_SEARCH_INDEX_MAX_AGE", "300"))
+    # admin 人數快取秒數（「不能移除最後一個 admin」的檢查用）
+    ADMIN_COUNT_TTL = float(os.environ.get("ADMIN_COUNT_TTL", "300"))
+
+    # 慢 request 門檻：SQL 次數超過 / 總時間超過（ms）就記 warning log
+    SLOW_REQUEST_QUERIES = int(os.environ.get("SLOW_REQUEST_QUERIES", "20"))
+    SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "500"))
+    # admin 請求統計頁：每個 endpoint 保留最近幾筆
+    REQUEST_METRICS_WINDOW = int(os.environ.get("REQUEST_METRICS_WINDOW", "200"))
+
+    # slow query log：超過幾 ms 記下來（0 = 全部記）/ 最多記幾種 fingerprint / 是否另外抓執行計畫（MSSQL showplan、SQLite EXPLAIN QUERY PLAN）
+    SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+    SLOW_QUERY_MAX_FINGERPRINTS = int(os.environ.get("SLOW_QUERY_MAX_FINGERPRINTS", "500"))
+    SLOW_QUERY_CAPTURE_PLAN = os.environ.get("SLOW_QUERY_CAPTURE_PLAN", "false").lower() in ("1", "true", "yes", "on")
+
     # 靜態圖片資料夾（給 image_service 用）
     PRODUCT_IMAGE_FOLDER = os.path.join(
         os.path.dirname(os.path.dirname(__file__)),
         "app", "static", "products"
     )
+
+    # 圖片 stat 快取秒數 / 沒帶版本的圖片 URL 快取秒數
+    IMAGE_STAT_TTL = float(os.environ.get("IMAGE_STAT_TTL", "5"))
+    IMAGE_MAX_AGE = int(os.environ.get("IMAGE_MAX_AGE", "60"))
+    # 背景清 ref_count 歸零的圖片 blob / 沒用到的上傳暫存檔，每幾秒一輪（刪商品時會提早叫醒）
+    IMAGE_SWEEP_INTERVAL = float(os.environ.get("IMAGE_SWEEP_INTERVAL", "300"))
+
+    # 縮圖快取目錄（依寬度分子目錄：w320/xxx.jpg），原圖不會被動到
+    PRODUCT_IMAGE_CACHE_FOLDER = os.environ.get(
+        "PRODUCT_IMAGE_CACHE_FOLDER",
+        os.path.join(
+            os.path.dirname(os.path.dirname(__file__)),
+            "app", "static", "products_cache"
+        ),
+    )
@@ -0,0 +1,49 @@
+from flask import Blueprint, render_template, request, redirect, url_for, session
+from app.database import db
+from app.services import pool_metrics_service, request_metrics_service, slow_query_service
+
+admin_metrics_bp = Blueprint("admin_metrics", __name__, url_prefix="/admin/metrics")
+
+
+@admin_metrics_bp.before_request
+def require_admin():
+    if not session.get("user_id") or not session.get("is_admin"):
+        return redirect(url_for("auth.login", next=request.path))
+
+
+@admin_metrics_bp.route("/pool")
+def pool_metrics():
+    """
+    DB 連線池狀態（JSON）：借出 / 閒置 / overflow 連線數、等連線時間 histogram、連線借用時間與壽命
+    """
+    return pool_metrics_service.get_metrics(db.engine)
+
+
+@admin_metrics_bp.route("/requests")
+def request_metrics():
+    """
+    各 endpoint 最近的 request 統計：總時間 / DB 時間 / template 時間 / SQL 次數（慢的排前面）
+    """
+    data = request_metrics_service.get_aggregates()
+    return render_template("admin/request_metrics.html", data=data, page_name="Admin Request Metrics")
+
+
+@admin_metrics_bp.route("/requests/data")
+def request_metrics_data():
+    """同上，JSON 版"""
+    return request_metrics_service.get_aggregates()
+
+
+@admin_metrics_bp.route("/slow-queries")
+def slow_queries():
+    """
+    slow query log：同一種 SQL（參數換成 ?）的次數 / 平均 / p95 / 最大耗時，有開 SLOW_QUERY_CAPTURE_PLAN 會附執行計畫
+    """
+    data = slow_query_service.get_fingerprints()
+    return render_template("admin/slow_queries.html", data=data, page_name="Admin Slow Queries")
+
+
+@admin_metrics_bp.route("/slow-queries/data")
+def slow_queries_data():
+    """同上，JSON 版（存成檔案可以丟給 index_advisor.py --from-json）"""
+    return slow_query_service.get_fingerprints()
@@ -1,12 +1,13 @@
-from datetime import datetime, timedelta
-from flask import Blueprint, render_template, request, redirect, url_for, session, abort
+from datetime import datetime
+from flask import Blueprint, Response, render_template, request, redirect, url_for, session, abort, stream_with_context
 from app.database import db
 from app.models.order import Order
+from app.services import order_export_service, order_service, pagination_service, payment_service
 
 admin_order_bp = Blueprint("admin_order", __name__, url_prefix="/admin/orders")
 
 # 允許刪除的狀態（你之後接 queue 也安全）
-DELETABLE_STATUSES = {"created", "failed", "cancelled"}
+DELETABLE_STATUSES = {"created", "failed"}
 
 # 不允許刪除（保護 queue/金流一致性）
 BLOCKED_DELETE_STATUSES = {"pending", "processing", "paid"}
@@ -22,100 +23,91 @@ def require_admin():
 def order_list_all():
     """
     Admin：查看所有使用者訂單
-    - q：搜尋 order_id / user_id / status（簡易）
+    - q：搜尋 order_id / user_id / status（status 為精準比對）
     - date_from / date_to：日期範圍（以 created_at）
-    - page / per_page：分頁
+    - cursor / per_page：keyset 分頁（不跑 OFFSET，也不在每頁跑 COUNT）
     """
-    q = (request.args.get("q") or "").strip()
-    date_from = (request.args.get("date_from") or "").strip()  # YYYY-MM-DD
-    date_to = (request.args.get("date_to") or "").strip()      # YYYY-MM-DD
-    status = (request.args.get("status") or "").strip()
+    filters = order_service.normalize_admin_filters(
+        request.args.get("q"),
+        request.args.get("status"),
+        request.args.get("date_from"),   # YYYY-MM-DD
+        request.args.get("date_to"),     # YYYY-MM-DD
+    )
+    q, status, date_from, date_to = filters
 
     # 分頁
-    page = request.args.get("page", 1, type=int)
+    cursor = request.args.get("cursor") or None
     per_page = request.args.get("per_page", 10, type=int)
     if per_page not in (10, 20, 50, 100):
         per_page = 10
-    if page < 1:
-        page = 1
-
-    query = Order.query
-
-    # q 搜尋：若是數字 -> order_id 或 user_id；否則 -> status like
-    if q:
-        if q.isdigit():
-            n = int(q)
-            query = query.filter((Order.id == n) | (Order.user_id == n))
-        else:
-            query = query.filter(Order.status.ilike(f"%{q}%"))
-
-    # status 篩選（精準等於）
-    if status:
-        query = query.filter(Order.status == status)
-
-    # 日期範圍：date_from <= created_at < (date_to + 1 day)
-    def _parse_date(s: str):
-        return datetime.strptime(s, "%Y-%m-%d")
-
-    if date_from:
-        try:
-            dt_from = _parse_date(date_from)
-            query = query.filter(Order.created_at >= dt_from)
-        except ValueError:
-            date_from = ""  # 讓 UI 回填為空，避免壞格式卡住
-
-    if date_to:
-        try:
-            dt_to = _parse_date(date_to) + timedelta(days=1)  # inclusive end day
-            query = query.filter(Order.created_at < dt_to)
-        except ValueError:
-            date_to = ""
-
-    query = query.order_by(Order.created_at.desc())
-
-    # Flask-SQLAlchemy 通常有 paginate；若沒有就用 offset/limit fallback
-    paginate_fn = getattr(query, "paginate", None)
-    if callable(paginate_fn):
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        orders = pagination.items
-        total = pagination.total
-        pages = pagination.pages
-    else:
-        total = query.count()
-        orders = query.offset((page - 1) * per_page).limit(per_page).all()
-        pages = (total + per_page - 1) // per_page
-
-        class _Pagination:
-            def __init__(self, page, per_page, total, pages):
-                self.page = page
-                self.per_page = per_page
-                self.total = total
-                self.pages = pages
-                self.has_prev = page > 1
-                self.has_next = page < pages
-                self.prev_num = page - 1
-                self.next_num = page + 1
-
-        pagination = _Pagination(page, per_page, total, pages)
-
-    # 讓 UI 的 status 下拉有選項（之後你狀態變多再加就好）
-    status_options = ["created", "pending", "processing", "paid", "failed", "cancelled"]
+
+    query = order_service.admin_order_query(filters)
+    page = pagination_service.keyset_page(query, Order.created_at, Order.id, cursor, per_page)
+
+    # 總筆數：快取值（背景定期重算），還沒算好就是 None
+    total = order_service.get_cached_order_count(filters)
 
     return render_template(
         "admin/order_list.html",
-        orders=orders,
+        orders=page["items"],
         q=q,
         date_from=date_from,
         date_to=date_to,
         status=status,
-        status_options=status_options,
-        pagination=pagination,
+        status_options=order_service.ORDER_STATUSES,
+        next_cursor=page["next_cursor"],
+        prev_cursor=page["prev_cursor"],
+        is_first_page=cursor is None,
         per_page=per_page,
         total=total,
         page_name="Admin Orders",
     )
 
 
+@admin_order_bp.route("/export")
+def order_export():
+    """
+    Admin：匯出訂單（含品項），篩選條件跟列表一樣（q / status / date_from / date_to）
+    - format=csv（預設）：一列一個品項
+    - format=ndjson：一行一張訂單，品項在 items 裡
+    邊查邊吐（generator response），不會把整個結果載進記憶體
+    """
+    filters = order_service.normalize_admin_filters(
+        request.args.get("q"),
+        request.args.get("status"),
+        request.args.get("date_from"),
+        request.args.get("date_to"),
+    )
+
+    fmt = (request.args.get("format") or "csv").lower()
+    if fmt == "ndjson":
+        body, mimetype = order_export_service.iter_ndjson(filters), "application/x-ndjson"
+    elif fmt == "csv":
+        body, mimetype = order_export_service.iter_csv(filters), "text/csv"
+    else:
+        abort(400)
+
+    filename = f"orders-{datetime.now():%Y%m%d-%H%M%S}.{fmt}"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Cache-Control": "no-store",
+            # 叫前面的 nginx 不要整包 buffer 起來
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@admin_order_bp.route("/payments/metrics")
+def payment_metrics():
+    """
+    背景金流 worker 的狀態（JSON）：排隊數、成功/失敗、被拒絕次數、金流耗時
+    """
+    return payment_service.get_metrics()
+
+
 @admin_order_bp.route("/<int:order_id>")
 def order_detail_admin(order_id: int):
     order = Order.query.get(order_id)
@@ -142,6 +134,13 @@ def order_delete_admin(order_id: int):
     if status not in DELETABLE_STATUSES:
         return redirect(url_for("admin_order.order_detail_admin", order_id=order.id))
 
+    if status == "created":
+        # 還沒付款的訂單佔著結帳時扣的庫存：同一個 transaction 先轉 failed + 還庫存再刪
+        # （條件式：使用者剛好按了付款轉成 pending 的話就不刪）
+        if not order_service.fail_unpaid_order(order.id):
+            db.session.rollback()
+            return redirect(url_for("admin_order.order_detail_admin", order_id=order.id))
+
     db.session.delete(order)  # Order model 已設 cascade delete-orphan → items 會一起刪
     db.session.commit()
     return redirect(url_for("admin_order.order_list_all"))
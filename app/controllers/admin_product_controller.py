@@ -1,12 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session
 
-import os
-from werkzeug.utils import secure_filename
-
 from app.database import db
 from app.models.product import Product
 from app.models.product_image import ProductImage
-from app.services import image_service
+from app.services import fragment_cache_service
+from app.services import search_service
+from app.services import image_store_service
 from app.services import chaos_service  # 之後如果要在新增/刪除放 chaos 可用，不用可以先不理
 
 admin_product_bp = Blueprint("admin_product", __name__, url_prefix="/admin/products")
@@ -103,21 +102,13 @@ def admin_product_create():
     db.session.add(product)
     db.session.commit()  # 先 commit 才會有 product.id
 
-    # ----- 儲存圖片 -----
-    img_dir = image_service.get_product_image_folder()
-    os.makedirs(img_dir, exist_ok=True)
-
+    # ----- 儲存圖片（依內容 hash 存，一樣的圖只存一份） -----
     index = 0
     for img in images:
         if not img.filename:
             continue
         index += 1
-        filename_raw = secure_filename(img.filename)
-        ext = os.path.splitext(filename_raw)[1] or ".jpg"
-        filename = f"p{product.id}_{index}{ext}"
-
-        save_path = os.path.join(img_dir, filename)
-        img.save(save_path)
+        filename = image_store_service.store_upload(img)
 
         pi = ProductImage(
             product_id=product.id,
@@ -128,6 +119,11 @@ def admin_product_create():
 
     db.session.commit()
 
+    search_service.index_product(product)
+
+    # 新商品會出現在哪些列表 → 只清那些片段
+    fragment_cache_service.purge(fragment_cache_service.product_tags(gender, season))
+
     return redirect(url_for("admin_product.admin_product_list"))
 
 
@@ -204,6 +200,10 @@ def admin_product_edit(product_id: int):
             product_id=product.id,
         )
 
+    # 舊的 gender/season 列表也要清（商品可能被移到別的分類）
+    purge_tags = fragment_cache_service.product_tags(product.gender, product.season)
+    purge_tags |= fragment_cache_service.product_tags(gender, season)
+
     # 寫回 DB（不動圖片相關欄位）
     product.name = name
     product.gender = gender
@@ -213,6 +213,9 @@ def admin_product_edit(product_id: int):
     product.description = description
     db.session.commit()
 
+    search_service.index_product(product)
+    fragment_cache_service.purge(purge_tags)
+
     return redirect(url_for("admin_product.admin_product_list"))
 
 
@@ -220,37 +223,25 @@ def admin_product_edit(product_id: int):
 def admin_product_delete(product_id: int):
     """
     刪除商品：
+    - 一個 UPDATE 把用到的圖片 blob ref_count 扣掉
     - 刪除 ProductImage 資料
-    - 刪除對應圖片檔案（若無其他商品共用該檔案）
     - 刪除 Product
+    - ref_count 歸零的圖片檔交給背景 sweep 清
     """
     product = Product.query.get(product_id)
     if not product:
         return redirect(url_for("admin_product.admin_product_list"))
 
-    img_dir = image_service.get_product_image_folder()
-
-    images = ProductImage.query.filter_by(product_id=product.id).all()
-
-    for img in images:
-        same_file_count = (
-            ProductImage.query
-            .filter(
-                ProductImage.filename == img.filename,
-                ProductImage.product_id != product.id
-            )
-            .count()
-        )
+    image_store_service.release_product_images(product.id)
 
-        if same_file_count == 0:
-            file_path = os.path.join(img_dir, img.filename)
-            try:
-                os.remove(file_path)
-            except FileNotFoundError:
-                pass
+    purge_tags = fragment_cache_service.product_tags(product.gender, product.season)
 
     ProductImage.query.filter_by(product_id=product.id).delete()
     db.session.delete(product)
     db.session.commit()
 
+    search_service.remove_product(product_id)
+    fragment_cache_service.purge(purge_tags)
+    image_store_service.sweep_in_background()
+
     return redirect(url_for("admin_product.admin_product_list"))
@@ -0,0 +1,27 @@
+from flask import Blueprint, render_template, request, redirect, url_for, session
+from app.services import stats_service
+
+admin_stats_bp = Blueprint("admin_stats", __name__, url_prefix="/admin/stats")
+
+
+@admin_stats_bp.before_request
+def require_admin():
+    if not session.get("user_id") or not session.get("is_admin"):
+        return redirect(url_for("auth.login", next=request.path))
+
+
+@admin_stats_bp.route("/")
+def stats_dashboard():
+    """
+    銷售儀表板：訂單數 / 營收 / 付款失敗率（讀 rollup，不掃訂單表）
+    """
+    data = stats_service.get_dashboard()
+    return render_template("admin/stats.html", data=data, page_name="Admin Stats")
+
+
+@admin_stats_bp.route("/data")
+def stats_data():
+    """同上，JSON 版（給 chaos 實驗時用 script 拉）"""
+    hours = min(request.args.get("hours", 24, type=int), 24 * 7)
+    days = min(request.args.get("days", 30, type=int), 366)
+    return stats_service.get_dashboard(hours=hours, days=days)
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session
 from app.database import db
 from app.models.user import User
+from app.services import auth_service, identity_service, user_service
 
 admin_user_bp = Blueprint("admin_user", __name__, url_prefix="/admin/users")
 
@@ -16,17 +17,36 @@ def require_admin():
 @admin_user_bp.route("/")
 def user_list():
     """
-    會員列表（可用 q 搜尋 username/email）
+    會員列表（keyset 分頁）
+    - q：搜尋 username/email
+    - mode：prefix（預設，走 index）/ contains（子字串）
     """
     q = (request.args.get("q") or "").strip()
-    query = User.query
-
-    if q:
-        like = f"%{q}%"
-        query = query.filter((User.username.ilike(like)) | (User.email.ilike(like)))
-
-    users = query.order_by(User.created_at.desc()).all()
-    return render_template("admin/user_list.html", users=users, q=q, page_name="Admin Users")
+    mode = request.args.get("mode") or "prefix"
+    if mode not in user_service.SEARCH_MODES:
+        mode = "prefix"
+    cursor = request.args.get("cursor") or None
+
+    page = user_service.search_users(q, mode=mode, cursor=cursor)
+    return render_template(
+        "admin/user_list.html",
+        users=page["items"],
+        q=q,
+        mode=mode,
+        next_cursor=page["next_cursor"],
+        prev_cursor=page["prev_cursor"],
+        is_first_page=cursor is None,
+        admin_count=user_service.get_admin_count(),
+        page_name="Admin Users",
+    )
+
+
+@admin_user_bp.route("/password-hash/metrics")
+def password_hash_metrics():
+    """
+    密碼雜湊 pool 的狀態（JSON）：排隊數、被拒絕次數、每次雜湊 / 驗證的 CPU 秒數、升級了幾筆
+    """
+    return auth_service.get_metrics()
 
 
 @admin_user_bp.route("/<int:user_id>/edit", methods=["GET", "POST"])
@@ -68,18 +88,21 @@ def user_edit(user_id: int):
 
     # 不能把「最後一個 admin」取消 admin
     if user.is_admin and (not is_admin):
-        admin_count = User.query.filter_by(is_admin=True).count()
-        if admin_count <= 1:
+        if not user_service.can_remove_admin(user.id):
             errors.append("不能取消最後一個 Admin 的權限。")
 
     if errors:
         form_data = {"username": username, "email": email, "is_admin": is_admin}
         return render_template("admin/user_edit.html", user=user, form_data=form_data, errors=errors)
 
+    admin_delta = int(is_admin) - int(bool(user.is_admin))
     user.username = username
     user.email = email
     user.is_admin = is_admin
     db.session.commit()
+    identity_service.invalidate(user.id)
+    user_service.adjust_admin_count(admin_delta)
+    user_service.index_user(user)
 
     return redirect(url_for("admin_user.user_list"))
 
@@ -94,8 +117,7 @@ def toggle_admin(user_id: int):
         return redirect(url_for("admin_user.user_list"))
 
     if user.is_admin:
-        admin_count = User.query.filter_by(is_admin=True).count()
-        if admin_count <= 1:
+        if not user_service.can_remove_admin(user.id):
             # 最後一個 admin 不能降級
             return redirect(url_for("admin_user.user_list"))
 
@@ -104,6 +126,8 @@ def toggle_admin(user_id: int):
         user.is_admin = True
 
     db.session.commit()
+    identity_service.invalidate(user.id)
+    user_service.adjust_admin_count(1 if user.is_admin else -1)
     return redirect(url_for("admin_user.user_list"))
 
 
@@ -122,11 +146,14 @@ def user_delete(user_id: int):
     if not user:
         return redirect(url_for("admin_user.user_list"))
 
-    if user.is_admin:
-        admin_count = User.query.filter_by(is_admin=True).count()
-        if admin_count <= 1:
-            return redirect(url_for("admin_user.user_list"))
+    was_admin = bool(user.is_admin)
+    if was_admin and not user_service.can_remove_admin(user.id):
+        return redirect(url_for("admin_user.user_list"))
 
     db.session.delete(user)
     db.session.commit()
+    identity_service.invalidate(user_id)
+    user_service.remove_user(user_id)
+    if was_admin:
+        user_service.adjust_admin_count(-1)
     return redirect(url_for("admin_user.user_list"))
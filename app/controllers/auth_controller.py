@@ -14,7 +14,11 @@ def login():
     password = request.form.get("password", "").strip()
 
     errors = []
-    user = auth_service.authenticate(username_or_email, password)
+    try:
+        user = auth_service.authenticate(username_or_email, password)
+    except auth_service.PasswordHasherBusyError:
+        # back-pressure：登入太多人同時擠進來，先回 503 請使用者稍後再試
+        return render_template("auth/login.html", errors=["登入人數眾多，請稍後再試。"]), 503, {"Retry-After": "2"}
     if not user:
         errors.append("帳號或密碼錯誤。")
 
@@ -70,5 +74,12 @@ def register():
             form_data={"username": username, "email": email},
         )
 
-    auth_service.create_user(username=username, email=email, password=password, is_admin=False)
+    try:
+        auth_service.create_user(username=username, email=email, password=password, is_admin=False)
+    except auth_service.PasswordHasherBusyError:
+        return render_template(
+            "auth/register.html",
+            errors=["註冊人數眾多，請稍後再試。"],
+            form_data={"username": username, "email": email},
+        ), 503, {"Retry-After": "2"}
     return redirect(url_for("auth.login"))
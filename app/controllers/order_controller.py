@@ -1,7 +1,14 @@
-from flask import Blueprint, render_template, redirect, url_for, session, abort
+from flask import Blueprint, render_template, redirect, url_for, session, abort, request, current_app
+from app.database import db
 from app.models.order import Order
-from app.services.order_service import create_order_from_cart
-from app.services.payment_service import start_payment, finalize_payment_if_pending
+from app.services import cart_service
+from app.services.order_service import create_order_from_cart, list_user_orders, OutOfStockError
+from app.services.payment_service import (
+    start_payment,
+    LongPollBusyError,
+    PaymentQueueFullError,
+    wait_for_status_change,
+)
 
 
 
@@ -19,6 +26,15 @@ def checkout():
     user_id = session["user_id"]
     try:
         order = create_order_from_cart(user_id)
+    except OutOfStockError as e:
+        summary = cart_service.get_cart_summary()
+        names = [i["product"].name for i in summary["items"] if i["product"].id in e.product_ids]
+        return render_template(
+            "cart/cart.html",
+            cart=summary,
+            errors=[f"庫存不足：{name}" for name in names] or ["庫存不足。"],
+            page_name="Cart",
+        )
     except ValueError:
         return redirect(url_for("cart.cart_view"))
 
@@ -28,13 +44,15 @@ def checkout():
 @order_bp.route("/")
 def my_orders():
     user_id = session["user_id"]
-    orders = (
-        Order.query
-        .filter_by(user_id=user_id)
-        .order_by(Order.created_at.desc())
-        .all()
+    cursor = request.args.get("cursor") or None
+    page = list_user_orders(user_id, cursor=cursor)
+    return render_template(
+        "orders/order_list.html",
+        orders=page["items"],
+        aggregates=page["aggregates"],
+        next_cursor=page["next_cursor"],
+        prev_cursor=page["prev_cursor"],
     )
-    return render_template("orders/order_list.html", orders=orders)
 
 
 @order_bp.route("/<int:order_id>")
@@ -46,11 +64,7 @@ def order_detail(order_id: int):
     if order.user_id != session["user_id"]:
         abort(403)
 
-    # ⭐ 關鍵：這是一個「新的 HTTP request」
-    if order.status == "pending":
-        finalize_payment_if_pending(order.id)
-        order = Order.query.get(order_id)
-
+    # pending 的訂單由背景 worker 處理，這裡只讀狀態
     return render_template(
         "orders/order_detail.html",
         order=order,
@@ -59,6 +73,40 @@ def order_detail(order_id: int):
 
 
 
+@order_bp.route("/<int:order_id>/status")
+def order_status(order_id: int):
+    """
+    訂單狀態 long-poll（給 pending 頁面用，取代整頁 reload）：
+    - ?since=pending：狀態還是 pending 就 hold 住，直到狀態變了或 timeout
+    - 沒帶 since：直接回目前狀態
+    - 這個 process hold 住的 long-poll 已經滿了：直接回目前狀態 + Retry-After，client 照著晚點再問
+    回傳 JSON：{"order_id": 1, "status": "paid"}
+    """
+    row = (
+        db.session.query(Order.user_id, Order.status)
+        .filter(Order.id == order_id)
+        .first()
+    )
+    if not row:
+        abort(404)
+
+    if row.user_id != session["user_id"]:
+        abort(403)
+
+    status = row.status
+    since = request.args.get("since")
+    if since and since == status:
+        max_timeout = float(current_app.config.get("ORDER_STATUS_LONGPOLL_TIMEOUT", 25))
+        timeout = min(request.args.get("timeout", max_timeout, type=float), max_timeout)
+        try:
+            status = wait_for_status_change(order_id, since, max(timeout, 0))
+        except LongPollBusyError:
+            retry_after = int(current_app.config.get("ORDER_STATUS_LONGPOLL_RETRY_AFTER", 5))
+            return {"order_id": order_id, "status": status}, 200, {"Retry-After": str(retry_after)}
+
+    return {"order_id": order_id, "status": status}
+
+
 @order_bp.route("/<int:order_id>/pay", methods=["POST"])
 def pay_order(order_id: int):
     order = Order.query.get(order_id)
@@ -71,8 +119,25 @@ def pay_order(order_id: int):
     if order.status not in ("created", "failed"):
         return redirect(url_for("order.order_detail", order_id=order.id))
 
-    # ✅ 只做 pending
-    start_payment(order.id)
+    # ✅ 只做 pending，真正的金流丟給背景 worker
+    try:
+        start_payment(order.id)
+    except PaymentQueueFullError:
+        # back-pressure：佇列滿了，訂單維持原狀態，請使用者稍後再試
+        return render_template(
+            "orders/order_detail.html",
+            order=order,
+            errors=["付款系統忙碌中，請稍後再試。"],
+            page_name=f"Order {order.id}",
+        ), 503
+    except OutOfStockError:
+        # failed 的訂單重新付款：庫存已經還回去又被別人買走了
+        return render_template(
+            "orders/order_detail.html",
+            order=order,
+            errors=["庫存不足，無法重新付款。"],
+            page_name=f"Order {order.id}",
+        ), 409
 
     # ✅ 立刻 redirect（這一步非常重要）
     return redirect(url_for("order.order_detail", order_id=order.id))
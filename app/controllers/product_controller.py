@@ -1,12 +1,14 @@
-from flask import Blueprint, render_template, request, abort
-from app.services import product_service, image_service
+from flask import Blueprint, render_template, request, abort, make_response
+from app.services import product_service, image_service, fragment_cache_service, search_service
 
 product_bp = Blueprint("product", __name__)
 
 # 產品圖片專用 route（讓 chaos 可以介入）
 @product_bp.route("/images/products/<filename>")
 def product_image(filename):
-    return image_service.serve_product_image(filename)
+    # ?w=320 → 縮圖（寬度只接受 image_service.IMAGE_WIDTHS）
+    width = request.args.get("w", type=int)
+    return image_service.serve_product_image(filename, width=width)
 
 
 @product_bp.route("/products")
@@ -15,15 +17,64 @@ def product_list():
     gender = request.args.get("gender") or ""
     season = request.args.get("season") or ""
 
-    # 空字串轉回 None 給 service 使用
-    products = product_service.list_products(gender or None, season or None)
+    # 分頁 cursor（不透明 token，由上一頁的 next/prev 連結帶過來）
+    cursor = request.args.get("cursor") or None
+
+    # 商品列表本體只跟篩選條件有關 → 渲染好的 HTML 直接快取
+    cacheable = product_service.list_cacheable()
+    cache_key = ("product_list", gender, season, cursor)
+    fragment = fragment_cache_service.get(cache_key) if cacheable else None
+
+    if fragment is not None:
+        cache_status = "HIT"
+    else:
+        version = fragment_cache_service.catalog_version()
+        # 空字串轉回 None 給 service 使用
+        page = product_service.list_products(gender or None, season or None, cursor=cursor)
+        fragment = render_template(
+            "products_fragment.html",
+            products=page["items"],
+            next_cursor=page["next_cursor"],
+            prev_cursor=page["prev_cursor"],
+            image_url=image_service.product_image_url,
+            thumb_width=image_service.THUMB_WIDTH,
+            current_gender=gender,
+            current_season=season,
+        )
+        if cacheable:
+            fragment_cache_service.put(
+                cache_key,
+                fragment,
+                tags=[fragment_cache_service.product_list_tag(gender or None, season or None)],
+                version=version,
+            )
+            cache_status = "MISS"
+        else:
+            cache_status = "BYPASS"
+
+    resp = make_response(render_template("products.html", fragment=fragment))
+    resp.headers["X-Cache"] = cache_status
+    return resp
+
+
+@product_bp.route("/products/search")
+def product_search():
+    """
+    商品搜尋：?q=白色 T-shirt&page=2
+    走記憶體裡的倒排索引，不對 DB 做 LIKE '%...%'
+    """
+    q = (request.args.get("q") or "").strip()
+    page = request.args.get("page", 1, type=int)
+
+    result = search_service.search_products(q, page=page) if q else None
 
     return render_template(
-        "products.html",
-        products=products,
+        "product_search.html",
+        q=q,
+        result=result,
         image_url=image_service.product_image_url,
-        current_gender=gender,
-        current_season=season,
+        thumb_width=image_service.THUMB_WIDTH,
+        page_name="Search",
     )
 
 
@@ -1,3 +1,27 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func
+from sqlalchemy.engine import make_url
 
 db = SQLAlchemy()
+
+
+# QueuePool 才吃的參數（in-memory SQLite 只能用 StaticPool，要拿掉）
+QUEUE_POOL_OPTIONS = ("pool_size", "max_overflow", "pool_timeout")
+
+
+def is_sqlite_memory(uri: str) -> bool:
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def random_order():
+    """
+    隨機排序（各家 DB 寫法不一樣）：
+    MSSQL -> NEWID()、MySQL -> RAND()、SQLite / PostgreSQL -> random()
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "mssql":
+        return func.newid()
+    if dialect in ("mysql", "mariadb"):
+        return func.rand()
+    return func.random()
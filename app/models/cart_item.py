@@ -0,0 +1,21 @@
+from datetime import datetime
+from app.database import db
+
+
+class CartItem(db.Model):
+    """
+    伺服器端購物車（CART_STORE=db 時使用）
+    session 只放 cart_id，品項都存在這張表
+    """
+    __tablename__ = "cart_items"
+    __table_args__ = (
+        db.UniqueConstraint("cart_id", "product_id", name="uq_cart_items_cart_product"),
+        # 清過期的車：WHERE updated_at < ? / >= ?
+        db.Index("ix_cart_items_updated", "updated_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    cart_id = db.Column(db.String(64), nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
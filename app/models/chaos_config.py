@@ -1,3 +1,5 @@
+from typing import Dict, Optional
+
 from app.database import db
 from app.models.base import BaseModel
 
@@ -18,14 +20,34 @@ class ChaosConfig(BaseModel):
         cfg = ChaosConfig.query.filter_by(key=key).first()
         if not cfg:
             return default
-        return cfg.value.lower() in ("1", "true", "yes", "on")
+        return ChaosConfig.to_bool(cfg.value)
+
+    @staticmethod
+    def to_bool(value: Optional[str]) -> bool:
+        return (value or "").lower() in ("1", "true", "yes", "on")
+
+    @staticmethod
+    def get_value(key: str) -> Optional[str]:
+        """只查單一 key 的 value（不載入整個 row）"""
+        return db.session.query(ChaosConfig.value).filter_by(key=key).scalar()
 
     @staticmethod
-    def set_bool(key: str, flag: bool):
+    def get_all() -> Dict[str, Optional[str]]:
+        """一次把所有設定撈出來：{key: value}"""
+        rows = db.session.query(ChaosConfig.key, ChaosConfig.value).all()
+        return {k: v for k, v in rows}
+
+    @staticmethod
+    def set_value(key: str, value: str, commit: bool = True):
         cfg = ChaosConfig.query.filter_by(key=key).first()
         if not cfg:
-            cfg = ChaosConfig(key=key, value="true" if flag else "false")
+            cfg = ChaosConfig(key=key, value=value)
             db.session.add(cfg)
         else:
-            cfg.value = "true" if flag else "false"
-        db.session.commit()
+            cfg.value = value
+        if commit:
+            db.session.commit()
+
+    @staticmethod
+    def set_bool(key: str, flag: bool, commit: bool = True):
+        ChaosConfig.set_value(key, "true" if flag else "false", commit=commit)
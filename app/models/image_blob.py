@@ -0,0 +1,16 @@
+from app.database import db
+from app.models.base import BaseModel
+
+
+class ImageBlob(BaseModel):
+    """
+    內容定址的圖片檔：
+    - 同樣的 bytes 只存一份，檔名就是 sha256（product_images.filename 指到這裡）
+    - ref_count = 有幾筆 product_images 在用，歸零後由背景 sweep 清掉檔案
+    """
+    __tablename__ = "image_blobs"
+
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    filename = db.Column(db.String(255), unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=False, default=0)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
@@ -1,14 +1,35 @@
 from datetime import datetime
 from app.database import db
 
+
+# 訂單狀態（跟 DB.txt 的 CK_Orders_Status 同一份；admin 篩選下拉也用這份）
+ORDER_STATUSES = ("created", "pending", "processing", "paid", "failed")
+
+
 class Order(db.Model):
     __tablename__ = "orders"
+    __table_args__ = (
+        db.CheckConstraint(
+            "status IN (" + ", ".join(f"'{s}'" for s in ORDER_STATUSES) + ")",
+            name="ck_orders_status",
+        ),
+        # 我的訂單：WHERE user_id = ? ORDER BY created_at DESC, id DESC（keyset 分頁）
+        db.Index("ix_orders_user_created", "user_id", "created_at", "id"),
+        # admin 訂單列表：WHERE status = ? ORDER BY created_at DESC, id DESC
+        db.Index("ix_orders_status_created", "status", "created_at", "id"),
+        # admin 訂單列表沒有篩選 / 只篩日期：ORDER BY created_at DESC, id DESC（index_advisor.py 找到的）
+        db.Index("ix_orders_created", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, nullable=False, index=True)
 
     total_amount = db.Column(db.Numeric(10, 2), nullable=False)
     status = db.Column(db.String(32), nullable=False, default="created")
+    # 背景 worker 搶到單（pending → processing）的時間：超過 PAYMENT_PROCESSING_LEASE 秒還沒結果就當作 worker 掛了
+    processing_at = db.Column(db.DateTime, nullable=True)
+    # 搶單時發的不透明 token（uuid hex）：回寫結果時比對這個，lease 被撿回去重搶之後舊 worker 就寫不進來
+    claim_token = db.Column(db.String(32), nullable=True)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
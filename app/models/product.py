@@ -4,6 +4,14 @@ from app.models.base import BaseModel
 
 class Product(BaseModel):
     __tablename__ = "products"
+    __table_args__ = (
+        # 商品列表：WHERE active [+ gender] [+ season] + ORDER BY created_at, id（keyset 分頁）
+        # 等值欄位中間不能空一欄，否則後面的 created_at 排序用不到 → 每種篩選組合一個
+        db.Index("ix_products_catalog", "active", "gender", "season", "created_at", "id"),
+        db.Index("ix_products_active_created", "active", "created_at", "id"),
+        db.Index("ix_products_gender_created", "active", "gender", "created_at", "id"),
+        db.Index("ix_products_season_created", "active", "season", "created_at", "id"),
+    )
 
     name = db.Column(db.String(200), nullable=False)
     gender = db.Column(db.String(1), nullable=False)    # 'M' / 'F' / 'K'
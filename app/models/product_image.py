@@ -4,6 +4,12 @@ from app.models.base import BaseModel
 
 class ProductImage(BaseModel):
     __tablename__ = "product_images"
+    __table_args__ = (
+        # 刪商品：WHERE product_id = ?，扣 blob ref_count 的子查詢再加 filename（index_advisor.py 找到的）
+        db.Index("ix_product_images_product_filename", "product_id", "filename"),
+        # seed.py 依圖檔前綴找 demo 商品：filename LIKE 'prefix_%'
+        db.Index("ix_product_images_filename", "filename"),
+    )
 
     product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
     filename = db.Column(db.String(255), nullable=False)
@@ -0,0 +1,21 @@
+from app.database import db
+
+
+class ProductSalesRollup(db.Model):
+    """
+    每個商品的銷售統計（每小時 / 每天一筆），付款成功時增量更新
+    """
+    __tablename__ = "product_sales_rollups"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "bucket_type", "bucket_start", "product_id", name="uq_product_sales_rollups_bucket"
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    bucket_type = db.Column(db.String(8), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    product_id = db.Column(db.Integer, nullable=False)
+
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
@@ -0,0 +1,23 @@
+from app.database import db
+
+
+class SalesRollup(db.Model):
+    """
+    訂單統計（每小時 / 每天一筆），訂單狀態變動時增量更新，不回頭掃 orders
+    - bucket_type: 'hour' / 'day'
+    - bucket_start: 該時段起點（UTC）
+    """
+    __tablename__ = "sales_rollups"
+    __table_args__ = (
+        db.UniqueConstraint("bucket_type", "bucket_start", name="uq_sales_rollups_bucket"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    bucket_type = db.Column(db.String(8), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+
+    order_count = db.Column(db.Integer, nullable=False, default=0)   # 建立的訂單數
+    paid_count = db.Column(db.Integer, nullable=False, default=0)    # 付款成功次數
+    failed_count = db.Column(db.Integer, nullable=False, default=0)  # 付款失敗次數
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)         # 付款成功的商品件數
@@ -1,13 +1,18 @@
-from sqlalchemy import func
+from datetime import datetime
 from app.database import db
 
 
 class User(db.Model):
     __tablename__ = "users"
+    __table_args__ = (
+        # admin 會員列表：ORDER BY created_at DESC, id DESC（keyset 分頁）
+        db.Index("ix_users_created", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
     email = db.Column(db.String(255), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     is_admin = db.Column(db.Boolean, default=False, nullable=False)
-    created_at = db.Column(db.DateTime, server_default=func.now())
+    # 跟其他表一樣存 UTC（func.now() 在 MSSQL 是 server 當地時間，keyset 排序會跟其他表對不起來）
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -1,28 +1,246 @@
-from typing import Optional
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
 
+from flask import current_app
+from sqlalchemy import update
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from app.database import db
 from app.models.user import User
+from app.services import user_service
+
+
+class PasswordHasherBusyError(RuntimeError):
+    """密碼雜湊佇列滿了（back-pressure），請使用者稍後再試"""
+
+
+# ---- 每個 process 一份的密碼雜湊 process pool ----
+# PBKDF2 / scrypt 是純 CPU，放在 request thread 會卡 GIL，把同一個 worker 的商品頁一起拖慢
+_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_inflight = 0  # 排隊中 + 計算中
+_metrics: Dict[str, Any] = {
+    "hashed": 0,
+    "verified": 0,
+    "upgraded": 0,
+    "rejected": 0,
+    "timeouts": 0,
+    "pool_resets": 0,
+    "hash_seconds_total": 0.0,
+    "hash_seconds_max": 0.0,
+    "verify_seconds_total": 0.0,
+    "verify_seconds_max": 0.0,
+    "wait_seconds_total": 0.0,
+}
+
+
+# ---- 在 pool 的子 process 裡跑（要是 module-level function 才 pickle 得過去） ----
+def _hash_job(password: str, method: str) -> Tuple[str, float]:
+    started = time.perf_counter()
+    pw_hash = generate_password_hash(password, method=method)
+    return pw_hash, time.perf_counter() - started
+
+
+def _verify_job(pw_hash: str, password: str) -> Tuple[bool, float]:
+    started = time.perf_counter()
+    ok = check_password_hash(pw_hash, password)
+    return ok, time.perf_counter() - started
+
+
+def _workers() -> int:
+    return int(current_app.config.get("PASSWORD_HASH_WORKERS", 2))
+
+
+def _queue_max() -> int:
+    return int(current_app.config.get("PASSWORD_HASH_QUEUE_MAX", 16))
+
+
+def _hash_method() -> str:
+    return current_app.config.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_workers())
+        return _pool
+
+
+def _reset_pool(broken: ProcessPoolExecutor) -> None:
+    """
+    子 process 被砍掉（OOM killer 之類）整個 pool 就 broken，之後每次 submit 都會失敗
+    換掉它（別的 thread 已經換過就不動），下次 _get_pool() 開新的
+    """
+    global _pool
+    with _lock:
+        if _pool is not broken:
+            return
+        _pool = None
+        _metrics["pool_resets"] += 1
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _acquire_slot() -> None:
+    global _inflight
+    with _lock:
+        if _inflight >= _queue_max():
+            _metrics["rejected"] += 1
+            raise PasswordHasherBusyError("Password hasher is busy")
+        _inflight += 1
+
+
+def _release_slot(_future=None) -> None:
+    global _inflight
+    with _lock:
+        _inflight -= 1
+
+
+def _submit(fn, *args) -> Tuple[ProcessPoolExecutor, Any]:
+    """送進 pool，slot 等 job 結束（或被取消）由 callback 還；pool 已經壞了就換新的重送一次"""
+    pool = _get_pool()
+    try:
+        future = pool.submit(fn, *args)
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        pool = _get_pool()
+        future = pool.submit(fn, *args)
+    future.add_done_callback(_release_slot)
+    return pool, future
+
+
+def _run(kind: str, fn, *args):
+    """
+    丟進 process pool 等結果；排隊數超過 PASSWORD_HASH_QUEUE_MAX 直接丟 PasswordHasherBusyError
+    PASSWORD_HASH_WORKERS=0 → 不開 pool，直接在 request thread 算（開發 / 單機測試用）
+    pool 的 slot 等 job 真的結束（或被取消）才還：timeout 的 job 還在 pool 裡排隊 / 計算，不能先算空出來
+    子 process 死掉（BrokenProcessPool）→ 換新的 pool 重跑一次
+    """
+    _acquire_slot()
+
+    started = time.monotonic()
+    if _workers() <= 0:
+        try:
+            result, cpu_seconds = fn(*args)
+        finally:
+            _release_slot()
+    else:
+        timeout = float(current_app.config.get("PASSWORD_HASH_TIMEOUT", 10))
+        for retried in (False, True):
+            try:
+                pool, future = _submit(fn, *args)
+            except Exception:
+                _release_slot()
+                raise
+            try:
+                result, cpu_seconds = future.result(timeout=timeout)
+                break
+            except FutureTimeoutError:
+                # 還在排隊的直接取消（馬上還 slot）；已經在算的取消不了，算完才會還
+                future.cancel()
+                with _lock:
+                    _metrics["timeouts"] += 1
+                raise PasswordHasherBusyError("Password hasher timed out")
+            except BrokenProcessPool:
+                # 算到一半子 process 死掉：這個 job 的 slot 已經由 callback 還了，重佔一個再跑
+                _reset_pool(pool)
+                if retried:
+                    raise
+                _acquire_slot()
+
+    waited = max(time.monotonic() - started - cpu_seconds, 0.0)
+    with _lock:
+        _metrics[kind] += 1
+        prefix = "hash" if kind == "hashed" else "verify"
+        _metrics[f"{prefix}_seconds_total"] += cpu_seconds
+        _metrics[f"{prefix}_seconds_max"] = max(_metrics[f"{prefix}_seconds_max"], cpu_seconds)
+        _metrics["wait_seconds_total"] += waited
+    return result
+
+
+def hash_password(password: str) -> str:
+    return _run("hashed", _hash_job, password, _hash_method())
+
+
+def verify_password(pw_hash: str, password: str) -> bool:
+    return _run("verified", _verify_job, pw_hash, password)
+
+
+def needs_rehash(pw_hash: str) -> bool:
+    """存的雜湊參數（method$salt$hash 的 method 段）跟目前設定不一樣 → 登入成功時重算"""
+    return pw_hash.split("$", 1)[0] != _hash_method()
 
 
 def create_user(username: str, email: str, password: str, is_admin: bool = False) -> User:
     user = User(
         username=username,
         email=email,
-        password_hash=generate_password_hash(password),
+        password_hash=hash_password(password),
         is_admin=is_admin,
     )
     db.session.add(user)
     db.session.commit()
+    user_service.index_user(user)
+    if is_admin:
+        user_service.adjust_admin_count(1)
     return user
 
 
+def _upgrade_hash(user: User, password: str) -> None:
+    old_hash = user.password_hash
+    try:
+        new_hash = hash_password(password)
+    except PasswordHasherBusyError:
+        # 忙的時候先不升級，下次登入再說
+        return
+
+    # 條件式更新：同時間密碼被改過就不蓋掉
+    result = db.session.execute(
+        update(User)
+        .where(User.id == user.id, User.password_hash == old_hash)
+        .values(password_hash=new_hash)
+    )
+    db.session.commit()
+    if result.rowcount == 1:
+        with _lock:
+            _metrics["upgraded"] += 1
+
+
 def authenticate(username_or_email: str, password: str) -> Optional[User]:
+    """
+    驗證帳密（雜湊在 process pool 算），成功時順便把舊參數的雜湊升級成目前設定
+    pool 滿了丟 PasswordHasherBusyError
+    """
     q = User.query.filter(
         (User.username == username_or_email) | (User.email == username_or_email)
     )
     user = q.first()
-    if user and check_password_hash(user.password_hash, password):
-        return user
-    return None
+    if not user:
+        return None
+    # 算雜湊期間不佔著 DB 連線（先 expunge，rollback 後欄位值還在，不會再查一次）
+    db.session.expunge(user)
+    db.session.rollback()
+
+    if not verify_password(user.password_hash, password):
+        return None
+
+    if needs_rehash(user.password_hash):
+        _upgrade_hash(user, password)
+    return user
+
+
+def get_metrics() -> Dict[str, Any]:
+    with _lock:
+        hashed, verified = _metrics["hashed"], _metrics["verified"]
+        return {
+            **_metrics,
+            "inflight": _inflight,
+            "queue_max": _queue_max(),
+            "workers": _workers(),
+            "method": _hash_method(),
+            "hash_seconds_avg": (_metrics["hash_seconds_total"] / hashed) if hashed else 0.0,
+            "verify_seconds_avg": (_metrics["verify_seconds_total"] / verified) if verified else 0.0,
+        }
@@ -1,48 +1,58 @@
-from typing import Dict, Any, List, Tuple
+import uuid
+from typing import Dict, Any, List
 from flask import session
 from app.models.product import Product
+from app.services import cart_store
 
 
-CART_SESSION_KEY = "cart_items"  # { "<product_id>": quantity }
+CART_ID_SESSION_KEY = "cart_id"      # session 只放 cart_id，品項放在 cart_store
+CART_SESSION_KEY = "cart_items"      # 舊版：整台車放在 cookie session（只用來搬家）
+
+
+def _get_cart_id() -> str:
+    """
+    登入會員的 cart_id 固定是 u<user_id> → 換裝置登入也是同一台車
+    """
+    user_id = session.get("user_id")
+    cart_id = f"u{user_id}" if user_id else session.get(CART_ID_SESSION_KEY)
+    if not cart_id:
+        cart_id = uuid.uuid4().hex
+    if session.get(CART_ID_SESSION_KEY) != cart_id:
+        session[CART_ID_SESSION_KEY] = cart_id
+
+    # 舊 cookie 裡還有購物車 → 搬進 store 後從 session 拿掉
+    legacy = session.pop(CART_SESSION_KEY, None)
+    if isinstance(legacy, dict) and legacy:
+        store = cart_store.get_store()
+        for pid_str, qty in legacy.items():
+            store.add(cart_id, int(pid_str), int(qty))
+    return cart_id
 
 
 def _get_cart_dict() -> Dict[str, int]:
-    cart = session.get(CART_SESSION_KEY)
-    if not isinstance(cart, dict):
-        cart = {}
-        session[CART_SESSION_KEY] = cart
-    return cart
+    return cart_store.get_store().get(_get_cart_id())
 
 
 def add_item(product_id: int, qty: int = 1) -> None:
-    cart = _get_cart_dict()
-    key = str(product_id)
-    cart[key] = int(cart.get(key, 0)) + int(qty)
-    if cart[key] <= 0:
-        cart.pop(key, None)
-    session.modified = True
+    cart_store.get_store().add(_get_cart_id(), int(product_id), int(qty))
 
 
 def set_qty(product_id: int, qty: int) -> None:
-    cart = _get_cart_dict()
-    key = str(product_id)
-    qty = int(qty)
-    if qty <= 0:
-        cart.pop(key, None)
-    else:
-        cart[key] = qty
-    session.modified = True
+    cart_store.get_store().set_qty(_get_cart_id(), int(product_id), int(qty))
 
 
 def remove_item(product_id: int) -> None:
-    cart = _get_cart_dict()
-    cart.pop(str(product_id), None)
-    session.modified = True
+    cart_store.get_store().remove(_get_cart_id(), int(product_id))
+
+
+def clear(commit: bool = True) -> None:
+    # commit=False：讓結帳時跟訂單寫入同一個 transaction
+    cart_store.get_store().clear(_get_cart_id(), commit=commit)
 
 
-def clear() -> None:
-    session.pop(CART_SESSION_KEY, None)
-    session.modified = True
+def get_cart_lines() -> Dict[int, int]:
+    """只回傳 {product_id: qty}，不查商品（結帳用）"""
+    return {int(pid): int(qty) for pid, qty in _get_cart_dict().items() if int(qty) > 0}
 
 
 def get_cart_summary() -> Dict[str, Any]:
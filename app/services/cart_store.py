@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict
+
+from flask import current_app
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
+
+from app.database import db
+from app.models.cart_item import CartItem
+
+
+class MemoryCartStore:
+    """
+    單一 process 的 LRU 購物車：最多保留 max_carts 台車，超過就丟最久沒碰的
+    （多 worker 部署時每個 worker 各一份，只適合本機 / 單 worker）
+    """
+
+    def __init__(self, max_carts: int = 10000):
+        self.max_carts = max_carts
+        self._lock = threading.Lock()
+        self._carts: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+
+    def _touch(self, cart_id: str) -> Dict[str, int]:
+        cart = self._carts.get(cart_id)
+        if cart is None:
+            cart = {}
+            self._carts[cart_id] = cart
+            while len(self._carts) > self.max_carts:
+                self._carts.popitem(last=False)
+        else:
+            self._carts.move_to_end(cart_id)
+        return cart
+
+    def get(self, cart_id: str) -> Dict[str, int]:
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            if cart is None:
+                return {}
+            self._carts.move_to_end(cart_id)
+            return dict(cart)
+
+    def add(self, cart_id: str, product_id: int, qty: int) -> None:
+        with self._lock:
+            cart = self._touch(cart_id)
+            key = str(product_id)
+            cart[key] = int(cart.get(key, 0)) + int(qty)
+            if cart[key] <= 0:
+                cart.pop(key, None)
+
+    def set_qty(self, cart_id: str, product_id: int, qty: int) -> None:
+        with self._lock:
+            cart = self._touch(cart_id)
+            if qty <= 0:
+                cart.pop(str(product_id), None)
+            else:
+                cart[str(product_id)] = int(qty)
+
+    def remove(self, cart_id: str, product_id: int) -> None:
+        self.set_qty(cart_id, product_id, 0)
+
+    def clear(self, cart_id: str, commit: bool = True) -> None:
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+
+class DbCartStore:
+    """
+    存在 cart_items 表：多 worker / 多裝置都看得到同一台車
+    每個操作都是單一 UPDATE / INSERT / DELETE，不用先讀再寫
+    太久沒動的車由背景 thread 整台刪掉（CART_TTL_DAYS，見 sweep_expired）
+    """
+
+    def get(self, cart_id: str) -> Dict[str, int]:
+        rows = (
+            db.session.query(CartItem.product_id, CartItem.quantity)
+            .filter(CartItem.cart_id == cart_id)
+            .all()
+        )
+        return {str(pid): int(qty) for pid, qty in rows}
+
+    def _upsert(self, cart_id: str, product_id: int, values: dict, insert_qty: int) -> None:
+        result = db.session.execute(
+            db.update(CartItem)
+            .where(CartItem.cart_id == cart_id, CartItem.product_id == product_id)
+            .values(**values)
+        )
+        if result.rowcount or insert_qty <= 0:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(CartItem(cart_id=cart_id, product_id=product_id, quantity=insert_qty))
+        except IntegrityError:
+            # 同一台車同時加同一個商品（連點兩下 / 兩個分頁），對方先 INSERT 了 → 改回 UPDATE
+            db.session.execute(
+                db.update(CartItem)
+                .where(CartItem.cart_id == cart_id, CartItem.product_id == product_id)
+                .values(**values)
+            )
+
+    def add(self, cart_id: str, product_id: int, qty: int) -> None:
+        self._upsert(cart_id, product_id, {"quantity": CartItem.quantity + int(qty)}, int(qty))
+        db.session.execute(
+            db.delete(CartItem).where(
+                CartItem.cart_id == cart_id,
+                CartItem.product_id == product_id,
+                CartItem.quantity <= 0,
+            )
+        )
+        db.session.commit()
+
+    def set_qty(self, cart_id: str, product_id: int, qty: int) -> None:
+        if qty <= 0:
+            self.remove(cart_id, product_id)
+            return
+        self._upsert(cart_id, product_id, {"quantity": int(qty)}, int(qty))
+        db.session.commit()
+
+    def remove(self, cart_id: str, product_id: int) -> None:
+        db.session.execute(
+            db.delete(CartItem).where(CartItem.cart_id == cart_id, CartItem.product_id == product_id)
+        )
+        db.session.commit()
+
+    def clear(self, cart_id: str, commit: bool = True) -> None:
+        db.session.execute(db.delete(CartItem).where(CartItem.cart_id == cart_id))
+        if commit:
+            db.session.commit()
+
+    def sweep_expired(self, ttl_days: float) -> int:
+        """
+        刪掉整台都超過 ttl_days 沒動過的車（有任何一個品項最近動過就整台保留），回傳刪了幾筆
+        兩個子查詢都走 updated_at 的 index
+        """
+        cutoff = datetime.utcnow() - timedelta(days=ttl_days)
+        stale = select(CartItem.cart_id).where(or_(CartItem.updated_at < cutoff, CartItem.updated_at.is_(None)))
+        fresh = select(CartItem.cart_id).where(CartItem.updated_at >= cutoff)
+        result = db.session.execute(
+            db.delete(CartItem).where(CartItem.cart_id.in_(stale), CartItem.cart_id.not_in(fresh))
+        )
+        db.session.commit()
+        return result.rowcount
+
+
+_memory_store = None
+_store_lock = threading.Lock()
+_sweeper = None
+
+
+def _ensure_sweeper() -> None:
+    """CART_STORE=db 時每個 process 一條背景 thread，每 CART_SWEEP_INTERVAL 秒清一次過期的車"""
+    global _sweeper
+    with _store_lock:
+        if _sweeper is not None:
+            return
+        app = current_app._get_current_object()
+        interval = float(app.config.get("CART_SWEEP_INTERVAL", 3600))
+        ttl_days = float(app.config.get("CART_TTL_DAYS", 30))
+
+        def _run():
+            while True:
+                time.sleep(interval)
+                with app.app_context():
+                    try:
+                        DbCartStore().sweep_expired(ttl_days)
+                    except Exception:
+                        app.logger.exception("cart sweep failed")
+                    finally:
+                        db.session.remove()
+
+        _sweeper = threading.Thread(target=_run, name="cart-sweep", daemon=True)
+        _sweeper.start()
+
+
+def get_store():
+    """依 CART_STORE 設定回傳 backend：memory / db（預設）"""
+    global _memory_store
+    backend = current_app.config.get("CART_STORE", "db")
+    if backend == "memory":
+        with _store_lock:
+            if _memory_store is None:
+                _memory_store = MemoryCartStore(
+                    max_carts=int(current_app.config.get("CART_MEMORY_MAX_CARTS", 10000))
+                )
+        return _memory_store
+    _ensure_sweeper()
+    return DbCartStore()
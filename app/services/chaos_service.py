@@ -1,3 +1,11 @@
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from flask import current_app
+
+from app.database import db
 from app.models.chaos_config import ChaosConfig
 
 
@@ -8,10 +16,67 @@ SLOW_IMAGES       = "slow_images"
 BROKEN_IMAGES     = "broken_images"
 IMAGE_PERMISSION  = "image_permission_error"
 
+# 版本戳記：每次 set_flag 都換一個新值，其他 worker 看到版本不同就整包重載
+VERSION_KEY = "__chaos_version__"
+
+
+# ---- 每個 process 一份的 flag 快取 ----
+_cache_lock = threading.Lock()
+_cache = {
+    "flags": {},        # {key: value}
+    "version": None,    # 載入當下的 VERSION_KEY 值
+    "checked_at": 0.0,  # 上次跟 DB 對過版本的時間（monotonic）
+    "loaded": False,
+}
+
+
+def _ttl() -> float:
+    return float(current_app.config.get("CHAOS_FLAG_TTL", 5))
+
+
+def _reload_all() -> None:
+    """一個 query 撈出全部 chaos_config（含版本 row）"""
+    rows = ChaosConfig.get_all()
+    _cache["flags"] = rows
+    _cache["version"] = rows.get(VERSION_KEY)
+    _cache["loaded"] = True
+
+
+def _refresh_if_stale() -> Dict[str, Optional[str]]:
+    now = time.monotonic()
+    with _cache_lock:
+        if _cache["loaded"] and now - _cache["checked_at"] < _ttl():
+            return _cache["flags"]
+
+        if not _cache["loaded"]:
+            _reload_all()
+        else:
+            # TTL 到期：只查版本 row，版本沒變就沿用快取
+            version = ChaosConfig.get_value(VERSION_KEY)
+            if version != _cache["version"]:
+                _reload_all()
+
+        _cache["checked_at"] = now
+        return _cache["flags"]
+
+
+def invalidate_cache() -> None:
+    """讓本 worker 下一次讀 flag 時直接重載"""
+    with _cache_lock:
+        _cache["loaded"] = False
+        _cache["checked_at"] = 0.0
+
 
 def is_enabled(key: str) -> bool:
-    return ChaosConfig.get_bool(key, default=False)
+    flags = _refresh_if_stale()
+    if key not in flags:
+        return False
+    return ChaosConfig.to_bool(flags[key])
 
 
 def set_flag(key: str, flag: bool):
-    ChaosConfig.set_bool(key, flag)
+    # flag 跟版本戳記同一個 transaction 寫入
+    ChaosConfig.set_bool(key, flag, commit=False)
+    ChaosConfig.set_value(VERSION_KEY, uuid.uuid4().hex, commit=False)
+    db.session.commit()
+    invalidate_cache()
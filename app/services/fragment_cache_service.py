@@ -0,0 +1,161 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Hashable, Iterable, Optional, Set
+
+from flask import current_app
+
+from app.database import db
+from app.models.chaos_config import ChaosConfig
+
+
+# ---- 每個 process 一份的 HTML 片段快取（LRU，依 bytes 計算上限） ----
+# key -> (html, tags, size_bytes, expires_at)
+_lock = threading.Lock()
+_entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+_total_bytes = 0
+# 每次 purge 都 +1：查 DB 前先記下版本，寫回時版本變了就不放（避免把舊資料塞回去）
+_catalog_version = 0
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "purged": 0, "remote_purges": 0}
+
+# 跨 worker 的版本戳記（跟 chaos 的 __chaos_version__ 一樣放在 chaos_config 這張 key-value 表）
+# purge 時換一個新值；其他 worker 對到版本不同就把自己的片段整包丟掉
+VERSION_KEY = "__catalog_version__"
+_shared = {
+    "version": None,    # 上次看到的 VERSION_KEY 值
+    "checked_at": None,  # 上次跟 DB 對版本的時間（monotonic），None = 還沒對過
+}
+
+
+def _max_bytes() -> int:
+    return int(current_app.config.get("FRAGMENT_CACHE_MAX_BYTES", 4 * 1024 * 1024))
+
+
+def _ttl() -> float:
+    return float(current_app.config.get("FRAGMENT_CACHE_TTL", 60))
+
+
+def _version_ttl() -> float:
+    return float(current_app.config.get("FRAGMENT_CACHE_VERSION_TTL", 1))
+
+
+def _drop(key) -> None:
+    global _total_bytes
+    entry = _entries.pop(key, None)
+    if entry is not None:
+        _total_bytes -= entry[2]
+
+
+def product_list_tag(gender: Optional[str], season: Optional[str]) -> str:
+    """商品列表片段的 surrogate key：每個 (gender, season) 篩選組合一個"""
+    return f"products:{gender or '*'}:{season or '*'}"
+
+
+def product_tags(gender: str, season: str) -> Set[str]:
+    """
+    一個商品會出現在哪些列表片段：
+    自己的 gender/season、只篩 gender、只篩 season、全部商品
+    """
+    return {
+        product_list_tag(g, s)
+        for g in (gender, None)
+        for s in (season, None)
+    }
+
+
+def _sync_shared_version() -> None:
+    """
+    （呼叫端持有 _lock）跟 DB 的版本戳記對一下：
+    別的 worker purge 過 → 清掉本 worker 全部片段，版本 +1 讓渲染中的舊資料放不回來
+    """
+    global _catalog_version, _total_bytes
+    now = time.monotonic()
+    checked_at = _shared["checked_at"]
+    if checked_at is not None and now - checked_at < _version_ttl():
+        return
+    version = ChaosConfig.get_value(VERSION_KEY)
+    if checked_at is not None and version != _shared["version"]:
+        _entries.clear()
+        _total_bytes = 0
+        _catalog_version += 1
+        _stats["remote_purges"] += 1
+    _shared["version"] = version
+    _shared["checked_at"] = now
+
+
+def catalog_version() -> int:
+    with _lock:
+        _sync_shared_version()
+        return _catalog_version
+
+
+def get(key: Hashable) -> Optional[str]:
+    with _lock:
+        _sync_shared_version()
+        entry = _entries.get(key)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        if entry[3] < time.monotonic():
+            _drop(key)
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return entry[0]
+
+
+def put(key: Hashable, html: str, tags: Iterable[str] = (), version: Optional[int] = None) -> None:
+    global _total_bytes
+    size = len(html.encode("utf-8"))
+    budget = _max_bytes()
+    if size > budget:
+        return
+
+    with _lock:
+        if version is not None and version != _catalog_version:
+            # 渲染途中 catalog 被改過了
+            return
+        _drop(key)
+        _entries[key] = (html, frozenset(tags), size, time.monotonic() + _ttl())
+        _total_bytes += size
+
+        # 超過預算：從最久沒用的開始丟
+        while _total_bytes > budget and _entries:
+            old_key = next(iter(_entries))
+            _drop(old_key)
+            _stats["evictions"] += 1
+
+
+def purge(tags: Iterable[str]) -> int:
+    """
+    清掉本 worker 帶有任何一個 tag 的片段，回傳清掉幾筆
+    另外換掉 DB 上的版本戳記（自己 commit），其他 worker 最多延遲 FRAGMENT_CACHE_VERSION_TTL 秒
+    """
+    global _catalog_version
+    tags = frozenset(tags)
+    version = uuid.uuid4().hex
+    ChaosConfig.set_value(VERSION_KEY, version, commit=False)
+    db.session.commit()
+    with _lock:
+        _catalog_version += 1
+        _shared["version"] = version
+        _shared["checked_at"] = time.monotonic()
+        keys = [k for k, entry in _entries.items() if entry[1] & tags]
+        for k in keys:
+            _drop(k)
+        _stats["purged"] += len(keys)
+        return len(keys)
+
+
+def stats() -> dict:
+    with _lock:
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "bytes": _total_bytes,
+            "max_bytes": _max_bytes(),
+            "catalog_version": _catalog_version,
+            "shared_version": _shared["version"],
+        }
@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Optional, Tuple
+
+from flask import current_app, g, session
+
+from app.database import db
+from app.models.user import User
+
+
+# template / 權限判斷只需要這幾個欄位，不把 ORM 物件（含 password_hash）放進快取
+UserSnapshot = namedtuple("UserSnapshot", ["id", "username", "email", "is_admin"])
+
+
+# ---- 每個 process 一份的 user 快照快取 ----
+# user_id -> (snapshot or None, expires_at)；查不到的 user 也快取 None，避免被刪的帳號每次都打 DB
+_lock = threading.Lock()
+_cache: Dict[int, Tuple[Optional[UserSnapshot], float]] = {}
+_CACHE_MAX_ENTRIES = 10000
+
+
+def _ttl() -> float:
+    return float(current_app.config.get("IDENTITY_CACHE_TTL", 30))
+
+
+def get_user(user_id: int) -> Optional[UserSnapshot]:
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(user_id)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+
+    row = (
+        db.session.query(User.id, User.username, User.email, User.is_admin)
+        .filter(User.id == user_id)
+        .first()
+    )
+    snapshot = UserSnapshot(row.id, row.username, row.email, bool(row.is_admin)) if row else None
+
+    with _lock:
+        if len(_cache) >= _CACHE_MAX_ENTRIES:
+            _cache.clear()
+        _cache[user_id] = (snapshot, now + _ttl())
+    return snapshot
+
+
+def invalidate(user_id: int) -> None:
+    """admin 改 / 刪 user 後呼叫（只清得到自己這個 worker，其他 worker 最多延遲 TTL 秒）"""
+    with _lock:
+        _cache.pop(user_id, None)
+
+
+def current_user() -> Optional[UserSnapshot]:
+    """
+    lazy 載入：真的有人用到 current_user 才查（同一個 request 只查一次）
+    圖片 / health / static 這些不 render template 的 route 完全不會碰 DB
+    """
+    if "current_user" not in g:
+        user_id = session.get("user_id")
+        g.current_user = get_user(int(user_id)) if user_id is not None else None
+    return g.current_user
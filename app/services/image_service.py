@@ -1,28 +1,151 @@
 import os
+import tempfile
+import threading
 import time
-from flask import current_app, send_from_directory, abort
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from flask import current_app, send_from_directory, abort, request, make_response
+from werkzeug.http import is_resource_modified
+from werkzeug.utils import safe_join
+
 from app.services import chaos_service
 
+try:
+    from PIL import Image
+except ImportError:  # 沒裝 Pillow 就一律送原圖
+    Image = None
+
+
+# 允許的縮圖寬度（只開放固定幾種，避免被任意尺寸打爆磁碟 / CPU）
+IMAGE_WIDTHS = (160, 320, 640, 1280)
+
+# 商品列表用的縮圖寬度
+THUMB_WIDTH = 320
+
+# 帶 ?v= 的 URL 內容永遠不會變 → 瀏覽器 / CDN 可以放一年
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+# ---- stat 快取：熱門圖片不用每次都打檔案系統 ----
+# path -> (expires_at, (mtime, size) 或 None 代表不存在)
+_stat_lock = threading.Lock()
+_stat_cache: Dict[str, Tuple[float, Optional[Tuple[float, int]]]] = {}
+_STAT_CACHE_MAX_ENTRIES = 10000
+
+
+def _cached_stat(path: str) -> Optional[Tuple[float, int]]:
+    now = time.monotonic()
+    with _stat_lock:
+        hit = _stat_cache.get(path)
+        if hit is not None and hit[0] > now:
+            return hit[1]
+
+    try:
+        st = os.stat(path)
+        info = (st.st_mtime, st.st_size)
+    except OSError:
+        info = None
+
+    ttl = float(current_app.config.get("IMAGE_STAT_TTL", 5))
+    with _stat_lock:
+        if len(_stat_cache) >= _STAT_CACHE_MAX_ENTRIES:
+            _stat_cache.clear()
+        _stat_cache[path] = (now + ttl, info)
+    return info
+
+
+def _version(info: Tuple[float, int]) -> str:
+    """原圖的版本：mtime + size，檔案換了版本就會變"""
+    mtime, size = info
+    return f"{int(mtime * 1000):x}-{size:x}"
+
 def get_product_image_folder() -> str:
     """
     回傳商品圖片目錄，給新增商品 / seed 用。
     """
     return current_app.config["PRODUCT_IMAGE_FOLDER"]
 
-def product_image_url(filename: str) -> str:
+def product_image_url(filename: str, width: Optional[int] = None) -> str:
     """
     給 template 用的圖片 URL，統一走 /images/products/<filename>
     這樣我們就不直接用 /static，而是由 Flask route 來套 chaos。
+    width 有給就帶 ?w=，拿縮圖版本。
+    另外帶 ?v=<mtime+size>，內容換了 URL 就換 → 可以放心設很長的快取。
+    """
+    params = []
+    if width:
+        params.append(f"w={width}")
+
+    img_dir = current_app.config["PRODUCT_IMAGE_FOLDER"]
+    src_path = safe_join(img_dir, filename)
+    info = _cached_stat(src_path) if src_path else None
+    if info is not None:
+        params.append(f"v={_version(info)}")
+
+    url = f"/images/products/{filename}"
+    if params:
+        url += "?" + "&".join(params)
+    return url
+
+
+def _derivative_path(filename: str, width: int) -> Optional[str]:
+    cache_dir = current_app.config["PRODUCT_IMAGE_CACHE_FOLDER"]
+    return safe_join(cache_dir, f"w{width}", filename)
+
+
+def _ensure_derivative(src_path: str, dst_path: str, width: int) -> bool:
+    """
+    產生縮圖（只做一次）：
+    - 已存在且比原圖新 → 直接用
+    - 否則寫到同目錄的暫存檔，再 os.replace（atomic rename），不會被讀到一半的檔案
+    回傳 False 代表沒辦法產生（例如沒裝 Pillow），呼叫端就送原圖
     """
-    return f"/images/products/{filename}"
+    try:
+        if os.path.getmtime(dst_path) >= os.path.getmtime(src_path):
+            return True
+    except OSError:
+        pass
+
+    if Image is None:
+        return False
+
+    dst_dir = os.path.dirname(dst_path)
+    os.makedirs(dst_dir, exist_ok=True)
 
+    fd, tmp_path = tempfile.mkstemp(dir=dst_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out, Image.open(src_path) as img:
+            fmt = img.format or "JPEG"
+            # 只縮不放大，高度跟著比例走
+            img.thumbnail((width, width * 10))
+            if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            img.save(out, format=fmt, quality=82, optimize=True)
+        os.replace(tmp_path, dst_path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return True
 
-def serve_product_image(filename: str):
+
+def serve_product_image(filename: str, width: Optional[int] = None):
     """
     真正送出圖片的地方，可以注入各種 chaos：
     - 慢載入
     - 404
     - 500（權限）
+
+    width 在 IMAGE_WIDTHS 裡的話送縮圖（第一次請求時產生並存到快取目錄），
+    原圖永遠不會被改動。
+
+    快取：
+    - ETag = 原圖 mtime + size (+ 寬度)，縮圖由原圖決定，所以不用看縮圖檔
+    - If-None-Match / If-Modified-Since 命中 → 直接 304，不開檔
+    - URL 的 ?v= 跟目前版本一樣 → Cache-Control: immutable，放一年
     """
     img_dir = current_app.config["PRODUCT_IMAGE_FOLDER"]
 
@@ -38,7 +161,46 @@ def serve_product_image(filename: str):
         # 模擬慢 IO
         time.sleep(3)
 
-    if not os.path.exists(os.path.join(img_dir, filename)):
+    src_path = safe_join(img_dir, filename)
+    info = _cached_stat(src_path) if src_path else None
+    if info is None:
         abort(404)
 
-    return send_from_directory(img_dir, filename)
+    if width not in IMAGE_WIDTHS:
+        width = None
+
+    version = _version(info)
+    etag = f"{version}-w{width}" if width else version
+    last_modified = datetime.fromtimestamp(info[0], tz=timezone.utc)
+
+    if request.args.get("v") == version:
+        max_age = IMMUTABLE_MAX_AGE
+        immutable = True
+    else:
+        max_age = int(current_app.config.get("IMAGE_MAX_AGE", 60))
+        immutable = False
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        resp = make_response("", 304)
+        resp.set_etag(etag)
+    else:
+        send_dir, send_name = img_dir, filename
+        if width:
+            dst_path = _derivative_path(filename, width)
+            if dst_path is not None and _ensure_derivative(src_path, dst_path, width):
+                send_dir, send_name = os.path.dirname(dst_path), os.path.basename(dst_path)
+
+        resp = send_from_directory(
+            send_dir,
+            send_name,
+            etag=etag,
+            last_modified=last_modified,
+            max_age=max_age,
+            conditional=False,
+        )
+
+    resp.last_modified = last_modified
+    resp.cache_control.public = True
+    resp.cache_control.max_age = max_age
+    resp.cache_control.immutable = immutable
+    return resp
@@ -0,0 +1,228 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from werkzeug.utils import secure_filename
+
+from app.database import db
+from app.models.image_blob import ImageBlob
+from app.services import image_service
+
+
+_CHUNK_SIZE = 64 * 1024
+
+# 上傳暫存檔的副檔名；沒 commit 也沒 rollback（process 掛掉）留下來的，超過這個秒數由 sweep 清
+_UPLOAD_SUFFIX = ".upload"
+_STALE_UPLOAD_SECONDS = 3600
+
+# session.info 上等 commit 之後才搬的檔案：[(暫存檔, 正式檔名)]
+_PENDING_KEY = "image_blob_pending_files"
+
+# 每個 process 一條的背景 sweep thread；_sweep_wanted 被 set 就提早跑一輪
+_sweeper_lock = threading.Lock()
+_sweeper = None
+_sweep_wanted = threading.Event()
+
+
+def _claim(sha256: str) -> bool:
+    """ref_count + 1（原子 UPDATE），回傳這個 blob 原本是否已存在"""
+    result = db.session.execute(
+        db.update(ImageBlob)
+        .where(ImageBlob.sha256 == sha256)
+        .values(ref_count=ImageBlob.ref_count + 1)
+    )
+    return result.rowcount > 0
+
+
+def store_upload(upload) -> str:
+    """
+    存一張上傳的圖片，回傳要寫進 product_images.filename 的檔名
+    - 一邊讀一邊算 sha256 + 寫暫存檔（只讀一次）
+    - 已經有同樣內容 → 只加 ref_count，不再多存一份
+    - 沒有 → 新增 blob row
+    - 暫存檔等呼叫端 commit 之後才 os.replace 成 <sha256><ext>；rollback 就刪掉暫存檔
+    （不 commit，跟 ProductImage 一起由呼叫端 commit）
+    """
+    img_dir = image_service.get_product_image_folder()
+    os.makedirs(img_dir, exist_ok=True)
+
+    ext = os.path.splitext(secure_filename(upload.filename or ""))[1].lower() or ".jpg"
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=img_dir, suffix=_UPLOAD_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = upload.stream.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+
+        if _claim(sha256):
+            blob_filename = db.session.query(ImageBlob.filename).filter_by(sha256=sha256).scalar()
+        else:
+            blob_filename = f"{sha256}{ext}"
+            try:
+                with db.session.begin_nested():
+                    db.session.add(ImageBlob(sha256=sha256, filename=blob_filename, size=size, ref_count=1))
+            except IntegrityError:
+                # 同時有人上傳一樣的檔案，對方先建好了 → 改成加 ref_count
+                _claim(sha256)
+                blob_filename = db.session.query(ImageBlob.filename).filter_by(sha256=sha256).scalar()
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    db.session.info.setdefault(_PENDING_KEY, []).append((tmp_path, os.path.join(img_dir, blob_filename)))
+    return blob_filename
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session):
+    """
+    blob row commit 了才把暫存檔搬成正式檔名
+    不管檔案在不在都覆蓋（內容一樣、os.replace 是原子的）：
+    檔案可能是剛被 sweep 清掉的舊 blob，看到「存在」就跳過會留下指到空檔案的 row
+    commit 之後 ref_count >= 1，sweep 不會再刪這個檔
+    """
+    for tmp_path, final_path in session.info.pop(_PENDING_KEY, ()):
+        try:
+            os.replace(tmp_path, final_path)
+        except OSError:
+            # row 已經 commit 了，只能記下來；暫存檔留給 sweep 清
+            current_app.logger.exception("failed to move uploaded image %s", final_path)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _on_rollback(session, previous_transaction):
+    # 只有整個 transaction rollback 才丟（savepoint rollback 外層還在）
+    if session.in_transaction():
+        return
+    for tmp_path, _ in session.info.pop(_PENDING_KEY, ()):
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def release_product_images(product_id: int) -> None:
+    """
+    刪商品前呼叫：一個 set-based UPDATE 把這個商品用到的 blob 全部 ref_count 扣掉
+    （同一張圖用幾次就扣幾次；非內容定址的舊檔名對不到 blob，不受影響）
+    不 commit，跟刪 product_images 同一個 transaction
+    """
+    db.session.execute(
+        text("""
+            UPDATE image_blobs
+            SET ref_count = ref_count - (
+                SELECT COUNT(*)
+                FROM product_images pi
+                WHERE pi.product_id = :pid
+                  AND pi.filename = image_blobs.filename
+            )
+            WHERE filename IN (
+                SELECT filename FROM product_images WHERE product_id = :pid
+            )
+        """),
+        {"pid": product_id},
+    )
+
+
+def sweep_orphans() -> int:
+    """
+    清掉 ref_count <= 0 的 blob，回傳清了幾個
+    - DELETE 帶 ref_count <= 0 條件：如果剛好又被引用就不會刪到
+    - 刪檔在 commit 之前：DELETE 的 lock 還在，同時上傳同一張圖的 _claim / INSERT 會等到 commit 之後，
+      那時檔案已經刪完，上傳再 os.replace 寫回去，不會被這邊刪掉
+    """
+    img_dir = image_service.get_product_image_folder()
+    orphans = (
+        db.session.query(ImageBlob.id, ImageBlob.filename)
+        .filter(ImageBlob.ref_count <= 0)
+        .all()
+    )
+
+    removed = 0
+    for blob_id, filename in orphans:
+        result = db.session.execute(
+            db.delete(ImageBlob).where(ImageBlob.id == blob_id, ImageBlob.ref_count <= 0)
+        )
+        if result.rowcount == 0:
+            db.session.rollback()
+            continue
+        try:
+            os.remove(os.path.join(img_dir, filename))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            db.session.rollback()
+            raise
+        db.session.commit()
+        removed += 1
+    return removed
+
+
+def sweep_stale_uploads() -> int:
+    """
+    清掉沒 commit 也沒 rollback 就留下來的上傳暫存檔（process 中途掛掉），回傳清了幾個
+    只看 *.upload 而且夠舊的：還在進行中的上傳不會被清到
+    """
+    img_dir = image_service.get_product_image_folder()
+    cutoff = time.time() - _STALE_UPLOAD_SECONDS
+    removed = 0
+    try:
+        entries = list(os.scandir(img_dir))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if not entry.name.endswith(_UPLOAD_SUFFIX) or not entry.is_file():
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def _ensure_sweeper() -> None:
+    """每個 process 一條背景 sweep thread：IMAGE_SWEEP_INTERVAL 秒跑一輪，被叫醒就提早跑"""
+    global _sweeper
+    with _sweeper_lock:
+        if _sweeper is not None:
+            return
+        app = current_app._get_current_object()
+        interval = float(app.config.get("IMAGE_SWEEP_INTERVAL", 300))
+
+        def _run():
+            while True:
+                _sweep_wanted.wait(interval)
+                _sweep_wanted.clear()
+                with app.app_context():
+                    try:
+                        sweep_orphans()
+                        sweep_stale_uploads()
+                    except Exception:
+                        app.logger.exception("image blob sweep failed")
+                    finally:
+                        db.session.remove()
+
+        _sweeper = threading.Thread(target=_run, name="image-blob-sweep", daemon=True)
+        _sweeper.start()
+
+
+def sweep_in_background() -> None:
+    """叫醒背景 sweep thread，不卡住 admin 的刪除 request（連續刪很多商品也只有一條 thread 在跑）"""
+    _ensure_sweeper()
+    _sweep_wanted.set()
@@ -0,0 +1,289 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Index, MetaData, Table, inspect
+from sqlalchemy.schema import CreateIndex
+
+
+# 從 slow query 的 fingerprint 推「缺哪些 index」：
+# - 找出 WHERE / JOIN ON 裡的欄位（= / IN 是等值、< > BETWEEN LIKE 是範圍）跟 ORDER BY 的欄位
+# - 依 等值 → 排序 → 範圍 的順序組成候選 index
+# - 跟 DB 上已經有的 index / PK / unique 比對，蓋得到的就不建議
+# 只看得懂 SQLAlchemy 產生的 SQL 跟 repo 裡手寫的 text()，不是完整的 SQL parser
+
+_KEYWORDS = {
+    "where", "join", "inner", "left", "right", "outer", "full", "cross", "on", "order", "group",
+    "having", "limit", "offset", "fetch", "set", "values", "union", "for", "with", "select", "as",
+}
+
+_QUOTE_RE = re.compile(r'[\[\]"`]')
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN|UPDATE)\s+(?:\w+\.)?(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_PREDICATE_RE = re.compile(
+    r"(?<![\w.])(?:(\w+)\.)?(\w+)\s*(<=|>=|=|<|>|\bIN\b|\bLIKE\b|\bBETWEEN\b)\s*"
+    r"(\?(?:\s+ESCAPE\s+\?)?|\(\s*\?\s*\)|(\w+)\.(\w+))",
+    re.IGNORECASE,
+)
+_ORDER_BY_RE = re.compile(r"\bORDER\s+BY\s+(.+?)(?=\bLIMIT\b|\bOFFSET\b|\bFETCH\b|\)|$)", re.IGNORECASE)
+_SORT_ITEM_RE = re.compile(r"^(?:(\w+)\.)?(\w+)(?:\s+(?:ASC|DESC))?$", re.IGNORECASE)
+_OR_BEFORE_RE = re.compile(r"\bOR[\s(]*$", re.IGNORECASE)
+_OR_AFTER_RE = re.compile(r"^[\s)]*OR\b", re.IGNORECASE)
+
+_EQUALITY_OPS = ("=", "IN")
+# OR 的其中一邊：只有等值 / LIKE 才拆成單欄 index（keyset 分頁的 created_at < ? OR id < ? 不算）
+_OR_BRANCH_OPS = ("=", "IN", "LIKE")
+
+
+# ---------- 讀 DB 上現有的 schema ----------
+
+def load_schema(engine) -> Dict[str, Dict[str, Any]]:
+    """
+    {table: {"columns": set, "pk": [...], "unique": [[...]], "indexes": [[...]]}}
+    secondary index 後面會補上 PK 欄位（MSSQL nonclustered index 帶 clustered key、SQLite 帶 rowid）
+    """
+    insp = inspect(engine)
+    schema: Dict[str, Dict[str, Any]] = {}
+    for table in insp.get_table_names():
+        pk = list(insp.get_pk_constraint(table).get("constrained_columns") or [])
+        unique = [list(u["column_names"]) for u in insp.get_unique_constraints(table)]
+        indexes = []
+        for ix in insp.get_indexes(table):
+            cols = [c for c in ix.get("column_names") or [] if c]
+            if not cols:
+                continue
+            if ix.get("unique"):
+                unique.append(list(cols))
+            indexes.append(cols + [c for c in pk if c not in cols])
+        indexes.extend(unique)
+        if pk:
+            indexes.append(pk)
+        schema[table] = {
+            "columns": {c["name"] for c in insp.get_columns(table)},
+            "pk": pk,
+            "unique": unique,
+            "indexes": indexes,
+        }
+    return schema
+
+
+# ---------- 解析 fingerprint ----------
+
+def _strip_set_clause(sql: str) -> str:
+    """
+    UPDATE ... SET a = ?, b = (SELECT ...) WHERE ...
+    SET 的 a = / b = 不是篩選條件，拿掉；括號裡的子查詢（可能有 WHERE / 關聯條件）保留
+    """
+    m = re.search(r"\bSET\b", sql, re.IGNORECASE)
+    if m is None or not re.match(r"\s*UPDATE\b", sql, re.IGNORECASE):
+        return sql
+    out = [sql[:m.start()]]
+    depth = 0
+    i = m.end()
+    while i < len(sql):
+        ch = sql[i]
+        if depth == 0 and re.match(r"(?:WHERE|FROM)\b", sql[i:], re.IGNORECASE) and not sql[i - 1].isalnum():
+            break
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        out.append(ch if depth > 0 or ch == ")" else " ")
+        i += 1
+    out.append(sql[i:])
+    return "".join(out)
+
+
+def _resolve(qualifier: Optional[str], column: str, aliases: Dict[str, str],
+             schema: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    """欄位屬於哪張表；沒寫 table 前綴時，只有一張表有這個欄位才算得出來"""
+    if qualifier:
+        table = aliases.get(qualifier.lower())
+        if table and column in schema[table]["columns"]:
+            return table
+        return None
+    owners = {t for t in aliases.values() if column in schema[t]["columns"]}
+    return owners.pop() if len(owners) == 1 else None
+
+
+def analyze(fp: str, schema: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    一個 fingerprint 裡每張表的 access pattern：
+    [{"table", "equality": [...], "range": [...], "sort": [...], "or_branches": [...]}]
+    """
+    sql = _QUOTE_RE.sub("", fp)
+    if not re.match(r"\s*(?:SELECT|UPDATE|DELETE|WITH)\b", sql, re.IGNORECASE):
+        return []
+    sql = _strip_set_clause(sql)
+
+    tables = {t.lower(): t for t in schema}
+    aliases: Dict[str, str] = {}
+    for m in _TABLE_RE.finditer(sql):
+        table = tables.get(m.group(1).lower())
+        if table is None:
+            continue
+        aliases[table.lower()] = table
+        alias = m.group(2)
+        if alias and alias.lower() not in _KEYWORDS:
+            aliases[alias.lower()] = table
+    if not aliases:
+        return []
+
+    usage: Dict[str, Dict[str, List[str]]] = {}
+
+    def _add(table: str, kind: str, column: str) -> None:
+        cols = usage.setdefault(table, {"equality": [], "join": [], "range": [], "sort": [], "or_branches": []})[kind]
+        if column not in cols:
+            cols.append(column)
+
+    for m in _PREDICATE_RE.finditer(sql):
+        table = _resolve(m.group(1), m.group(2), aliases, schema)
+        op = m.group(3).upper()
+        if m.group(5):
+            # a.x = b.y：join 條件，兩邊的欄位都可能被拿來 seek
+            other = _resolve(m.group(5), m.group(6), aliases, schema)
+            if op != "=":
+                continue
+            if table:
+                _add(table, "join", m.group(2))
+            if other:
+                _add(other, "join", m.group(6))
+            continue
+        if table is None:
+            continue
+        column = m.group(2)
+        in_or = bool(_OR_BEFORE_RE.search(sql[:m.start()]) or _OR_AFTER_RE.match(sql[m.end():]))
+        if in_or:
+            if op in _OR_BRANCH_OPS:
+                _add(table, "or_branches", column)
+            elif op not in _EQUALITY_OPS:
+                _add(table, "range", column)
+        elif op in _EQUALITY_OPS:
+            _add(table, "equality", column)
+        else:
+            _add(table, "range", column)
+
+    # ORDER BY 的欄位全部屬於同一張表才有辦法用 index 排序
+    for m in _ORDER_BY_RE.finditer(sql):
+        resolved = []
+        for item in m.group(1).split(","):
+            sm = _SORT_ITEM_RE.match(item.strip())
+            table = _resolve(sm.group(1), sm.group(2), aliases, schema) if sm else None
+            if table is None:
+                resolved = []
+                break
+            resolved.append((table, sm.group(2)))
+        owners = {t for t, _ in resolved}
+        if len(owners) == 1:
+            table = owners.pop()
+            if table in usage and usage[table]["sort"]:
+                continue
+            for _, column in resolved:
+                _add(table, "sort", column)
+
+    result = []
+    for table, u in usage.items():
+        result.append({
+            "table": table,
+            "equality": u["equality"] + [c for c in u["join"] if c not in u["equality"]],
+            "range": u["range"],
+            "sort": u["sort"],
+            "or_branches": u["or_branches"],
+        })
+    return result
+
+
+# ---------- 候選 index ----------
+
+def _candidates(usage: Dict[str, Any]) -> List[Tuple[List[str], int]]:
+    """(欄位, 前幾欄是等值)；等值 → 排序 → 第一個範圍欄位"""
+    out = []
+    equality = usage["equality"]
+    columns = list(equality) + [c for c in usage["sort"] if c not in equality]
+    ranges = [c for c in usage["range"] if c not in columns]
+    if ranges:
+        columns.append(ranges[0])
+    if columns:
+        out.append((columns, len(equality)))
+    for column in usage["or_branches"]:
+        out.append(([column], 1))
+    return out
+
+
+def _covered(columns: Sequence[str], n_equality: int, existing: Iterable[Sequence[str]]) -> bool:
+    """
+    existing 裡有沒有 index 能用：前 n_equality 欄（等值，順序不拘）+ 後面的欄位依序對上
+    """
+    eq = set(columns[:n_equality])
+    rest = list(columns[n_equality:])
+    for ix in existing:
+        ix = list(ix)
+        if len(ix) < len(columns):
+            continue
+        if set(ix[:n_equality]) == eq and ix[n_equality:n_equality + len(rest)] == rest:
+            return True
+    return False
+
+
+def _hits_unique(equality: Sequence[str], table_schema: Dict[str, Any]) -> bool:
+    # 等值條件已經包含 PK / unique 的全部欄位 → 最多一筆，不需要再建
+    eq = set(equality)
+    keys = [table_schema["pk"]] + table_schema["unique"]
+    return any(k and set(k) <= eq for k in keys)
+
+
+def index_name(table: str, columns: Sequence[str]) -> str:
+    name = f"ix_{table}_{'_'.join(columns)}"
+    return name[:60]
+
+
+def suggest(fingerprints: List[Dict[str, Any]], schema: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    fingerprints：slow_query_service.get_fingerprints()["fingerprints"]（或從 JSON 讀回來的同格式）
+    回傳依「牽涉到的 query 總耗時」排序的建議：
+    [{"table", "columns", "name", "total_ms", "count", "fingerprints": [id, ...]}]
+    """
+    found: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+    for fp in fingerprints:
+        for usage in analyze(fp["fingerprint"], schema):
+            table = usage["table"]
+            table_schema = schema[table]
+            for columns, n_eq in _candidates(usage):
+                if _hits_unique(columns[:n_eq], table_schema):
+                    continue
+                if _covered(columns, n_eq, table_schema["indexes"]):
+                    continue
+                key = (table, tuple(columns))
+                s = found.setdefault(key, {"table": table, "columns": list(columns), "n_equality": n_eq, "hits": {}})
+                s["hits"][fp["id"]] = (fp.get("total_ms", 0.0), fp.get("count", 0))
+
+    # 被同一張表另一個建議蓋掉的就併過去（例如 (product_id) 併進 (product_id, filename)）
+    merged: List[Dict[str, Any]] = []
+    for s in sorted(found.values(), key=lambda s: -len(s["columns"])):
+        target = next(
+            (m for m in merged
+             if m["table"] == s["table"] and _covered(s["columns"], s["n_equality"], [m["columns"]])),
+            None,
+        )
+        if target is None:
+            merged.append(s)
+        else:
+            target["hits"].update(s["hits"])
+
+    result = []
+    for s in merged:
+        result.append({
+            "table": s["table"],
+            "columns": s["columns"],
+            "name": index_name(s["table"], s["columns"]),
+            "total_ms": sum(total for total, _ in s["hits"].values()),
+            "count": sum(count for _, count in s["hits"].values()),
+            "fingerprints": list(s["hits"]),
+        })
+    result.sort(key=lambda s: (-s["total_ms"], -s["count"], s["table"]))
+    return result
+
+
+def create_index_ddl(engine, suggestion: Dict[str, Any]) -> str:
+    """依目前連的 DB 產生 CREATE INDEX"""
+    table = Table(suggestion["table"], MetaData(), autoload_with=engine)
+    index = Index(suggestion["name"], *[table.c[c] for c in suggestion["columns"]])
+    return str(CreateIndex(index).compile(dialect=engine.dialect)).strip()
@@ -0,0 +1,133 @@
+import csv
+import io
+import json
+from typing import Iterator, Tuple
+
+from flask import current_app
+
+from app.database import db
+from app.models.order import Order
+from app.models.order_item import OrderItem
+from app.services import order_service
+
+
+# 匯出欄位（CSV 一列 = 一個訂單品項；沒有品項的訂單也會有一列，品項欄位空白）
+CSV_COLUMNS = [
+    "order_id", "user_id", "status", "created_at", "total_amount",
+    "item_id", "product_id", "product_name", "unit_price", "quantity",
+]
+
+
+# 試算表會把這些字元開頭的格子當公式執行（CSV injection），文字欄位前面補一個 '
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _batch_size() -> int:
+    return int(current_app.config.get("ORDER_EXPORT_BATCH_SIZE", 1000))
+
+
+def _iter_rows(filters: Tuple[str, str, str, str]) -> Iterator[tuple]:
+    """
+    訂單 LEFT JOIN 品項，一次只從 DB 拿 ORDER_EXPORT_BATCH_SIZE 列（yield_per → server-side cursor）
+    - 只查欄位不查 ORM 物件：不進 identity map，記憶體不會隨筆數長大
+    - 排序跟列表一樣（created_at DESC, id DESC），同一張訂單的品項會連在一起
+    """
+    query = (
+        order_service.admin_order_query(filters)
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .with_entities(
+            Order.id, Order.user_id, Order.status, Order.created_at, Order.total_amount,
+            OrderItem.id, OrderItem.product_id, OrderItem.product_name,
+            OrderItem.unit_price, OrderItem.quantity,
+        )
+        .order_by(Order.created_at.desc(), Order.id.desc(), OrderItem.id)
+        .yield_per(_batch_size())
+    )
+    try:
+        for row in query:
+            yield tuple(row)
+    finally:
+        # 串流結束（或 client 中途斷線）就把 cursor / 連線還回去
+        db.session.rollback()
+
+
+def _fmt(value) -> str:
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat(sep=" ")
+    return str(value)
+
+
+def _csv_cell(value) -> str:
+    """
+    CSV 專用：品名之類使用者可控的文字以公式字元開頭就加 ' 前綴（Excel 只會顯示成文字）
+    數字 / 日期不動（金額、數量不會是負的，也不能被改成文字）
+    """
+    text = _fmt(value)
+    if isinstance(value, str) and text.startswith(_FORMULA_PREFIXES):
+        return "'" + text
+    return text
+
+
+def iter_csv(filters: Tuple[str, str, str, str]) -> Iterator[str]:
+    """CSV（UTF-8 BOM，Excel 開中文品名才不會亂碼），每 batch 吐一次"""
+    batch_size = _batch_size()
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    buf.write("\ufeff")
+    writer.writerow(CSV_COLUMNS)
+
+    pending = 0
+    for row in _iter_rows(filters):
+        writer.writerow([_csv_cell(v) for v in row])
+        pending += 1
+        if pending >= batch_size:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+
+    yield buf.getvalue()
+
+
+def _order_json(order: dict) -> str:
+    return json.dumps(order, ensure_ascii=False) + "\n"
+
+
+def iter_ndjson(filters: Tuple[str, str, str, str]) -> Iterator[str]:
+    """NDJSON：一行一張訂單，品項放在 items 陣列（靠排序把同一張訂單的列收在一起）"""
+    batch_size = _batch_size()
+    chunk = []
+    current = None
+
+    for (order_id, user_id, status, created_at, total_amount,
+         item_id, product_id, product_name, unit_price, quantity) in _iter_rows(filters):
+        if current is None or current["order_id"] != order_id:
+            if current is not None:
+                chunk.append(_order_json(current))
+                if len(chunk) >= batch_size:
+                    yield "".join(chunk)
+                    chunk = []
+            current = {
+                "order_id": order_id,
+                "user_id": user_id,
+                "status": status,
+                "created_at": _fmt(created_at),
+                "total_amount": _fmt(total_amount),
+                "items": [],
+            }
+        if item_id is not None:
+            current["items"].append({
+                "item_id": item_id,
+                "product_id": product_id,
+                "product_name": product_name,
+                "unit_price": _fmt(unit_price),
+                "quantity": quantity,
+            })
+
+    if current is not None:
+        chunk.append(_order_json(current))
+    if chunk:
+        yield "".join(chunk)
@@ -1,40 +1,377 @@
-from typing import Dict
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from flask import current_app
+from sqlalchemy import case, func, insert, select, update
 from app.database import db
-from app.models.order import Order
+from app.models.order import ORDER_STATUSES as _ORDER_STATUSES, Order
 from app.models.order_item import OrderItem
-from app.services.cart_service import get_cart_summary, clear as clear_cart
+from app.models.product import Product
+from app.services import cart_service, pagination_service, stats_service
+
+
+# 我的訂單每頁筆數
+ORDERS_PER_PAGE = 20
+
+# 訂單狀態（admin 篩選下拉也用這份；定義在 model，跟 CHECK constraint 同一份）
+ORDER_STATUSES = list(_ORDER_STATUSES)
+
+
+# ---- admin 訂單列表的筆數快取（不在每次翻頁都跑 COUNT(*)） ----
+# filters tuple -> (count, computed_at)
+_count_lock = threading.Lock()
+_count_cache: Dict[Tuple[str, str, str, str], Tuple[int, float]] = {}
+_count_refreshing: set = set()
+_COUNT_CACHE_MAX_ENTRIES = 1000
+
+# 每個 process 一條的背景 thread：把放太久沒付款的訂單轉 failed、庫存還回去
+_expirer_lock = threading.Lock()
+_expirer: Optional[threading.Thread] = None
+# 一輪最多處理幾張過期訂單（一張一個 transaction，剩下的下一輪）
+_EXPIRE_BATCH = 500
+
+
+class OutOfStockError(ValueError):
+    """庫存不足（product_ids：哪些商品不夠）"""
+
+    def __init__(self, product_ids: List[int]):
+        super().__init__(f"Insufficient stock for products: {product_ids}")
+        self.product_ids = product_ids
+
+
+def _reserve_stock(lines: Dict[int, int]) -> List[int]:
+    """
+    一個 UPDATE 扣掉所有品項的庫存，順便回傳真的扣到的 id（MSSQL OUTPUT / SQLite RETURNING）：
+        UPDATE products SET stock = stock - CASE id WHEN .. THEN qty END
+        OUTPUT inserted.id
+        WHERE id IN (..) AND stock >= CASE id WHEN .. THEN qty END
+    回傳庫存不夠（沒被更新到）的 product_id；呼叫端要負責 rollback
+    （不能事後再查 stock >= qty：同一個 transaction 裡夠的品項已經被扣過，會被誤判成不夠）
+    """
+    qty_by_id = case(lines, value=Product.id)
+    result = db.session.execute(
+        update(Product)
+        .where(Product.id.in_(list(lines)), Product.stock >= qty_by_id)
+        .values(stock=Product.stock - qty_by_id)
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    )
+    reserved = set(result.scalars())
+    return [pid for pid in lines if pid not in reserved]
+
+
+def _order_lines(order_id: int) -> Dict[int, int]:
+    """{product_id: 數量}（同一個商品有多筆明細就加總）"""
+    rows = (
+        db.session.query(OrderItem.product_id, func.sum(OrderItem.quantity))
+        .filter(OrderItem.order_id == order_id)
+        .group_by(OrderItem.product_id)
+        .all()
+    )
+    return {pid: int(qty) for pid, qty in rows}
+
+
+def release_order_stock(order_id: int) -> None:
+    """
+    訂單轉 failed 時呼叫（_reserve_stock 的補償）：一個 UPDATE 把明細的數量加回庫存
+        UPDATE products SET stock = stock + (SELECT SUM(quantity) FROM order_items WHERE order_id = ? AND product_id = products.id)
+        WHERE id IN (SELECT product_id FROM order_items WHERE order_id = ?)
+    不 commit，要跟狀態轉換同一個 transaction（狀態沒轉成功就不能加回去）
+    """
+    qty = (
+        select(func.sum(OrderItem.quantity))
+        .where(OrderItem.order_id == order_id, OrderItem.product_id == Product.id)
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(Product)
+        .where(Product.id.in_(select(OrderItem.product_id).where(OrderItem.order_id == order_id)))
+        .values(stock=Product.stock + qty)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reserve_order_stock(order_id: int) -> None:
+    """
+    failed 的訂單重新付款時呼叫：庫存在轉 failed 時已經還回去了，要再扣一次
+    有任何一項不夠就丟 OutOfStockError（不 commit，呼叫端 rollback）
+    """
+    lines = _order_lines(order_id)
+    if not lines:
+        return
+    short = _reserve_stock(lines)
+    if short:
+        raise OutOfStockError(short)
+
+
+def fail_unpaid_order(order_id: int) -> bool:
+    """
+    created → failed 並還庫存（條件式 UPDATE：已經按了付款就不動），回傳有沒有轉成功
+    不 commit
+    """
+    result = db.session.execute(
+        update(Order)
+        .where(Order.id == order_id, Order.status == "created")
+        .values(status="failed")
+    )
+    if result.rowcount != 1:
+        return False
+    release_order_stock(order_id)
+    return True
+
+
+def expire_unpaid_orders() -> int:
+    """
+    created 超過 ORDER_UNPAID_TTL 秒還沒按付款 → 轉 failed，庫存還回去（使用者之後還是可以重新付款）
+    條件式 UPDATE：同時有人按付款（created → pending）的話這邊就不會動到；回傳轉了幾張
+    """
+    ttl = float(current_app.config.get("ORDER_UNPAID_TTL", 1800))
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+    order_ids = [
+        oid for (oid,) in (
+            db.session.query(Order.id)
+            .filter(Order.status == "created", Order.created_at < cutoff)
+            .order_by(Order.created_at, Order.id)
+            .limit(_EXPIRE_BATCH)
+        )
+    ]
+
+    expired = 0
+    for order_id in order_ids:
+        try:
+            if fail_unpaid_order(order_id):
+                expired += 1
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return expired
+
+
+def _ensure_expirer() -> None:
+    """第一次有人結帳時才啟動（每個 process 一條），每 ORDER_EXPIRE_INTERVAL 秒跑一次 expire_unpaid_orders"""
+    global _expirer
+    with _expirer_lock:
+        if _expirer is not None:
+            return
+        app = current_app._get_current_object()
+        interval = float(app.config.get("ORDER_EXPIRE_INTERVAL", 60))
+
+        def _run():
+            while True:
+                time.sleep(interval)
+                with app.app_context():
+                    try:
+                        expired = expire_unpaid_orders()
+                        if expired:
+                            app.logger.info("expired %d unpaid orders", expired)
+                    except Exception:
+                        app.logger.exception("unpaid order expiry failed")
+                    finally:
+                        db.session.remove()
+
+        _expirer = threading.Thread(target=_run, name="order-expire", daemon=True)
+        _expirer.start()
 
 
 def create_order_from_cart(user_id: int) -> Order:
     """
-    將目前購物車轉成一筆訂單（同步）
+    將目前購物車轉成一筆訂單（同步、單一 transaction）：
+    1. 一次 SELECT 取商品名稱 / 價格
+    2. 一個條件式 UPDATE 預扣所有品項庫存，有任何一項不夠就整筆 rollback
+    3. INSERT 訂單 + executemany INSERT 明細
+    4. 清空購物車，一起 commit
+    不管購物車有幾項，round trip 數都固定
+    付款失敗 / 太久沒付款（expire_unpaid_orders）轉 failed 時，庫存由 release_order_stock 還回去
     """
-    cart = get_cart_summary()
-    if not cart["items"]:
+    _ensure_expirer()
+    cart = cart_service.get_cart_lines()
+    if not cart:
         raise ValueError("Cart is empty")
 
-    order = Order(
-        user_id=user_id,
-        total_amount=cart["subtotal"],
-        status="created",
+    products = (
+        db.session.query(Product.id, Product.name, Product.price)
+        .filter(Product.id.in_(list(cart)))
+        .all()
     )
-    db.session.add(order)
-    db.session.flush()  # 取得 order.id（不 commit）
-
-    for item in cart["items"]:
-        p = item["product"]
-        oi = OrderItem(
-            order_id=order.id,
-            product_id=p.id,
-            product_name=p.name,
-            unit_price=p.price,
-            quantity=item["qty"],
+    # 商品已被刪掉，但購物車還有 -> 直接忽略
+    lines = {p.id: cart[p.id] for p in products}
+    if not lines:
+        raise ValueError("Cart is empty")
+
+    try:
+        short = _reserve_stock(lines)
+        if short:
+            raise OutOfStockError(short)
+
+        order = Order(
+            user_id=user_id,
+            total_amount=sum(float(p.price) * lines[p.id] for p in products),
+            status="created",
         )
-        db.session.add(oi)
+        db.session.add(order)
+        db.session.flush()  # 取得 order.id（不 commit）
 
-    db.session.commit()
+        db.session.execute(
+            insert(OrderItem),
+            [
+                {
+                    "order_id": order.id,
+                    "product_id": p.id,
+                    "product_name": p.name,
+                    "unit_price": p.price,
+                    "quantity": lines[p.id],
+                }
+                for p in products
+            ],
+        )
 
-    # 清空購物車
-    clear_cart()
+        # 統計 rollup + 清空購物車（跟訂單同一個 transaction）
+        stats_service.record_order_created(order)
+        cart_service.clear(commit=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
 
     return order
+
+
+def list_user_orders(user_id: int, cursor: Optional[str] = None, limit: int = ORDERS_PER_PAGE) -> Dict[str, Any]:
+    """
+    我的訂單：keyset 分頁（user_id, created_at, id），走 ix_orders_user_created
+    明細不逐筆 lazy load，改用一個 GROUP BY 算好每張訂單的件數 / 金額
+
+    回傳：{"items", "next_cursor", "prev_cursor", "aggregates": {order_id: {...}}}
+    """
+    query = Order.query.filter(Order.user_id == user_id)
+    page = pagination_service.keyset_page(query, Order.created_at, Order.id, cursor, limit)
+    page["aggregates"] = get_item_aggregates([o.id for o in page["items"]])
+    return page
+
+
+def get_item_aggregates(order_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    一個 query 算出多張訂單的明細彙總：
+    {order_id: {"line_count": 幾種商品, "total_qty": 總件數, "items_total": 明細金額合計}}
+    """
+    if not order_ids:
+        return {}
+
+    rows = (
+        db.session.query(
+            OrderItem.order_id,
+            func.count(OrderItem.id),
+            func.sum(OrderItem.quantity),
+            func.sum(OrderItem.unit_price * OrderItem.quantity),
+        )
+        .filter(OrderItem.order_id.in_(order_ids))
+        .group_by(OrderItem.order_id)
+        .all()
+    )
+    return {
+        order_id: {
+            "line_count": int(line_count),
+            "total_qty": int(total_qty or 0),
+            "items_total": float(items_total or 0),
+        }
+        for order_id, line_count, total_qty, items_total in rows
+    }
+
+
+def _parse_date(s: str) -> datetime:
+    return datetime.strptime(s, "%Y-%m-%d")
+
+
+def normalize_admin_filters(q: str, status: str, date_from: str, date_to: str) -> Tuple[str, str, str, str]:
+    """
+    整理 admin 訂單篩選條件（壞掉的日期清成空字串，讓 UI 回填為空，避免壞格式卡住）
+    回傳 (q, status, date_from, date_to)，也拿來當筆數快取的 key
+    """
+    q = (q or "").strip()
+    status = (status or "").strip()
+    date_from = (date_from or "").strip()
+    date_to = (date_to or "").strip()
+
+    if date_from:
+        try:
+            _parse_date(date_from)
+        except ValueError:
+            date_from = ""
+    if date_to:
+        try:
+            _parse_date(date_to)
+        except ValueError:
+            date_to = ""
+    return q, status, date_from, date_to
+
+
+def admin_order_query(filters: Tuple[str, str, str, str]):
+    """
+    依 admin 篩選條件組 Order query（列表 / 筆數 / 匯出共用）
+    - q：數字 -> order_id 或 user_id；否則 -> status 精準比對（走 ix_orders_status_created）
+    - status：精準等於
+    - date_from / date_to：date_from <= created_at < (date_to + 1 day)
+    """
+    q, status, date_from, date_to = filters
+    query = Order.query
+
+    if q:
+        if q.isdigit():
+            n = int(q)
+            query = query.filter((Order.id == n) | (Order.user_id == n))
+        else:
+            query = query.filter(Order.status == q.lower())
+
+    if status:
+        query = query.filter(Order.status == status)
+
+    if date_from:
+        query = query.filter(Order.created_at >= _parse_date(date_from))
+
+    if date_to:
+        query = query.filter(Order.created_at < _parse_date(date_to) + timedelta(days=1))  # inclusive end day
+
+    return query
+
+
+def _refresh_order_count(app, filters: Tuple[str, str, str, str]) -> None:
+    try:
+        with app.app_context():
+            count = admin_order_query(filters).order_by(None).count()
+        with _count_lock:
+            if len(_count_cache) >= _COUNT_CACHE_MAX_ENTRIES:
+                _count_cache.clear()
+            _count_cache[filters] = (count, time.monotonic())
+    except Exception:
+        app.logger.exception("order count refresh failed for %s", filters)
+    finally:
+        with _count_lock:
+            _count_refreshing.discard(filters)
+
+
+def get_cached_order_count(filters: Tuple[str, str, str, str]) -> Optional[int]:
+    """
+    回傳快取的筆數（可能是舊的，還沒算過就是 None）
+    過期或沒算過 → 丟背景 thread 重算，這個 request 不等 COUNT(*)
+    """
+    ttl = float(current_app.config.get("ADMIN_ORDER_COUNT_TTL", 60))
+    now = time.monotonic()
+    with _count_lock:
+        cached = _count_cache.get(filters)
+        stale = cached is None or now - cached[1] > ttl
+        start_refresh = stale and filters not in _count_refreshing
+        if start_refresh:
+            _count_refreshing.add(filters)
+
+    if start_refresh:
+        app = current_app._get_current_object()
+        threading.Thread(
+            target=_refresh_order_count,
+            args=(app, filters),
+            name="order-count-refresh",
+            daemon=True,
+        ).start()
+
+    return cached[0] if cached else None
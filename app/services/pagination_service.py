@@ -0,0 +1,119 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+
+# cursor 方向：n = 往後（較舊），p = 往前（較新）
+NEXT = "n"
+PREV = "p"
+
+
+def encode_cursor(direction: str, created_at: datetime, row_id: int) -> str:
+    """
+    把 (方向, created_at, id) 包成不透明的 token，放在 ?cursor= 上
+    """
+    raw = f"{direction}|{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[str, datetime, int]]:
+    """
+    解不開（被亂改 / 格式錯）就回 None，呼叫端當成第一頁處理
+    """
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        direction, created_raw, id_raw = raw.split("|")
+        if direction not in (NEXT, PREV):
+            return None
+        return direction, datetime.fromisoformat(created_raw), int(id_raw)
+    except (ValueError, UnicodeError, binascii.Error):
+        return None
+
+
+def keyset_page(query, created_col, id_col, cursor: Optional[str], limit: int) -> Dict[str, Any]:
+    """
+    以 (created_at DESC, id DESC) 做 keyset 分頁：
+    - 不用 OFFSET，第幾頁都是「從 index 某個位置往下讀 limit+1 筆」
+    - 多讀 1 筆只是為了知道還有沒有下一頁（不需要 COUNT）
+
+    回傳：
+    - items: 這一頁的資料（永遠是新 → 舊）
+    - next_cursor / prev_cursor: 沒有就是 None
+    """
+    decoded = decode_cursor(cursor)
+
+    if decoded is None:
+        direction = NEXT
+        rows = (
+            query.order_by(created_col.desc(), id_col.desc())
+            .limit(limit + 1)
+            .all()
+        )
+    else:
+        direction, c_at, c_id = decoded
+        if direction == NEXT:
+            # created_at <= c 讓 DB 可以直接 seek，OR 再處理同一時間的 tie
+            query = query.filter(
+                and_(created_col <= c_at, or_(created_col < c_at, id_col < c_id))
+            ).order_by(created_col.desc(), id_col.desc())
+        else:
+            query = query.filter(
+                and_(created_col >= c_at, or_(created_col > c_at, id_col > c_id))
+            ).order_by(created_col.asc(), id_col.asc())
+        rows = query.limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    items: List[Any] = rows[:limit]
+
+    next_cursor = None
+    prev_cursor = None
+
+    if direction == NEXT:
+        if has_more and items:
+            next_cursor = encode_cursor(NEXT, items[-1].created_at, items[-1].id)
+        if decoded is not None and items:
+            prev_cursor = encode_cursor(PREV, items[0].created_at, items[0].id)
+    else:
+        items.reverse()
+        if has_more and items:
+            prev_cursor = encode_cursor(PREV, items[0].created_at, items[0].id)
+        if items:
+            next_cursor = encode_cursor(NEXT, items[-1].created_at, items[-1].id)
+
+    return {"items": items, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
+
+def keyset_slice(keys: List[Tuple[datetime, int]], cursor: Optional[str], limit: int) -> Dict[str, Any]:
+    """
+    跟 keyset_page 同一套 cursor，給已經在記憶體裡的結果用（例如 n-gram 索引查出來的）
+    keys：(created_at, id)，已依 DESC 排好
+
+    回傳：
+    - keys: 這一頁的 (created_at, id)（新 → 舊）
+    - next_cursor / prev_cursor: 沒有就是 None
+    """
+    decoded = decode_cursor(cursor)
+
+    if decoded is None:
+        start, end = 0, limit
+    else:
+        direction, c_at, c_id = decoded
+        # 第一個「比 cursor 舊」的位置
+        pos = next((i for i, k in enumerate(keys) if k < (c_at, c_id)), len(keys))
+        if direction == NEXT:
+            start, end = pos, pos + limit
+        else:
+            if pos > 0 and keys[pos - 1] == (c_at, c_id):
+                pos -= 1
+            start, end = max(pos - limit, 0), pos
+
+    page = keys[start:end]
+    next_cursor = encode_cursor(NEXT, *page[-1]) if page and end < len(keys) else None
+    prev_cursor = encode_cursor(PREV, *page[0]) if page and start > 0 else None
+    return {"keys": page, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
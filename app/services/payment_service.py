@@ -1,12 +1,111 @@
 import random
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from flask import current_app
+from sqlalchemy import update
+
 from app.database import db
 from app.models.order import Order
+from app.services import order_service, stats_service
+
+
+class PaymentQueueFullError(RuntimeError):
+    """背景金流佇列滿了（back-pressure），請使用者稍後再試"""
+
+
+class LongPollBusyError(RuntimeError):
+    """這個 process 同時 hold 住的 long-poll 已經到上限（每個都佔一條 WSGI thread），請 client 晚點再問"""
+
+
+# ---- 每個 process 一份的背景金流 worker pool ----
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_inflight = 0  # 排隊中 + 處理中
+_flights: Dict[int, threading.Event] = {}  # order_id -> 第一個人處理完會 set
+_queued: set = set()                       # 本 process 丟進佇列、還沒跑完的 order_id（定期撿單時跳過）
+_recoverer: Optional[threading.Thread] = None
+_status_changed = threading.Condition()     # 本 process 有訂單狀態變動就 notify_all（給 long-poll）
+_waiters = 0                                # 目前 hold 住的 long-poll 數
+_metrics: Dict[str, Any] = {
+    "submitted": 0,
+    "rejected": 0,
+    "recovered": 0,
+    "paid": 0,
+    "failed": 0,
+    "skipped": 0,
+    "coalesced": 0,
+    "stale_claims": 0,  # 金流跑完才發現 lease 已經被撿走，結果沒寫進去
+    "longpoll_rejected": 0,
+    "errors": 0,
+    "gateway_seconds_total": 0.0,
+    "gateway_seconds_max": 0.0,
+}
+
+
+def _queue_max() -> int:
+    return int(current_app.config.get("PAYMENT_QUEUE_MAX", 100))
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(current_app.config.get("PAYMENT_WORKERS", 4)),
+                thread_name_prefix="payment",
+            )
+        return _executor
+
+
+def _try_reserve_slot() -> bool:
+    global _inflight
+    with _lock:
+        if _inflight >= _queue_max():
+            _metrics["rejected"] += 1
+            return False
+        _inflight += 1
+        return True
+
+
+def _release_slot() -> None:
+    global _inflight
+    with _lock:
+        _inflight -= 1
+
+
+def _submit(order_id: int) -> None:
+    """丟給背景 worker（呼叫前要先拿到 slot）"""
+    app = current_app._get_current_object()
+
+    def _run():
+        try:
+            with app.app_context():
+                finalize_payment_if_pending(order_id)
+        except Exception:
+            with _lock:
+                _metrics["errors"] += 1
+            app.logger.exception("payment worker failed for order %s", order_id)
+        finally:
+            with _lock:
+                _queued.discard(order_id)
+            _release_slot()
+
+    with _lock:
+        _metrics["submitted"] += 1
+        _queued.add(order_id)
+    _get_executor().submit(_run)
 
 
 def start_payment(order_id: int) -> Order:
     """
-    第一步：把訂單狀態設成 pending，立刻回應（讓 UI 顯示 loading）
+    把訂單狀態設成 pending，丟進背景 worker 後立刻回應（讓 UI 顯示 loading）
+    佇列滿了就丟 PaymentQueueFullError，訂單狀態不動
+    failed 的訂單重新付款要再扣一次庫存（轉 failed 時還回去了），不夠就丟 OutOfStockError，訂單維持 failed
     """
     order = Order.query.get(order_id)
     if not order:
@@ -15,27 +114,263 @@ def start_payment(order_id: int) -> Order:
     if order.status not in ("created", "failed"):
         return order
 
-    order.status = "pending"
+    if not _try_reserve_slot():
+        raise PaymentQueueFullError("Payment queue is full")
+
+    previous = order.status
+    try:
+        # 條件式轉 pending：同時按兩次付款只會有一次成功丟進佇列
+        result = db.session.execute(
+            update(Order)
+            .where(Order.id == order.id, Order.status == previous)
+            .values(status="pending")
+        )
+        if result.rowcount == 1 and previous == "failed":
+            order_service.reserve_order_stock(order.id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        _release_slot()
+        raise
+
+    if result.rowcount != 1:
+        _release_slot()
+        return _reload(order.id)
+
+    _submit(order.id)
+    return _reload(order.id)
+
+
+def _claim(order_id: int) -> Optional[str]:
+    """
+    原子搶單：UPDATE orders SET status='processing', processing_at=?, claim_token=? WHERE id=? AND status='pending'
+    只有一個人（不管幾個 process）會拿到 rowcount = 1，回傳 claim_token；沒搶到回 None
+    processing_at 只拿來判斷 lease 過期，是不是自己的單看 claim_token
+    """
+    token = uuid.uuid4().hex
+    result = db.session.execute(
+        update(Order)
+        .where(Order.id == order_id, Order.status == "pending")
+        .values(status="processing", processing_at=datetime.utcnow(), claim_token=token)
+    )
     db.session.commit()
-    return order
+    if result.rowcount != 1:
+        return None
+    _notify_status_changed()
+    return token
 
 
-def finalize_payment_if_pending(order_id: int) -> Order:
+def _complete(order_id: int, token: str, success: bool) -> bool:
     """
-    第二步：只要還在 pending，就執行「真正的假金流處理」並回寫 paid/failed
-    這段會被 pending 頁面自動刷新觸發
+    回寫金流結果：只有 claim_token 還是自己的才寫得進去（lease 過期被撿回去重跑的話，交給新的那一輪）
+    統計 rollup、失敗時還庫存，都跟狀態回寫同一個 transaction；回傳有沒有寫進去
     """
-    order = Order.query.get(order_id)
+    result = db.session.execute(
+        update(Order)
+        .where(Order.id == order_id, Order.status == "processing", Order.claim_token == token)
+        .values(status="paid" if success else "failed", processing_at=None, claim_token=None)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        current_app.logger.warning(
+            "payment result for order %s dropped: claim %s is no longer held", order_id, token
+        )
+        return False
+    stats_service.record_payment_result(order_id, success)
+    if not success:
+        order_service.release_order_stock(order_id)
+    db.session.commit()
+    return True
+
+
+def _reload(order_id: int) -> Order:
+    order = Order.query.populate_existing().get(order_id)
     if not order:
         raise ValueError("Order not found")
+    return order
 
-    if order.status != "pending":
-        return order
 
-    # 模擬金流延遲（你可以調大一點更容易看見 spinner）
-    time.sleep(random.uniform(1.0, 3.0))
+def finalize_payment_if_pending(order_id: int) -> Order:
+    """
+    背景 worker 執行：只要還在 pending，就執行「真正的假金流處理」並回寫 paid/failed
 
-    success = random.random() < 0.7
-    order.status = "paid" if success else "failed"
+    single-flight：
+    - 同一個 process 裡同一張訂單已經有人在跑 → 等它的結果，不重打金流
+    - 跨 process 靠 pending → processing 的原子搶單，搶不到就直接回目前狀態
+    """
+    with _lock:
+        flight = _flights.get(order_id)
+        leader = flight is None
+        if leader:
+            flight = threading.Event()
+            _flights[order_id] = flight
+
+    if not leader:
+        with _lock:
+            _metrics["coalesced"] += 1
+        flight.wait(timeout=30)
+        return _reload(order_id)
+
+    try:
+        token = _claim(order_id)
+        if token is None:
+            with _lock:
+                _metrics["skipped"] += 1
+            return _reload(order_id)
+
+        # 模擬金流延遲（在背景 thread 睡，不會卡住 WSGI worker）
+        started = time.monotonic()
+        time.sleep(random.uniform(1.0, 3.0))
+        elapsed = time.monotonic() - started
+
+        success = random.random() < 0.7
+        if not _complete(order_id, token, success):
+            with _lock:
+                _metrics["stale_claims"] += 1
+            return _reload(order_id)
+        _notify_status_changed()
+
+        with _lock:
+            _metrics["paid" if success else "failed"] += 1
+            _metrics["gateway_seconds_total"] += elapsed
+            _metrics["gateway_seconds_max"] = max(_metrics["gateway_seconds_max"], elapsed)
+        return _reload(order_id)
+    finally:
+        with _lock:
+            _flights.pop(order_id, None)
+        flight.set()
+
+
+def _notify_status_changed() -> None:
+    with _status_changed:
+        _status_changed.notify_all()
+
+
+def wait_for_status_change(order_id: int, since: str, timeout: float) -> Optional[str]:
+    """
+    long-poll 用：等到訂單狀態不是 since，或 timeout 秒到了，回傳目前狀態（找不到回 None）
+    - 本 process 的背景 worker 改了狀態 → 立刻被叫醒
+    - 其他 process 改的 → 每 PAYMENT_STATUS_POLL_INTERVAL 秒查一次（只查 status 一個欄位）
+    - 每次查完就 rollback，等待期間不佔用 DB 連線
+    - 同時 hold 住的數量超過 ORDER_STATUS_LONGPOLL_MAX_WAITERS 就丟 LongPollBusyError
+      （要比 WSGI thread 數少，不然等狀態的頁面會把結帳 / 瀏覽的 request 擠掉）
+    """
+    global _waiters
+    max_waiters = int(current_app.config.get("ORDER_STATUS_LONGPOLL_MAX_WAITERS", 8))
+    with _lock:
+        if _waiters >= max_waiters:
+            _metrics["longpoll_rejected"] += 1
+            raise LongPollBusyError("Too many status long-polls")
+        _waiters += 1
+
+    try:
+        deadline = time.monotonic() + timeout
+        poll_interval = float(current_app.config.get("PAYMENT_STATUS_POLL_INTERVAL", 1.0))
+
+        while True:
+            status = db.session.query(Order.status).filter(Order.id == order_id).scalar()
+            db.session.rollback()
+
+            remaining = deadline - time.monotonic()
+            if status != since or remaining <= 0:
+                return status
+
+            with _status_changed:
+                _status_changed.wait(min(poll_interval, remaining))
+    finally:
+        with _lock:
+            _waiters -= 1
+
+
+def release_expired_claims() -> int:
+    """
+    processing 超過 lease 還沒結果（搶到單之後 process 掛了 / 被重啟）→ 改回 pending
+    條件式 UPDATE：多個 worker 同時啟動也只會改一次；回傳改了幾筆
+    """
+    lease = float(current_app.config.get("PAYMENT_PROCESSING_LEASE", 60))
+    expired_before = datetime.utcnow() - timedelta(seconds=lease)
+    result = db.session.execute(
+        update(Order)
+        .where(
+            Order.status == "processing",
+            (Order.processing_at < expired_before) | Order.processing_at.is_(None),
+        )
+        .values(status="pending", processing_at=None, claim_token=None)
+    )
     db.session.commit()
-    return order
+    return result.rowcount
+
+
+def recover_pending_orders() -> int:
+    """
+    啟動時 + 背景定期（start_recovery_timer）呼叫：
+    卡在 pending（丟進佇列的 process 掛了）或 processing 但 lease 過期的訂單重新丟回背景處理
+    - 本 process 已經在佇列裡的跳過
+    - 別的 process 佇列裡的可能會被撿到，但 finalize 靠 pending → processing 原子搶單，只有一個會處理
+    佇列放不下的就留在 pending，下一輪再撿；回傳丟了幾筆
+    """
+    released = release_expired_claims()
+    if released:
+        current_app.logger.warning("released %d payment claims with expired lease", released)
+
+    order_ids = [oid for (oid,) in db.session.query(Order.id).filter(Order.status == "pending")]
+    db.session.rollback()
+    with _lock:
+        order_ids = [oid for oid in order_ids if oid not in _queued]
+
+    recovered = 0
+    for order_id in order_ids:
+        if not _try_reserve_slot():
+            current_app.logger.warning(
+                "payment queue full, %d pending orders left for next round",
+                len(order_ids) - recovered,
+            )
+            break
+        _submit(order_id)
+        recovered += 1
+
+    with _lock:
+        _metrics["recovered"] += recovered
+    return recovered
+
+
+def start_recovery_timer() -> None:
+    """
+    create_app 呼叫（每個 process 一條）：每 PAYMENT_RECOVER_INTERVAL 秒跑一次 recover_pending_orders
+    不用等下次重啟，lease 過期 / 沒人處理的 pending 訂單也會被撿回來；0 = 不啟動
+    """
+    global _recoverer
+    app = current_app._get_current_object()
+    interval = float(app.config.get("PAYMENT_RECOVER_INTERVAL", 30))
+    if interval <= 0:
+        return
+    with _lock:
+        if _recoverer is not None:
+            return
+
+        def _run():
+            while True:
+                time.sleep(interval)
+                with app.app_context():
+                    try:
+                        recover_pending_orders()
+                    except Exception:
+                        app.logger.exception("periodic payment recovery failed")
+                    finally:
+                        db.session.remove()
+
+        _recoverer = threading.Thread(target=_run, name="payment-recover", daemon=True)
+        _recoverer.start()
+
+
+def get_metrics() -> Dict[str, Any]:
+    with _lock:
+        done = _metrics["paid"] + _metrics["failed"]
+        return {
+            **_metrics,
+            "inflight": _inflight,
+            "longpoll_waiters": _waiters,
+            "queue_max": _queue_max(),
+            "workers": int(current_app.config.get("PAYMENT_WORKERS", 4)),
+            "gateway_seconds_avg": (_metrics["gateway_seconds_total"] / done) if done else 0.0,
+        }
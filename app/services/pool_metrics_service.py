@@ -0,0 +1,141 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Sequence
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+
+# histogram 的 bucket 上限（最後一格是 +Inf）
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+HOLD_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+LIFETIME_BUCKETS_S = (10, 60, 300, 900, 1800, 3600, 7200)
+
+
+class Histogram:
+    """固定 bucket 的 histogram（非累積計數，最後一格是超過最大 bucket 的）"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        # 用 list 保持 bucket 順序（jsonify 會把 dict 的 key 排序）
+        bounds = list(self.buckets) + ["+Inf"]
+        return {
+            "buckets": [{"le": le, "count": n} for le, n in zip(bounds, self.counts)],
+            "count": self.count,
+            "avg": (self.total / self.count) if self.count else 0.0,
+            "max": self.max,
+        }
+
+
+# ---- 每個 process 一份的連線池統計 ----
+_lock = threading.Lock()
+_wait_ms = Histogram(WAIT_BUCKETS_MS)          # 跟 pool 要連線等了多久
+_hold_ms = Histogram(HOLD_BUCKETS_MS)          # 借出去多久才還（chaos 慢查詢會把這個拉長）
+_lifetime_s = Histogram(LIFETIME_BUCKETS_S)    # 連線從建立到關掉活了多久
+_open: Dict[int, float] = {}                   # id(connection record) -> 建立時間
+_counters: Dict[str, int] = {
+    "connects": 0,
+    "closes": 0,
+    "checkouts": 0,
+    "checkins": 0,
+    "invalidations": 0,
+    "timeouts": 0,
+}
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool + 量「等連線」的時間
+    pool 的 event 只有借到之後（checkout）才會觸發，等待本身要包在 _do_get 外面量
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with _lock:
+                _counters["timeouts"] += 1
+            raise
+        finally:
+            waited_ms = (time.perf_counter() - started) * 1000
+            with _lock:
+                _wait_ms.observe(waited_ms)
+
+
+def install(engine) -> None:
+    """掛上 pool event（create_app 裡 db.init_app 之後呼叫）"""
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        with _lock:
+            _counters["connects"] += 1
+            _open[id(record)] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        record.info["checked_out_at"] = time.perf_counter()
+        with _lock:
+            _counters["checkouts"] += 1
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_conn, record):
+        started = record.info.pop("checked_out_at", None)
+        with _lock:
+            _counters["checkins"] += 1
+            if started is not None:
+                _hold_ms.observe((time.perf_counter() - started) * 1000)
+
+    @event.listens_for(engine, "close")
+    def _on_close(dbapi_conn, record):
+        with _lock:
+            _counters["closes"] += 1
+            created = _open.pop(id(record), None)
+            if created is not None:
+                _lifetime_s.observe(time.monotonic() - created)
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_conn, record, exception):
+        with _lock:
+            _counters["invalidations"] += 1
+
+
+def get_metrics(engine) -> Dict[str, Any]:
+    pool = engine.pool
+    now = time.monotonic()
+    data: Dict[str, Any] = {"pool_class": type(pool).__name__, "status": pool.status()}
+
+    if isinstance(pool, QueuePool):
+        data.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+
+    with _lock:
+        ages = [now - created for created in _open.values()]
+        data.update({
+            **_counters,
+            "open_connections": len(ages),
+            "oldest_connection_seconds": max(ages) if ages else 0.0,
+            "checkout_wait_ms": _wait_ms.snapshot(),
+            "checkout_hold_ms": _hold_ms.snapshot(),
+            "connection_lifetime_s": _lifetime_s.snapshot(),
+        })
+    return data
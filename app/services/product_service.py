@@ -1,21 +1,46 @@
-from typing import Optional, List
+from typing import Any, Dict, Optional
 
-from sqlalchemy import text
-from app.database import db
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, selectinload
+from app.database import db, random_order
 from app.models.product import Product
 from app.models.product_image import ProductImage
-from app.services import chaos_service
+from app.services import chaos_service, pagination_service
 
 
-def list_products(gender: Optional[str] = None, season: Optional[str] = None) -> List[Product]:
+# 商品列表每頁筆數
+PRODUCTS_PER_PAGE = 30
+
+
+def list_cacheable() -> bool:
+    """商品列表能不能走 fragment cache（chaos 開著時一定要真的打 DB）"""
+    return not (
+        chaos_service.is_enabled(chaos_service.SLOW_PRODUCT_LIST)
+        or chaos_service.is_enabled(chaos_service.NPLUS1_IMAGES)
+    )
+
+
+def list_products(
+    gender: Optional[str] = None,
+    season: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = PRODUCTS_PER_PAGE,
+) -> Dict[str, Any]:
     """
     商品列表：
-    - 正常模式：使用合理條件 + ORDER BY
+    - 正常模式：使用合理條件 + keyset 分頁（created_at, id），深頁跟第一頁一樣快
     - 開啟 slow_product_list 時：使用較爛的 query 模擬慢查詢
     - 開啟 NPLUS1_IMAGES 時：刻意 N+1 查圖片
+    - 其他情況：圖片用 selectin 一次撈回（1 個 IN query，不會 N+1）
+
+    回傳：{"items": [Product], "next_cursor": str|None, "prev_cursor": str|None}
     """
+    nplus1 = chaos_service.is_enabled(chaos_service.NPLUS1_IMAGES)
+
     # 只挑 active = 1 的商品
     query = Product.query.filter(Product.active == True)
+    if not nplus1:
+        query = query.options(selectinload(Product.images))
 
     if gender:
         query = query.filter(Product.gender == gender)
@@ -25,42 +50,49 @@ def list_products(gender: Optional[str] = None, season: Optional[str] = None) ->
 
     if chaos_service.is_enabled(chaos_service.SLOW_PRODUCT_LIST):
         # ====== 爛 query：模擬沒用 index、還用 LIKE、亂排序 ======
-        sql = text("""
-            SELECT p.*
-            FROM products p
-            WHERE p.active = 1
-              AND LOWER(p.name) LIKE '%shirt%'   -- 模擬亂用 LIKE
-            ORDER BY NEWID()                     -- 隨機排序
-        """)
+        # SELECT p.* FROM products p WHERE p.active = 1 AND LOWER(p.name) LIKE '%shirt%' ORDER BY NEWID()
+        # （隨機排序依 DB 換成 NEWID() / random()，SQLite 上也跑得起來）
+        sql = (
+            select(Product.__table__)
+            .where(
+                Product.active == True,
+                func.lower(Product.name).like("%shirt%"),  # 模擬亂用 LIKE
+            )
+            .order_by(random_order())                       # 隨機排序
+        )
         result = db.session.execute(sql)
         rows = result.mappings().all()
         # 手動轉成 Product 物件（簡單版）
         ids = [r["id"] for r in rows]
-        products = Product.query.filter(Product.id.in_(ids)).all()
+        id_query = Product.query.filter(Product.id.in_(ids))
+        if not nplus1:
+            id_query = id_query.options(selectinload(Product.images))
+        products = id_query.all()
+        # 爛 query 沒有分頁，一次全部丟回去
+        page = {"items": products, "next_cursor": None, "prev_cursor": None}
     else:
         # ====== 正常 query ======
-        products = query.order_by(Product.created_at.desc()).limit(30).all()
+        page = pagination_service.keyset_page(
+            query, Product.created_at, Product.id, cursor, limit
+        )
+        products = page["items"]
 
-    # ====== N+1 圖片查詢 ======
-    if chaos_service.is_enabled(chaos_service.NPLUS1_IMAGES):
+    # ====== N+1 圖片查詢（只有 chaos 開啟時才會走到） ======
+    if nplus1:
         # 每個商品再個別查一次圖片，製造很多小 query
         for p in products:
             imgs = db.session.query(ProductImage).filter_by(product_id=p.id).all()
             # 為了方便 template 使用，掛在一個暫時屬性上
             p._nplus1_images = imgs
-    else:
-        # 正常只用 relationship
-        for p in products:
-            _ = p.images
 
-    return products
+    return page
 
 
 def get_product_with_images(product_id: int) -> Optional[Product]:
-    product = Product.query.get(product_id)
-    if not product:
-        return None
-
-    # 正常情況：只用 relationship 取得圖片
-    _ = product.images
-    return product
+    # 單一商品：用 JOIN 一次把商品 + 圖片撈回來
+    return (
+        Product.query
+        .options(joinedload(Product.images))
+        .filter(Product.id == product_id)
+        .first()
+    )
@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+from flask import before_render_template, current_app, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+
+# ---- 每個 process 一份的 endpoint 統計（每個 endpoint 只留最近 REQUEST_METRICS_WINDOW 筆） ----
+# endpoint -> deque[(total_ms, db_ms, template_ms, queries, rows)]
+_lock = threading.Lock()
+_samples: Dict[str, Deque[Tuple[float, float, float, int, int]]] = {}
+_totals: Dict[str, int] = {}   # endpoint -> 開機以來的 request 數
+_slow: Dict[str, int] = {}     # endpoint -> 超過門檻被記 log 的次數
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct), len(ordered) - 1)]
+
+
+def _request_stats():
+    """這個 request 的累計值（沒有 request context 的背景 thread 不統計）"""
+    if not has_request_context():
+        return None
+    stats = g.get("_sql_stats")
+    if stats is None:
+        stats = g._sql_stats = {"queries": 0, "db_seconds": 0.0, "rows": 0, "template_seconds": 0.0, "render_depth": 0}
+    return stats
+
+
+# ---------- SQLAlchemy cursor events ----------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats()
+    if stats is None:
+        return
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    stats["queries"] += 1
+    stats["db_seconds"] += time.perf_counter() - started
+    # SELECT 在大部分 driver 上 rowcount 是 -1，只算得到 INSERT / UPDATE / DELETE 影響的筆數
+    if cursor.rowcount and cursor.rowcount > 0:
+        stats["rows"] += cursor.rowcount
+
+
+# ---------- template 時間（巢狀 render 只算最外層） ----------
+
+def _before_render(sender, template, context, **extra):
+    stats = _request_stats()
+    if stats is None:
+        return
+    if stats["render_depth"] == 0:
+        g._render_started = time.perf_counter()
+    stats["render_depth"] += 1
+
+
+def _after_render(sender, template, context, **extra):
+    stats = _request_stats()
+    if stats is None or stats["render_depth"] == 0:
+        return
+    stats["render_depth"] -= 1
+    if stats["render_depth"] == 0:
+        stats["template_seconds"] += time.perf_counter() - g._render_started
+
+
+# ---------- request hooks ----------
+
+def _start_request():
+    g._request_started = time.perf_counter()
+
+
+def _finish_request(response):
+    started = g.get("_request_started")
+    if started is None:
+        return response
+
+    stats = _request_stats()
+    total_ms = (time.perf_counter() - started) * 1000
+    db_ms = stats["db_seconds"] * 1000
+    template_ms = stats["template_seconds"] * 1000
+    queries = stats["queries"]
+
+    response.headers.add(
+        "Server-Timing",
+        f'db;dur={db_ms:.1f};desc="{queries} queries", tpl;dur={template_ms:.1f}, total;dur={total_ms:.1f}',
+    )
+
+    endpoint = request.endpoint or "<unmatched>"
+    max_queries = int(current_app.config.get("SLOW_REQUEST_QUERIES", 20))
+    max_ms = float(current_app.config.get("SLOW_REQUEST_MS", 500))
+    is_slow = queries > max_queries or total_ms > max_ms
+    if is_slow:
+        current_app.logger.warning(
+            "slow request %s %s (%s): %.1fms total, %d queries / %.1fms db, %d rows, %.1fms template",
+            request.method, request.path, endpoint, total_ms, queries, db_ms, stats["rows"], template_ms,
+        )
+
+    window = int(current_app.config.get("REQUEST_METRICS_WINDOW", 200))
+    with _lock:
+        samples = _samples.get(endpoint)
+        if samples is None or samples.maxlen != window:
+            samples = _samples[endpoint] = deque(samples or (), maxlen=window)
+        samples.append((total_ms, db_ms, template_ms, queries, stats["rows"]))
+        _totals[endpoint] = _totals.get(endpoint, 0) + 1
+        if is_slow:
+            _slow[endpoint] = _slow.get(endpoint, 0) + 1
+    return response
+
+
+def install(app, engine) -> None:
+    """create_app 裡呼叫：掛 cursor event、template signal、before / after_request"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+
+def get_aggregates() -> Dict[str, Any]:
+    """各 endpoint 最近 N 筆的平均 / p95 / 最大值（依 p95 總時間排序，慢的在前面）"""
+    with _lock:
+        snapshot = {ep: list(s) for ep, s in _samples.items()}
+        totals = dict(_totals)
+        slow = dict(_slow)
+
+    rows = []
+    for endpoint, samples in snapshot.items():
+        total_ms = [s[0] for s in samples]
+        db_ms = [s[1] for s in samples]
+        template_ms = [s[2] for s in samples]
+        queries = [s[3] for s in samples]
+        rows_written = [s[4] for s in samples]
+        n = len(samples)
+        rows.append({
+            "endpoint": endpoint,
+            "requests": totals.get(endpoint, 0),
+            "slow": slow.get(endpoint, 0),
+            "window": n,
+            "total_ms_avg": sum(total_ms) / n,
+            "total_ms_p95": _percentile(total_ms, 0.95),
+            "total_ms_max": max(total_ms),
+            "db_ms_avg": sum(db_ms) / n,
+            "db_ms_p95": _percentile(db_ms, 0.95),
+            "template_ms_avg": sum(template_ms) / n,
+            "queries_avg": sum(queries) / n,
+            "queries_max": max(queries),
+            "rows_avg": sum(rows_written) / n,
+        })
+
+    rows.sort(key=lambda r: -r["total_ms_p95"])
+    return {"endpoints": rows}
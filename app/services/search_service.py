@@ -0,0 +1,254 @@
+import math
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy.orm import selectinload
+
+from app.database import db
+from app.models.chaos_config import ChaosConfig
+from app.models.product import Product
+
+
+# 英數字一段、CJK 一段（商品名稱多是繁中，例如「男生白色 T-shirt」）
+_TOKEN_RE = re.compile(r"[0-9a-z]+|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+# 欄位權重：名稱比描述重要
+NAME_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+SEARCH_PER_PAGE = 20
+
+# 一次拿去 DB 確認 active 的 id 數（MSSQL 一個 statement 最多 2100 個參數）
+_ID_CHUNK = 1000
+
+# 版本戳記（放在 chaos_config，同 __chaos_version__）：admin 改商品時換新值，
+# 其他 worker 的背景 thread 看到版本不同就重建自己的索引
+VERSION_KEY = "__search_version__"
+
+
+# ---- 每個 process 一份的倒排索引 ----
+_lock = threading.Lock()
+_postings: Dict[str, Dict[int, int]] = {}  # token -> {product_id: 加權 tf}
+_doc_tokens: Dict[int, List[str]] = {}     # product_id -> 它有哪些 token（刪除/更新時用）
+_built_at = 0.0
+_built_version: Optional[str] = None       # 建索引當下的 VERSION_KEY 值
+_refresher: Optional[threading.Thread] = None
+
+
+def _is_cjk(ch: str) -> bool:
+    return not ("0" <= ch <= "9" or "a" <= ch <= "z")
+
+
+def tokenize(text: Optional[str], for_query: bool = False) -> List[str]:
+    """
+    - 英數字：整個字一個 token（T-shirt → t, shirt）
+    - CJK：bigram（白色T → 白色、色T）
+      建索引時另外放 unigram，讓單一個中文字也查得到；
+      查詢時只有單字才用 unigram，多字用 bigram 比較精準
+    """
+    tokens: List[str] = []
+    for run in _TOKEN_RE.findall((text or "").lower()):
+        if not _is_cjk(run[0]):
+            tokens.append(run)
+            continue
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        if not for_query:
+            tokens.extend(run)
+    return tokens
+
+
+def _doc_weights(product: Product) -> Dict[str, int]:
+    weights: Dict[str, int] = defaultdict(int)
+    for t in tokenize(product.name):
+        weights[t] += NAME_WEIGHT
+    for t in tokenize(product.description):
+        weights[t] += DESCRIPTION_WEIGHT
+    return weights
+
+
+def _remove_locked(product_id: int) -> None:
+    for t in _doc_tokens.pop(product_id, []):
+        posting = _postings.get(t)
+        if posting is None:
+            continue
+        posting.pop(product_id, None)
+        if not posting:
+            del _postings[t]
+
+
+def _add_locked(product: Product) -> None:
+    weights = _doc_weights(product)
+    for t, w in weights.items():
+        _postings.setdefault(t, {})[product.id] = w
+    _doc_tokens[product.id] = list(weights)
+
+
+def build_index() -> int:
+    """
+    全量重建（啟動時 / 背景 thread 呼叫）：只索引 active 商品，回傳索引了幾筆
+    """
+    global _postings, _doc_tokens, _built_at, _built_version
+    # 先讀版本再讀商品：讀商品途中又有人改 → 版本對不上，下一輪再重建一次
+    version = ChaosConfig.get_value(VERSION_KEY)
+    products = Product.query.filter(Product.active == True).all()
+
+    postings: Dict[str, Dict[int, int]] = {}
+    doc_tokens: Dict[int, List[str]] = {}
+    for p in products:
+        weights = _doc_weights(p)
+        for t, w in weights.items():
+            postings.setdefault(t, {})[p.id] = w
+        doc_tokens[p.id] = list(weights)
+
+    # 整包換掉，查詢不會被重建卡住
+    with _lock:
+        _postings = postings
+        _doc_tokens = doc_tokens
+        _built_at = time.monotonic()
+        _built_version = version
+    return len(products)
+
+
+def _bump_version() -> None:
+    """自己的索引已經改好了，換版本讓其他 worker 重建（自己 commit）"""
+    global _built_version
+    version = uuid.uuid4().hex
+    ChaosConfig.set_value(VERSION_KEY, version, commit=False)
+    db.session.commit()
+    with _lock:
+        _built_version = version
+
+
+def index_product(product: Product) -> None:
+    """新增 / 編輯商品後呼叫：只更新這一筆"""
+    with _lock:
+        _remove_locked(product.id)
+        if product.active:
+            _add_locked(product)
+    _bump_version()
+
+
+def remove_product(product_id: int) -> None:
+    with _lock:
+        _remove_locked(product_id)
+    _bump_version()
+
+
+def refresh_if_stale() -> bool:
+    """
+    其他 worker 改過商品（版本不同）或太久沒重建（SEARCH_INDEX_MAX_AGE，追 seed.py 之類直接改 DB 的）
+    就重建；回傳有沒有重建
+    """
+    max_age = float(current_app.config.get("SEARCH_INDEX_MAX_AGE", 300))
+    version = ChaosConfig.get_value(VERSION_KEY)
+    if version == _built_version and time.monotonic() - _built_at <= max_age:
+        return False
+    build_index()
+    return True
+
+
+def _ensure_refresher() -> None:
+    """第一次有人搜尋時才啟動背景重建 thread（每個 process 一條），request 不會自己重建"""
+    global _refresher
+    with _lock:
+        if _refresher is not None:
+            return
+        app = current_app._get_current_object()
+        interval = float(app.config.get("SEARCH_INDEX_REFRESH_INTERVAL", 5))
+
+        def _run():
+            while True:
+                time.sleep(interval)
+                with app.app_context():
+                    try:
+                        refresh_if_stale()
+                    except Exception:
+                        app.logger.exception("search index refresh failed")
+                    finally:
+                        db.session.remove()
+
+        _refresher = threading.Thread(target=_run, name="search-index-refresh", daemon=True)
+        _refresher.start()
+
+
+def search_ids(q: str) -> List[int]:
+    """
+    回傳依分數排序的 product_id（所有 query token 都要命中）
+    分數：sum(欄位加權 tf * idf)
+    """
+    tokens = list(dict.fromkeys(tokenize(q, for_query=True)))
+    if not tokens:
+        return []
+
+    _ensure_refresher()
+
+    with _lock:
+        postings = [_postings.get(t) for t in tokens]
+        if any(p is None for p in postings):
+            return []
+
+        total_docs = max(len(_doc_tokens), 1)
+        # 從最短的 posting list 開始交集
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            candidates &= p.keys()
+            if not candidates:
+                return []
+
+        scores = {}
+        for pid in candidates:
+            score = 0.0
+            for p in postings:
+                idf = math.log(1 + total_docs / len(p))
+                score += p[pid] * idf
+            scores[pid] = score
+
+    return sorted(candidates, key=lambda pid: (-scores[pid], -pid))
+
+
+def _active_ids(ids: List[int]) -> List[int]:
+    """
+    索引可能還沒追上別的 worker 的下架 / 刪除：先跟 DB 對一次，只留還是 active 的（保持原本的排序）
+    只撈 id（走 PK），不載入整個商品
+    """
+    active = set()
+    for i in range(0, len(ids), _ID_CHUNK):
+        chunk = ids[i:i + _ID_CHUNK]
+        rows = db.session.query(Product.id).filter(Product.id.in_(chunk), Product.active == True).all()
+        active.update(pid for pid, in rows)
+    return [pid for pid in ids if pid in active]
+
+
+def search_products(q: str, page: int = 1, per_page: int = SEARCH_PER_PAGE) -> Dict[str, Any]:
+    """
+    回傳：
+    - items: 這一頁的 Product（含圖片，已 selectin 載入）
+    - total / page / pages（只算目前還是 active 的商品）
+    """
+    ids = _active_ids(search_ids(q))
+    total = len(ids)
+    pages = (total + per_page - 1) // per_page
+    page = max(1, min(page, pages or 1))
+
+    page_ids = ids[(page - 1) * per_page: page * per_page]
+    items: List[Product] = []
+    if page_ids:
+        rows = (
+            Product.query
+            .options(selectinload(Product.images))
+            .filter(Product.id.in_(page_ids), Product.active == True)
+            .all()
+        )
+        by_id = {p.id: p for p in rows}
+        items = [by_id[pid] for pid in page_ids if pid in by_id]
+
+    return {"items": items, "total": total, "page": page, "pages": pages}
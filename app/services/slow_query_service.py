@@ -0,0 +1,208 @@
+import hashlib
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+
+
+# ---- SQL 正規化成 fingerprint（同一種 query 不管參數是什麼都算同一筆） ----
+_STRING_RE = re.compile(r"N?'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s|:\w+|@P\d+|\?")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_RE = re.compile(r"\bVALUES\s*\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+# 每個 fingerprint 留最近幾筆耗時（算 p95 用）
+_DURATIONS_KEPT = 200
+
+# 不記錄的 execution option（抓 plan 自己下的 query 不要又被記進來）
+SKIP_OPTION = "skip_slow_query_log"
+
+
+def fingerprint(statement: str) -> str:
+    """
+    SELECT ... WHERE id = 5 AND name = 'x' AND id IN (1, 2, 3)
+    → SELECT ... WHERE id = ? AND name = ? AND id IN (?)
+    """
+    sql = _STRING_RE.sub("?", statement)
+    sql = _PARAM_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("IN (?)", sql)
+    sql = _VALUES_RE.sub("VALUES (?)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+def fingerprint_id(fp: str) -> str:
+    return hashlib.sha1(fp.encode("utf-8")).hexdigest()[:12]
+
+
+# ---- 每個 process 一份的 slow query 統計 ----
+_lock = threading.Lock()
+_entries: Dict[str, Dict[str, Any]] = {}   # fingerprint -> stats
+_dropped = 0                               # fingerprint 數量滿了之後沒記到的次數
+_settings: Dict[str, Any] = {"threshold_ms": 100.0, "max_fingerprints": 500, "capture_plan": False}
+_plan_executor: Optional[ThreadPoolExecutor] = None
+_plan_pending: set = set()
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct), len(ordered) - 1)]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._slow_query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_slow_query_started", None)
+    if started is None or context.execution_options.get(SKIP_OPTION):
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms < _settings["threshold_ms"]:
+        return
+    _record(statement, elapsed_ms, conn.engine, None if executemany else parameters)
+
+
+def _record(statement: str, elapsed_ms: float, engine, parameters) -> None:
+    global _dropped
+    fp = fingerprint(statement)
+    now = time.time()
+    with _lock:
+        entry = _entries.get(fp)
+        if entry is None:
+            if len(_entries) >= _settings["max_fingerprints"]:
+                _dropped += 1
+                return
+            entry = _entries[fp] = {
+                "id": fingerprint_id(fp),
+                "fingerprint": fp,
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "durations": deque(maxlen=_DURATIONS_KEPT),
+                "first_seen": now,
+                "last_seen": now,
+                "plan": None,
+            }
+        entry["count"] += 1
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        entry["durations"].append(elapsed_ms)
+        entry["last_seen"] = now
+        # 只對 SELECT 抓 plan（executemany 的參數是多組，沒辦法重送）
+        want_plan = (
+            _settings["capture_plan"]
+            and parameters is not None
+            and entry["plan"] is None
+            and fp not in _plan_pending
+            and statement.lstrip().upper().startswith("SELECT")
+        )
+        if want_plan:
+            _plan_pending.add(fp)
+
+    if want_plan:
+        _plan_executor.submit(_capture_plan, engine, fp, statement, parameters)
+
+
+# ---------- 執行計畫 ----------
+
+def _explain(engine, statement: str, parameters) -> str:
+    """
+    估計的執行計畫（不會真的跑那個 query）：
+    - MSSQL：SET SHOWPLAN_XML ON 之後送出的 query 只回 plan XML
+    - SQLite：EXPLAIN QUERY PLAN
+    另外借一條連線，不動原本 request 的連線 / 結果集
+    """
+    dialect = engine.dialect.name
+    with engine.connect().execution_options(**{SKIP_OPTION: True}) as conn:
+        if dialect == "mssql":
+            conn.exec_driver_sql("SET SHOWPLAN_XML ON")
+            try:
+                row = conn.exec_driver_sql(statement, parameters).first()
+                return row[0] if row else ""
+            finally:
+                conn.exec_driver_sql("SET SHOWPLAN_XML OFF")
+        if dialect == "sqlite":
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            return "\n".join(str(r[-1]) for r in rows)
+    return ""
+
+
+def _capture_plan(engine, fp: str, statement: str, parameters) -> None:
+    try:
+        plan = _explain(engine, statement, parameters)
+    except Exception as e:
+        plan = f"(plan capture failed: {e})"
+    with _lock:
+        _plan_pending.discard(fp)
+        entry = _entries.get(fp)
+        if entry is not None:
+            entry["plan"] = plan
+
+
+# ---------- 對外 ----------
+
+def install(app, engine) -> None:
+    """create_app 裡呼叫（門檻 / 是否抓 plan 在啟動時讀 config）"""
+    global _plan_executor
+    _settings["threshold_ms"] = float(app.config.get("SLOW_QUERY_MS", 100))
+    _settings["max_fingerprints"] = int(app.config.get("SLOW_QUERY_MAX_FINGERPRINTS", 500))
+    # in-memory SQLite 整個 process 只有一條連線，不能另外借連線抓 plan
+    _settings["capture_plan"] = (
+        bool(app.config.get("SLOW_QUERY_CAPTURE_PLAN", False))
+        and engine.dialect.name in ("mssql", "sqlite")
+        and not isinstance(engine.pool, StaticPool)
+    )
+    if _settings["capture_plan"] and _plan_executor is None:
+        _plan_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-plan")
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def set_threshold(threshold_ms: float) -> None:
+    """index_advisor.py 跑內建 workload 時設成 0，把每個 query 都記下來"""
+    _settings["threshold_ms"] = threshold_ms
+
+
+def reset() -> None:
+    global _dropped
+    with _lock:
+        _entries.clear()
+        _dropped = 0
+
+
+def get_fingerprints() -> Dict[str, Any]:
+    """依總耗時排序（最該優化的在前面）"""
+    with _lock:
+        rows: List[Dict[str, Any]] = []
+        for entry in _entries.values():
+            durations = list(entry["durations"])
+            rows.append({
+                "id": entry["id"],
+                "fingerprint": entry["fingerprint"],
+                "count": entry["count"],
+                "total_ms": entry["total_ms"],
+                "avg_ms": entry["total_ms"] / entry["count"],
+                "p95_ms": _percentile(durations, 0.95),
+                "max_ms": entry["max_ms"],
+                "first_seen": entry["first_seen"],
+                "last_seen": entry["last_seen"],
+                "plan": entry["plan"],
+            })
+        dropped = _dropped
+        settings = dict(_settings)
+
+    rows.sort(key=lambda r: -r["total_ms"])
+    return {"threshold_ms": settings["threshold_ms"], "capture_plan": settings["capture_plan"],
+            "dropped": dropped, "fingerprints": rows}
@@ -0,0 +1,247 @@
+import atexit
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database import db
+from app.models.order import Order
+from app.models.order_item import OrderItem
+from app.models.product_sales_rollup import ProductSalesRollup
+from app.models.sales_rollup import SalesRollup
+
+
+HOUR = "hour"
+DAY = "day"
+
+_STAGED_KEY = "stats_rollup_deltas"
+
+
+# ---- 每個 process 一份的 rollup 暫存 ----
+# 結帳 / 付款不直接 UPDATE 當下那一小時 / 那一天的 rollup row（所有交易都搶同一筆的 row lock），
+# 先記在記憶體，背景 thread 每 STATS_FLUSH_INTERVAL 秒用一個短 transaction 合併寫回
+# (model, ((key, value), ...)) -> {欄位: 累計的 delta}
+_lock = threading.Lock()
+_buffer: Dict[Tuple[Any, Tuple[Tuple[str, Any], ...]], Dict[str, Any]] = {}
+_flusher: Optional[threading.Thread] = None
+
+
+def _buckets(now: Optional[datetime] = None) -> List[Tuple[str, datetime]]:
+    now = now or datetime.utcnow()
+    return [
+        (HOUR, now.replace(minute=0, second=0, microsecond=0)),
+        (DAY, now.replace(hour=0, minute=0, second=0, microsecond=0)),
+    ]
+
+
+def _merge(target: Dict, model, keys: Tuple[Tuple[str, Any], ...], deltas: Dict[str, Any]) -> None:
+    current = target.setdefault((model, keys), {})
+    for column, delta in deltas.items():
+        current[column] = current.get(column, 0) + delta
+
+
+def _stage(model, keys: Dict[str, Any], deltas: Dict[str, Any]) -> None:
+    """
+    先記在這個 session 上，呼叫端 commit 之後才進 process 的暫存（rollback 就丟掉，不會多算）
+    """
+    _ensure_flusher()
+    staged = db.session.info.setdefault(_STAGED_KEY, {})
+    _merge(staged, model, tuple(sorted(keys.items())), deltas)
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session):
+    staged = session.info.pop(_STAGED_KEY, None)
+    if not staged:
+        return
+    with _lock:
+        for (model, keys), deltas in staged.items():
+            _merge(_buffer, model, keys, deltas)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _on_rollback(session, previous_transaction):
+    # 只有整個 transaction rollback 才丟（savepoint rollback 外層還在）
+    if not session.in_transaction():
+        session.info.pop(_STAGED_KEY, None)
+
+
+def _bump(model, keys: Dict[str, Any], deltas: Dict[str, Any]) -> None:
+    """
+    UPDATE ... SET col = col + delta WHERE <bucket>；沒有這個 bucket 就 INSERT
+    （同時有人 INSERT 撞 unique → 改回 UPDATE）
+    """
+    where = [getattr(model, k) == v for k, v in keys.items()]
+    values = {k: getattr(model, k) + v for k, v in deltas.items()}
+
+    result = db.session.execute(db.update(model).where(*where).values(**values))
+    if result.rowcount:
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(model(**keys, **deltas))
+    except IntegrityError:
+        db.session.execute(db.update(model).where(*where).values(**values))
+
+
+def flush() -> int:
+    """
+    把 process 暫存的 delta 寫回 rollup（一個短 transaction，每個 bucket 一個 UPDATE），回傳寫了幾個 bucket
+    寫失敗就放回暫存，下一輪再試
+    """
+    global _buffer
+    with _lock:
+        pending, _buffer = _buffer, {}
+    if not pending:
+        return 0
+
+    try:
+        for (model, keys), deltas in pending.items():
+            _bump(model, dict(keys), deltas)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        with _lock:
+            for (model, keys), deltas in pending.items():
+                _merge(_buffer, model, keys, deltas)
+        raise
+    return len(pending)
+
+
+def _ensure_flusher() -> None:
+    """第一次有統計要記的時候才啟動背景 flush thread（每個 process 一條）"""
+    global _flusher
+    with _lock:
+        if _flusher is not None:
+            return
+        app = current_app._get_current_object()
+        interval = float(app.config.get("STATS_FLUSH_INTERVAL", 5))
+
+        def _flush_in_app():
+            with app.app_context():
+                try:
+                    flush()
+                except Exception:
+                    app.logger.exception("sales rollup flush failed")
+                finally:
+                    db.session.remove()
+
+        def _run():
+            while True:
+                time.sleep(interval)
+                _flush_in_app()
+
+        _flusher = threading.Thread(target=_run, name="stats-rollup-flush", daemon=True)
+        _flusher.start()
+        # 正常關機前把最後幾秒的統計寫掉
+        atexit.register(_flush_in_app)
+
+
+def record_order_created(order: Order) -> None:
+    """結帳建立訂單時呼叫（跟訂單同一個 transaction commit 才會算進去）"""
+    for bucket_type, bucket_start in _buckets():
+        _stage(
+            SalesRollup,
+            {"bucket_type": bucket_type, "bucket_start": bucket_start},
+            {"order_count": 1},
+        )
+
+
+def record_payment_result(order_id: int, success: bool) -> None:
+    """
+    金流回寫 paid / failed 時呼叫（跟狀態回寫同一個 transaction commit 才會算進去）
+    付款成功才算營收與件數（一個 query 撈這張訂單的明細）
+    """
+    buckets = _buckets()
+
+    if not success:
+        for bucket_type, bucket_start in buckets:
+            _stage(
+                SalesRollup,
+                {"bucket_type": bucket_type, "bucket_start": bucket_start},
+                {"failed_count": 1},
+            )
+        return
+
+    items = (
+        db.session.query(OrderItem.product_id, OrderItem.quantity, OrderItem.unit_price)
+        .filter(OrderItem.order_id == order_id)
+        .all()
+    )
+    total = db.session.query(Order.total_amount).filter(Order.id == order_id).scalar() or 0
+    units = sum(int(i.quantity) for i in items)
+
+    for bucket_type, bucket_start in buckets:
+        _stage(
+            SalesRollup,
+            {"bucket_type": bucket_type, "bucket_start": bucket_start},
+            {"paid_count": 1, "revenue": total, "units": units},
+        )
+        for i in items:
+            _stage(
+                ProductSalesRollup,
+                {"bucket_type": bucket_type, "bucket_start": bucket_start, "product_id": i.product_id},
+                {"units": int(i.quantity), "revenue": i.unit_price * i.quantity},
+            )
+
+
+def _rollup_dict(r: SalesRollup) -> Dict[str, Any]:
+    attempts = r.paid_count + r.failed_count
+    return {
+        "bucket_start": r.bucket_start.isoformat(),
+        "order_count": r.order_count,
+        "paid_count": r.paid_count,
+        "failed_count": r.failed_count,
+        "payment_failure_ratio": (r.failed_count / attempts) if attempts else 0.0,
+        "revenue": float(r.revenue or 0),
+        "units": r.units,
+    }
+
+
+def get_dashboard(hours: int = 24, days: int = 30, top_products: int = 10) -> Dict[str, Any]:
+    """
+    讀 rollup（最多 hours + days 筆 + 今天的熱賣商品），跟訂單量無關
+    先把這個 process 還沒寫回的統計 flush 掉（其他 worker 的最多晚 STATS_FLUSH_INTERVAL 秒）
+    """
+    try:
+        flush()
+    except Exception:
+        current_app.logger.exception("sales rollup flush failed")
+    now = datetime.utcnow()
+    (_, this_hour), (_, today) = _buckets(now)
+
+    hourly = (
+        SalesRollup.query
+        .filter(SalesRollup.bucket_type == HOUR, SalesRollup.bucket_start > this_hour - timedelta(hours=hours))
+        .order_by(SalesRollup.bucket_start.desc())
+        .all()
+    )
+    daily = (
+        SalesRollup.query
+        .filter(SalesRollup.bucket_type == DAY, SalesRollup.bucket_start > today - timedelta(days=days))
+        .order_by(SalesRollup.bucket_start.desc())
+        .all()
+    )
+    products = (
+        ProductSalesRollup.query
+        .filter(ProductSalesRollup.bucket_type == DAY, ProductSalesRollup.bucket_start == today)
+        .order_by(ProductSalesRollup.units.desc())
+        .limit(top_products)
+        .all()
+    )
+
+    return {
+        "generated_at": now.isoformat(),
+        "hourly": [_rollup_dict(r) for r in hourly],
+        "daily": [_rollup_dict(r) for r in daily],
+        "top_products_today": [
+            {"product_id": p.product_id, "units": p.units, "revenue": float(p.revenue or 0)}
+            for p in products
+        ],
+    }
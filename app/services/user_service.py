@@ -0,0 +1,205 @@
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from flask import current_app
+from sqlalchemy import exists
+
+from app.database import db
+from app.models.user import User
+from app.services import pagination_service
+
+
+# admin 會員列表每頁筆數
+USERS_PER_PAGE = 50
+
+# 搜尋模式：prefix 走 username / email 的 unique index；contains 是子字串（有開 n-gram 索引才不掃表）
+SEARCH_MODES = ("prefix", "contains")
+
+NGRAM = 3
+
+
+# ---- admin 人數快取（「不能移除最後一個 admin」用，不再每次都跑 COUNT） ----
+_admin_lock = threading.Lock()
+_admin_count: Optional[int] = None
+_admin_counted_at = 0.0
+
+
+# ---- 每個 process 一份的 n-gram 索引（USER_SEARCH_NGRAM_INDEX 開了才建） ----
+_idx_lock = threading.Lock()
+_docs: Dict[int, Tuple[Tuple[datetime, int], str]] = {}  # user_id -> ((created_at, id), "username\nemail")
+_grams: Dict[str, Set[int]] = {}                          # n-gram -> user_ids
+_idx_built_at: Optional[float] = None
+
+
+def _like_prefix(q: str) -> str:
+    # LIKE 'abc%'（前綴固定）才能在 index 上 seek；使用者輸入的 % _ 要跳脫
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def _like_contains(q: str) -> str:
+    return "%" + _like_prefix(q)
+
+
+# ---------- n-gram 索引 ----------
+
+def _haystack(username: str, email: str) -> str:
+    return f"{username}\n{email}".lower()
+
+
+def _ngrams(text: str) -> Set[str]:
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def _index_enabled() -> bool:
+    return bool(current_app.config.get("USER_SEARCH_NGRAM_INDEX", False))
+
+
+def _remove_locked(user_id: int) -> None:
+    doc = _docs.pop(user_id, None)
+    if doc is None:
+        return
+    for g in _ngrams(doc[1]):
+        ids = _grams.get(g)
+        if ids is None:
+            continue
+        ids.discard(user_id)
+        if not ids:
+            del _grams[g]
+
+
+def _add_locked(user_id: int, created_at: datetime, username: str, email: str) -> None:
+    text = _haystack(username, email)
+    _docs[user_id] = ((created_at or datetime.min, user_id), text)
+    for g in _ngrams(text):
+        _grams.setdefault(g, set()).add(user_id)
+
+
+def build_index() -> int:
+    """全量重建（第一次用到 / 過期時），只讀四個欄位，回傳索引了幾筆"""
+    global _docs, _grams, _idx_built_at
+    rows = db.session.query(User.id, User.created_at, User.username, User.email).all()
+
+    with _idx_lock:
+        _docs = {}
+        _grams = {}
+        for user_id, created_at, username, email in rows:
+            _add_locked(user_id, created_at, username, email)
+        _idx_built_at = time.monotonic()
+    return len(rows)
+
+
+def index_user(user: User) -> None:
+    """新增 / 編輯會員後呼叫（索引還沒建就不用管，第一次搜尋時會全量建）"""
+    if _idx_built_at is None:
+        return
+    with _idx_lock:
+        _remove_locked(user.id)
+        _add_locked(user.id, user.created_at, user.username, user.email)
+
+
+def remove_user(user_id: int) -> None:
+    with _idx_lock:
+        _remove_locked(user_id)
+
+
+def _rebuild_if_stale() -> None:
+    # 其他 worker 新增 / 修改的會員靠定期重建追上
+    max_age = float(current_app.config.get("USER_SEARCH_INDEX_MAX_AGE", 300))
+    if _idx_built_at is None or time.monotonic() - _idx_built_at > max_age:
+        build_index()
+
+
+def _search_keys(q: str) -> List[Tuple[datetime, int]]:
+    """子字串搜尋：n-gram 交集挑候選，再逐筆確認真的包含 q；回傳 (created_at, id) DESC"""
+    q = q.lower()
+    _rebuild_if_stale()
+
+    with _idx_lock:
+        if len(q) < NGRAM:
+            candidates = _docs.keys()
+        else:
+            postings = [_grams.get(g) for g in _ngrams(q)]
+            if any(p is None for p in postings):
+                return []
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+        keys = [_docs[uid][0] for uid in candidates if q in _docs[uid][1]]
+
+    keys.sort(reverse=True)
+    return keys
+
+
+# ---------- 搜尋 ----------
+
+def search_users(q: str, mode: str = "prefix", cursor: Optional[str] = None,
+                 limit: int = USERS_PER_PAGE) -> Dict[str, Any]:
+    """
+    admin 會員列表（created_at DESC, id DESC，keyset 分頁）
+    - 沒有 q：全部會員
+    - prefix：username LIKE 'q%' OR email LIKE 'q%'（兩個 unique index 都能 seek）
+    - contains：有開 USER_SEARCH_NGRAM_INDEX 就查記憶體索引，沒開就退回 LIKE '%q%'（會掃表，但一次只拿一頁）
+    回傳格式同 pagination_service.keyset_page
+    """
+    q = (q or "").strip()
+    query = User.query
+
+    if q and mode == "contains" and _index_enabled():
+        page = pagination_service.keyset_slice(_search_keys(q), cursor, limit)
+        ids = [uid for _, uid in page["keys"]]
+        by_id = {u.id: u for u in User.query.filter(User.id.in_(ids))} if ids else {}
+        return {
+            "items": [by_id[uid] for uid in ids if uid in by_id],
+            "next_cursor": page["next_cursor"],
+            "prev_cursor": page["prev_cursor"],
+        }
+
+    if q:
+        # 用 LIKE 而不是 ILIKE：ILIKE 會變成 lower(col)，index 就用不到了（MSSQL 預設 collation 本來就不分大小寫）
+        pattern = _like_contains(q) if mode == "contains" else _like_prefix(q)
+        query = query.filter(
+            User.username.like(pattern, escape="\\") | User.email.like(pattern, escape="\\")
+        )
+
+    return pagination_service.keyset_page(query, User.created_at, User.id, cursor, limit)
+
+
+# ---------- admin 人數 ----------
+
+def get_admin_count() -> int:
+    """快取的 admin 人數（改權限 / 刪除時就地 +/-，每 ADMIN_COUNT_TTL 秒回 DB 校正一次）"""
+    global _admin_count, _admin_counted_at
+    ttl = float(current_app.config.get("ADMIN_COUNT_TTL", 300))
+    with _admin_lock:
+        if _admin_count is not None and time.monotonic() - _admin_counted_at <= ttl:
+            return _admin_count
+
+    count = User.query.filter(User.is_admin == True).count()
+    with _admin_lock:
+        _admin_count = count
+        _admin_counted_at = time.monotonic()
+    return count
+
+
+def adjust_admin_count(delta: int) -> None:
+    global _admin_count
+    with _admin_lock:
+        if _admin_count is not None:
+            _admin_count = max(_admin_count + delta, 0)
+
+
+def can_remove_admin(user_id: int) -> bool:
+    """
+    這個 admin 能不能被降級 / 刪除（不能是最後一個 admin）
+    - 快取的人數 <= 1 → 直接拒絕，不查 DB
+    - 否則用 EXISTS 確認還有別的 admin（找到一筆就停，不跑 COUNT；也擋掉其他 worker 的快取還沒追上的情況）
+    """
+    if get_admin_count() <= 1:
+        return False
+    return bool(
+        db.session.query(
+            exists().where(User.is_admin == True, User.id != user_id)
+        ).scalar()
+    )
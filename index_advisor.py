@@ -0,0 +1,122 @@
+"""
+依 slow query log 建議缺少的 index（並可輸出 CREATE INDEX migration）
+
+用法：
+  python index_advisor.py                       # 跑內建的熱門 query（商品列表 / 訂單管理 / 我的訂單 / 刪商品...），全部記錄後分析
+  python index_advisor.py --from-json slow.json # 分析線上 /admin/metrics/slow-queries/data 存下來的 JSON
+  python index_advisor.py --emit-ddl migration.sql
+
+內建 workload 用不存在的 id（-1）跑，寫入類的 SQL 不會動到資料，最後整個 transaction rollback
+比對的是 DATABASE_URL（沒設就是 MSSQL）上「現在」有的 index
+"""
+import argparse
+import json
+import sys
+from datetime import datetime
+
+from app import create_app
+from app.database import db
+from app.models.order import Order
+from app.models.product_image import ProductImage
+from app.services import (
+    image_store_service,
+    index_advisor_service,
+    order_service,
+    pagination_service,
+    product_service,
+    slow_query_service,
+    user_service,
+)
+
+
+MISSING_ID = -1
+
+
+def run_builtin_workload():
+    """把各頁面實際會下的 query 各跑一次（第一頁 + 帶 cursor 的下一頁）"""
+    cursor = pagination_service.encode_cursor(pagination_service.NEXT, datetime.utcnow(), 2 ** 31 - 1)
+
+    # 首頁 / 商品列表
+    for gender, season in ((None, None), ("M", None), (None, "winter"), ("F", "summer")):
+        product_service.list_products(gender=gender, season=season)
+        product_service.list_products(gender=gender, season=season, cursor=cursor)
+    product_service.get_product_with_images(MISSING_ID)
+
+    # admin 訂單列表（order_list_all）：列表 + 筆數
+    for filters in (("", "", "", ""), ("", "paid", "", ""), ("1", "", "", ""),
+                    ("", "", "2024-01-01", "2024-12-31")):
+        query = order_service.admin_order_query(filters)
+        pagination_service.keyset_page(query, Order.created_at, Order.id, cursor, 20)
+        query.order_by(None).count()
+
+    # 我的訂單（my_orders）
+    order_service.list_user_orders(MISSING_ID)
+    order_service.list_user_orders(MISSING_ID, cursor=cursor)
+
+    # admin 會員搜尋
+    user_service.search_users("adm", mode="prefix")
+
+    # admin 刪商品（admin_product_delete）：blob ref_count 扣回 + 刪 product_images
+    image_store_service.release_product_images(MISSING_ID)
+    ProductImage.query.filter_by(product_id=MISSING_ID).delete()
+
+    # seed.py 清舊 demo 商品：依圖檔前綴找 product_images
+    ProductImage.query.filter(ProductImage.filename.like("men_tshirt_white_%")).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="slow query → missing index suggestions")
+    parser.add_argument("--from-json", help="/admin/metrics/slow-queries/data 存下來的檔案")
+    parser.add_argument("--emit-ddl", help="把 CREATE INDEX 寫到這個檔案")
+    parser.add_argument("--verbose", action="store_true", help="列出每個建議是從哪些 SQL 來的")
+    args = parser.parse_args()
+
+    app = create_app({"PAYMENT_RECOVER_ON_STARTUP": False})  # 離線腳本不幫忙跑付款
+    with app.app_context():
+        engine = db.engine
+
+        if args.from_json:
+            with open(args.from_json, encoding="utf-8") as f:
+                fingerprints = json.load(f)["fingerprints"]
+        else:
+            slow_query_service.set_threshold(0)
+            slow_query_service.reset()
+            try:
+                with app.test_request_context():
+                    run_builtin_workload()
+            finally:
+                db.session.rollback()
+            fingerprints = slow_query_service.get_fingerprints()["fingerprints"]
+
+        schema = index_advisor_service.load_schema(engine)
+        suggestions = index_advisor_service.suggest(fingerprints, schema)
+        by_id = {fp["id"]: fp for fp in fingerprints}
+
+        print(f"=== {len(fingerprints)} query fingerprints analyzed ({engine.dialect.name}) ===")
+        if not suggestions:
+            print("No missing indexes found.")
+            return 0
+
+        ddl = []
+        for s in suggestions:
+            statement = index_advisor_service.create_index_ddl(engine, s)
+            ddl.append(statement)
+            print(f"\n{s['table']}({', '.join(s['columns'])})  "
+                  f"{s['count']} queries / {s['total_ms']:.1f} ms")
+            print(f"  {statement};")
+            if args.verbose:
+                for fid in s["fingerprints"]:
+                    print(f"  - [{fid}] {by_id[fid]['fingerprint']}")
+
+        if args.emit_ddl:
+            # MSSQL 的 sqlcmd / SSMS 用 GO 分 batch（同 DB.txt）
+            separator = ";\nGO\n\n" if engine.dialect.name == "mssql" else ";\n\n"
+            with open(args.emit_ddl, "w", encoding="utf-8") as f:
+                f.write(f"-- index_advisor.py {datetime.now():%Y-%m-%d %H:%M}\n\n")
+                f.write("".join(statement + separator for statement in ddl))
+            print(f"\nWrote {len(ddl)} statements to {args.emit_ddl}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
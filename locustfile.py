@@ -0,0 +1,401 @@
+"""
+壓測腳本（Locust）：逛商品的訪客 / 會買東西的會員 / 後台 admin 三種使用者
+
+本機用 SQLite 跑一輪 baseline，再開 chaos 跑一輪比較：
+
+    export DATABASE_URL="sqlite:///bench.db"
+    python seed.py
+    python wsgi.py &
+
+    # baseline
+    locust -f locustfile.py --headless -u 50 -r 10 -t 2m --host http://127.0.0.1:5000 \\
+        --csv results/baseline --summary-json results/baseline.json
+    # chaos 開著（開始前用 admin 打開，結束後關掉）
+    locust -f locustfile.py --headless -u 50 -r 10 -t 2m --host http://127.0.0.1:5000 \\
+        --csv results/chaos --summary-json results/chaos.json --chaos slow_product_list,nplus1_images
+
+- --csv：Locust 內建，輸出 *_stats.csv / *_failures.csv / *_stats_history.csv
+- --summary-json：每個 endpoint 的 p50/p95/p99/失敗數 + SLO 判定結果
+- SLO（--slo-p95-ms / --slo-p99-ms / --slo-error-rate）沒過 → process exit code = 1（CI 直接 fail）
+  訂單狀態 long-poll 本來就會 hold 住，不算進延遲 SLO（錯誤率照算）
+"""
+import json
+import os
+import random
+import re
+import uuid
+
+import requests
+from locust import HttpUser, between, events, task
+from locust.runners import WorkerRunner
+from locust.stats import StatsEntry
+
+
+ADMIN_USERNAME = os.environ.get("LOCUST_ADMIN_USER", "admin")
+ADMIN_PASSWORD = os.environ.get("LOCUST_ADMIN_PASSWORD", "Admin123!")
+
+GENDERS = ("M", "F", "K")
+SEASONS = ("spring", "summer", "fall", "winter")
+ORDER_STATUSES = ("created", "pending", "processing", "paid", "failed", "cancelled")
+CHAOS_KEYS = ("slow_product_list", "nplus1_images", "slow_images", "broken_images", "image_permission_error")
+
+# 不算進延遲 SLO 的 request（名稱開頭）
+LATENCY_SLO_EXCLUDE = ("/orders/[id]/status",)
+
+# 1x1 PNG（admin 新增商品一定要有圖；內容都一樣，server 端只會存一份）
+PIXEL_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010802000000"
+    "907753de0000000c49444154789c63f8ffff3f0005fe02fe0def46b800"
+    "00000049454e44ae426082"
+)
+
+_PRODUCT_ID_RE = re.compile(r'href="/products/(\d+)"')
+_IMAGE_RE = re.compile(r'src="(/images/products/[^"]+)"')
+_ORDER_URL_RE = re.compile(r"/orders/(\d+)$")
+_LOADTEST_PRODUCT_RE = re.compile(r"(?s)>(locust-[0-9a-f]+)</td>.*?/admin/products/(\d+)/edit")
+
+if os.environ.get("LOCUST_RANDOM_SEED"):
+    random.seed(int(os.environ["LOCUST_RANDOM_SEED"]))
+
+
+# ---- 大家共用的商品目錄（誰逛到商品列表就順便更新） ----
+_catalog = {"product_ids": [], "images": []}
+
+
+def _remember_catalog(html: str) -> None:
+    ids = [int(x) for x in _PRODUCT_ID_RE.findall(html)]
+    if ids:
+        _catalog["product_ids"] = sorted(set(_catalog["product_ids"]) | set(ids))
+    images = _IMAGE_RE.findall(html)
+    if images:
+        _catalog["images"] = sorted(set(_catalog["images"]) | set(images))
+
+
+# ---------- 命令列參數 ----------
+
+@events.init_command_line_parser.add_listener
+def _add_arguments(parser):
+    parser.add_argument("--slo-p95-ms", type=float, env_var="LOCUST_SLO_P95_MS", default=800,
+                        help="p95 延遲上限（ms）")
+    parser.add_argument("--slo-p99-ms", type=float, env_var="LOCUST_SLO_P99_MS", default=2000,
+                        help="p99 延遲上限（ms）")
+    parser.add_argument("--slo-error-rate", type=float, env_var="LOCUST_SLO_ERROR_RATE", default=0.01,
+                        help="錯誤率上限（0.01 = 1%%）")
+    parser.add_argument("--summary-json", type=str, env_var="LOCUST_SUMMARY_JSON", default="",
+                        help="結束時把各 endpoint 統計 + SLO 判定寫到這個 JSON 檔")
+    parser.add_argument("--chaos", type=str, env_var="LOCUST_CHAOS", default="",
+                        help="開始前打開的 chaos flag（逗號分隔），結束後全部關掉")
+
+
+def _chaos_flags(environment):
+    raw = getattr(environment.parsed_options, "chaos", "") or ""
+    return [k.strip() for k in raw.split(",") if k.strip() in CHAOS_KEYS]
+
+
+def _set_chaos(host: str, flags) -> None:
+    """用 admin 登入後送出 chaos 控制台表單（沒勾的 flag 會被關掉）"""
+    with requests.Session() as s:
+        s.post(f"{host}/auth/login", data={"username_or_email": ADMIN_USERNAME, "password": ADMIN_PASSWORD})
+        s.post(f"{host}/admin/chaos/", data={k: "on" for k in flags}).raise_for_status()
+
+
+@events.test_start.add_listener
+def _on_test_start(environment, **kwargs):
+    if isinstance(environment.runner, WorkerRunner) or not environment.host:
+        return
+    _set_chaos(environment.host, _chaos_flags(environment))
+
+
+@events.test_stop.add_listener
+def _on_test_stop(environment, **kwargs):
+    if isinstance(environment.runner, WorkerRunner) or not environment.host:
+        return
+    if _chaos_flags(environment):
+        _set_chaos(environment.host, [])
+
+
+# ---------- SLO 判定 + JSON 報表 ----------
+
+def _entry_summary(entry) -> dict:
+    return {
+        "name": entry.name,
+        "method": entry.method,
+        "requests": entry.num_requests,
+        "failures": entry.num_failures,
+        "avg_ms": round(entry.avg_response_time, 1),
+        "p50_ms": entry.get_response_time_percentile(0.50),
+        "p95_ms": entry.get_response_time_percentile(0.95),
+        "p99_ms": entry.get_response_time_percentile(0.99),
+        "max_ms": entry.max_response_time,
+        "rps": round(entry.total_rps, 2),
+    }
+
+
+@events.quitting.add_listener
+def _check_slo(environment, **kwargs):
+    if isinstance(environment.runner, WorkerRunner):
+        return
+    opts = environment.parsed_options
+    stats = environment.stats
+
+    # 延遲 SLO：排除 long-poll 之後重新合併一份
+    latency = StatsEntry(stats, "SLO", "")
+    for entry in stats.entries.values():
+        if not entry.name.startswith(LATENCY_SLO_EXCLUDE):
+            latency.extend(entry)
+
+    total = stats.total
+    result = {
+        "requests": total.num_requests,
+        "failures": total.num_failures,
+        "error_rate": total.fail_ratio,
+        "p95_ms": latency.get_response_time_percentile(0.95),
+        "p99_ms": latency.get_response_time_percentile(0.99),
+        "rps": round(total.total_rps, 2),
+    }
+
+    violations = []
+    if result["p95_ms"] > opts.slo_p95_ms:
+        violations.append(f"p95 {result['p95_ms']}ms > {opts.slo_p95_ms}ms")
+    if result["p99_ms"] > opts.slo_p99_ms:
+        violations.append(f"p99 {result['p99_ms']}ms > {opts.slo_p99_ms}ms")
+    if result["error_rate"] > opts.slo_error_rate:
+        violations.append(f"error rate {result['error_rate']:.2%} > {opts.slo_error_rate:.2%}")
+
+    for v in violations:
+        print(f"SLO violated: {v}")
+    if violations:
+        environment.process_exit_code = 1
+
+    if opts.summary_json:
+        os.makedirs(os.path.dirname(os.path.abspath(opts.summary_json)), exist_ok=True)
+        with open(opts.summary_json, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "host": environment.host,
+                    "chaos": _chaos_flags(environment),
+                    "slo": {
+                        "p95_ms": opts.slo_p95_ms,
+                        "p99_ms": opts.slo_p99_ms,
+                        "error_rate": opts.slo_error_rate,
+                    },
+                    "result": result,
+                    "passed": not violations,
+                    "violations": violations,
+                    "endpoints": [_entry_summary(e) for e in sorted(
+                        stats.entries.values(), key=lambda e: (e.name, e.method)
+                    )],
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+
+# ---------- 使用者 ----------
+
+class AnonymousBrowser(HttpUser):
+    """沒登入的訪客：逛列表（帶篩選）、看商品、載圖片、搜尋"""
+
+    weight = 6
+    wait_time = between(1, 3)
+
+    def _fetch_images(self, html: str, limit: int) -> None:
+        for src in _IMAGE_RE.findall(html)[:limit]:
+            self.client.get(src, name="/images/products/[file]")
+
+    @task(4)
+    def browse_products(self):
+        params = {}
+        if random.random() < 0.5:
+            params["gender"] = random.choice(GENDERS)
+        if random.random() < 0.5:
+            params["season"] = random.choice(SEASONS)
+        r = self.client.get("/products", params=params, name="/products?[filters]")
+        if r.ok:
+            _remember_catalog(r.text)
+            self._fetch_images(r.text, 6)
+
+    @task(3)
+    def view_product(self):
+        if not _catalog["product_ids"]:
+            return self.browse_products()
+        pid = random.choice(_catalog["product_ids"])
+        r = self.client.get(f"/products/{pid}", name="/products/[id]")
+        if r.ok:
+            self._fetch_images(r.text, 3)
+
+    @task(1)
+    def search(self):
+        self.client.get("/products/search", params={"q": random.choice(("shirt", "牛仔", "外套", "T"))},
+                        name="/products/search")
+
+    @task(1)
+    def home(self):
+        self.client.get("/", name="/")
+
+
+class RegisteredShopper(HttpUser):
+    """會員：註冊 / 登入、加購物車、改數量、結帳、付款、等付款結果"""
+
+    weight = 3
+    wait_time = between(2, 5)
+
+    def on_start(self):
+        self.username = f"lt_{uuid.uuid4().hex[:12]}"
+        self.password = "LoadTest123!"
+        self.client.post("/auth/register", name="/auth/register", data={
+            "username": self.username,
+            "email": f"{self.username}@loadtest.local",
+            "password": self.password,
+            "password2": self.password,
+        })
+        self.logged_in = False
+        self._login()
+
+    def _login(self) -> None:
+        r = self.client.post("/auth/login", name="/auth/login", data={
+            "username_or_email": self.username,
+            "password": self.password,
+        })
+        self.logged_in = r.ok and "/auth/login" not in r.url
+
+    def _pick_product(self):
+        if not _catalog["product_ids"]:
+            r = self.client.get("/products", name="/products?[filters]")
+            if r.ok:
+                _remember_catalog(r.text)
+        return random.choice(_catalog["product_ids"]) if _catalog["product_ids"] else None
+
+    @task(3)
+    def browse_and_add_to_cart(self):
+        if not self.logged_in:
+            return self._login()
+        pid = self._pick_product()
+        if pid is None:
+            return
+        self.client.get(f"/products/{pid}", name="/products/[id]")
+        self.client.post("/cart/add", data={"product_id": pid, "qty": 1}, name="/cart/add")
+
+    @task(1)
+    def update_cart(self):
+        if not self.logged_in:
+            return self._login()
+        pid = self._pick_product()
+        if pid is None:
+            return
+        self.client.post("/cart/add", data={"product_id": pid, "qty": 1}, name="/cart/add")
+        self.client.post("/cart/update", data={f"qty_{pid}": random.randint(1, 3)}, name="/cart/update")
+
+    @task(2)
+    def checkout_and_pay(self):
+        if not self.logged_in:
+            return self._login()
+        pid = self._pick_product()
+        if pid is None:
+            return
+        self.client.post("/cart/add", data={"product_id": pid, "qty": 1}, name="/cart/add")
+
+        with self.client.post("/orders/checkout", name="/orders/checkout", catch_response=True) as r:
+            m = _ORDER_URL_RE.search(r.url)
+            if m:
+                r.success()
+            elif r.ok and "庫存不足" in r.text:
+                # 庫存被買光是正常的業務結果，不算錯；清掉購物車下一輪再來
+                r.success()
+                self.client.post("/cart/clear", name="/cart/clear")
+                return
+            else:
+                r.failure(f"checkout did not land on an order page: {r.url}")
+                return
+        order_id = int(m.group(1))
+
+        self.client.post(f"/orders/{order_id}/pay", name="/orders/[id]/pay")
+        self._wait_for_payment(order_id)
+
+    def _wait_for_payment(self, order_id: int) -> None:
+        """long-poll 等付款結果（跟頁面上的 JS 一樣：帶 since=目前狀態）"""
+        status = "pending"
+        for _ in range(6):
+            r = self.client.get(
+                f"/orders/{order_id}/status",
+                params={"since": status, "timeout": 10},
+                name="/orders/[id]/status",
+            )
+            if not r.ok:
+                return
+            status = r.json().get("status")
+            if status not in ("pending", "processing"):
+                return
+
+    @task(1)
+    def my_orders(self):
+        if not self.logged_in:
+            return self._login()
+        self.client.get("/orders/", name="/orders/")
+
+
+class Admin(HttpUser):
+    """後台：訂單列表（各種篩選）、商品新增 / 修改 / 刪除、chaos 控制台"""
+
+    weight = 1
+    wait_time = between(3, 8)
+
+    def on_start(self):
+        self.client.post("/auth/login", name="/auth/login", data={
+            "username_or_email": ADMIN_USERNAME,
+            "password": ADMIN_PASSWORD,
+        })
+
+    @task(4)
+    def order_list(self):
+        params = {"per_page": random.choice((10, 20, 50, 100))}
+        if random.random() < 0.5:
+            params["status"] = random.choice(ORDER_STATUSES)
+        if random.random() < 0.3:
+            params["date_from"] = "2024-01-01"
+        r = self.client.get("/admin/orders/", params=params, name="/admin/orders/?[filters]")
+        m = re.search(r'href="(/admin/orders/\?[^"]*cursor=[^"]+)">下一頁', r.text) if r.ok else None
+        if m:
+            self.client.get(m.group(1).replace("&amp;", "&"), name="/admin/orders/?cursor=[next]")
+
+    @task(1)
+    def order_export(self):
+        self.client.get("/admin/orders/export", params={"status": "paid", "format": "csv"},
+                        name="/admin/orders/export")
+
+    @task(2)
+    def product_crud(self):
+        name = f"locust-{uuid.uuid4().hex[:12]}"
+        form = {
+            "name": name,
+            "gender": random.choice(GENDERS),
+            "season": random.choice(SEASONS),
+            "price": "9.99",
+            "stock": "1000",
+            "description": "load test product",
+        }
+        self.client.post(
+            "/admin/products/new",
+            data=form,
+            files={"images": ("locust.png", PIXEL_PNG, "image/png")},
+            name="/admin/products/new",
+        )
+
+        r = self.client.get("/admin/products/", name="/admin/products/")
+        ids = dict(_LOADTEST_PRODUCT_RE.findall(r.text)) if r.ok else {}
+        product_id = ids.get(name)
+        if not product_id:
+            return
+
+        form["price"] = "19.99"
+        self.client.post(f"/admin/products/{product_id}/edit", data=form, name="/admin/products/[id]/edit")
+        # 只刪壓測自己建的商品（名稱 locust- 開頭）
+        self.client.post(f"/admin/products/{product_id}/delete", name="/admin/products/[id]/delete")
+
+    @task(1)
+    def chaos_panel(self):
+        # 重新送出這次壓測的 chaos 設定（走一遍寫入 + 各 worker 快取失效，但不改變這輪的條件）
+        self.client.get("/admin/chaos/", name="/admin/chaos/")
+        flags = _chaos_flags(self.environment)
+        self.client.post("/admin/chaos/", data={k: "on" for k in flags}, name="/admin/chaos/ [toggle]")
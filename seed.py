@@ -8,7 +8,7 @@ from app.models.user import User
 from werkzeug.security import generate_password_hash
 
 
-app = create_app()
+app = create_app({"PAYMENT_RECOVER_ON_STARTUP": False})  # 離線腳本不幫忙跑付款
 
 SEED_FOLDER = "app/static/products_seed"
 TARGET_FOLDER = "app/static/products"
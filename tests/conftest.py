@@ -0,0 +1,27 @@
+import os
+import tempfile
+
+import pytest
+
+# Config 在 import 時就讀環境變數：測試一律用暫存的 SQLite 檔，不碰 MSSQL
+_DB_FILE = os.path.join(tempfile.mkdtemp(prefix="ecommerce-test-"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_FILE}"
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+# 背景重建搜尋索引的 thread 不要在測試中途把索引換掉
+os.environ["SEARCH_INDEX_REFRESH_INTERVAL"] = "3600"
+
+from app import create_app  # noqa: E402
+from app.database import db  # noqa: E402
+from app.services import chaos_service  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    app = create_app({"TESTING": True, "PAYMENT_RECOVER_ON_STARTUP": False})
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        # 每個 process 一份的 chaos flag 快取：DB 清掉了，快取也要跟著丟
+        chaos_service.invalidate_cache()
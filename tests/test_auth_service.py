@@ -0,0 +1,75 @@
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.services import auth_service
+
+
+def _slow_job(seconds: float):
+    time.sleep(seconds)
+    return None, seconds
+
+
+def _crash_job():
+    os._exit(1)
+
+
+def _shutdown_pool():
+    pool, auth_service._pool = auth_service._pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes(app):
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_MAX=1, PASSWORD_HASH_TIMEOUT=0.2)
+    try:
+        with pytest.raises(auth_service.PasswordHasherBusyError):
+            auth_service._run("hashed", _slow_job, 1.0)
+
+        # 上一個 job 還在 pool 裡算，slot 還沒還 → 直接拒絕，不會再塞進 pool
+        rejected = auth_service.get_metrics()["rejected"]
+        with pytest.raises(auth_service.PasswordHasherBusyError):
+            auth_service._run("hashed", _slow_job, 0)
+        assert auth_service.get_metrics()["rejected"] == rejected + 1
+
+        # 算完之後 slot 就還回來了
+        deadline = time.monotonic() + 5
+        while auth_service._inflight and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert auth_service._inflight == 0
+        assert auth_service._run("hashed", _slow_job, 0) is None
+    finally:
+        _shutdown_pool()
+
+
+
+def test_broken_pool_is_replaced_on_submit(app):
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_MAX=4, PASSWORD_HASH_TIMEOUT=10)
+    try:
+        # 別的 job 把子 process 弄死，快取住的 pool 已經 broken
+        with pytest.raises(BrokenProcessPool):
+            auth_service._get_pool().submit(_crash_job).result(timeout=10)
+        resets = auth_service.get_metrics()["pool_resets"]
+
+        assert auth_service._run("hashed", _slow_job, 0) is None
+        assert auth_service.get_metrics()["pool_resets"] == resets + 1
+        assert auth_service._inflight == 0
+    finally:
+        _shutdown_pool()
+
+
+def test_job_that_kills_worker_is_retried_once(app):
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_MAX=4, PASSWORD_HASH_TIMEOUT=10)
+    try:
+        resets = auth_service.get_metrics()["pool_resets"]
+        with pytest.raises(BrokenProcessPool):
+            auth_service._run("hashed", _crash_job)
+        assert auth_service.get_metrics()["pool_resets"] == resets + 2
+        assert auth_service._inflight == 0
+
+        # 壞掉的 pool 不會留著：下一個 job 開新的 pool 正常跑完
+        assert auth_service._run("hashed", _slow_job, 0) is None
+    finally:
+        _shutdown_pool()
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database import db
+from app.models.cart_item import CartItem
+from app.services import cart_store
+
+
+@pytest.fixture(params=["memory", "db"])
+def store(request, app):
+    if request.param == "memory":
+        return cart_store.MemoryCartStore(max_carts=2)
+    return cart_store.DbCartStore()
+
+
+def test_add_set_remove(store):
+    store.add("c1", 1, 2)
+    store.add("c1", 1, 3)
+    store.add("c1", 2, 1)
+    assert store.get("c1") == {"1": 5, "2": 1}
+
+    store.set_qty("c1", 1, 1)
+    store.remove("c1", 2)
+    assert store.get("c1") == {"1": 1}
+
+
+def test_quantity_dropping_to_zero_removes_line(store):
+    store.add("c1", 1, 2)
+    store.add("c1", 1, -2)
+    store.set_qty("c1", 3, 1)
+    store.set_qty("c1", 3, 0)
+    assert store.get("c1") == {}
+
+
+def test_clear_only_touches_one_cart(store):
+    store.add("c1", 1, 1)
+    store.add("c2", 1, 1)
+    store.clear("c1")
+    assert store.get("c1") == {}
+    assert store.get("c2") == {"1": 1}
+
+
+def test_memory_store_evicts_least_recently_used_cart():
+    store = cart_store.MemoryCartStore(max_carts=2)
+    store.add("a", 1, 1)
+    store.add("b", 1, 1)
+    store.get("a")
+    store.add("c", 1, 1)
+
+    assert store.get("b") == {}
+    assert store.get("a") == {"1": 1}
+
+
+def test_concurrent_first_add_falls_back_to_update(app, monkeypatch):
+    store = cart_store.DbCartStore()
+    real_execute = db.session.execute
+    calls = {"n": 0}
+
+    class _NoRows:
+        rowcount = 0
+
+    def _execute(statement, *args, **kwargs):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            # 我們的 UPDATE 沒對到 → 另一個 request 剛好搶先 INSERT 了同一個品項
+            with db.engine.begin() as conn:
+                conn.execute(db.insert(CartItem).values(
+                    cart_id="c1", product_id=1, quantity=2, updated_at=datetime.utcnow()))
+            return _NoRows()
+        return real_execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(db.session, "execute", _execute)
+    store.add("c1", 1, 3)
+    monkeypatch.undo()
+
+    assert store.get("c1") == {"1": 5}
+
+
+def test_sweep_deletes_only_fully_abandoned_carts(app):
+    old = datetime.utcnow() - timedelta(days=40)
+    db.session.add_all([
+        CartItem(cart_id="abandoned", product_id=1, quantity=1, updated_at=old),
+        CartItem(cart_id="abandoned", product_id=2, quantity=1, updated_at=old),
+        CartItem(cart_id="active", product_id=1, quantity=1, updated_at=old),
+        CartItem(cart_id="active", product_id=2, quantity=1, updated_at=datetime.utcnow()),
+    ])
+    db.session.commit()
+
+    store = cart_store.DbCartStore()
+    assert store.sweep_expired(ttl_days=30) == 2
+    assert store.get("abandoned") == {}
+    assert store.get("active") == {"1": 1, "2": 1}
@@ -0,0 +1,57 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.pool import StaticPool
+
+from app import create_app
+from app.database import db, is_sqlite_memory, random_order
+from app.models.product import Product
+from app.services import pool_metrics_service
+
+
+@pytest.mark.parametrize("uri, expected", [
+    ("sqlite://", True),
+    ("sqlite:///:memory:", True),
+    ("sqlite:///bench.db", False),
+    ("mssql+pymssql://sa:pw@localhost:1433/shop", False),
+])
+def test_is_sqlite_memory(uri, expected):
+    assert is_sqlite_memory(uri) is expected
+
+
+def test_database_url_overrides_mssql(app):
+    assert app.config["SQLALCHEMY_DATABASE_URI"] == os.environ["DATABASE_URL"]
+    assert db.engine.dialect.name == "sqlite"
+    assert isinstance(db.engine.pool, pool_metrics_service.TimedQueuePool)
+
+
+def test_in_memory_sqlite_drops_queue_pool_options():
+    app = create_app({"TESTING": True, "PAYMENT_RECOVER_ON_STARTUP": False,
+                      "SQLALCHEMY_DATABASE_URI": "sqlite://"})
+    with app.app_context():
+        assert "pool_size" not in app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+        assert isinstance(db.engine.pool, StaticPool)
+        db.create_all()
+        db.session.add(Product(name="p", gender="M", season="summer", price=10, stock=1))
+        db.session.commit()
+        assert Product.query.count() == 1
+        db.session.remove()
+
+
+@pytest.mark.parametrize("dialect, sql", [
+    ("mssql", "newid()"),
+    ("mysql", "rand()"),
+    ("sqlite", "random()"),
+    ("postgresql", "random()"),
+])
+def test_random_order_per_dialect(app, monkeypatch, dialect, sql):
+    monkeypatch.setattr(db.session, "get_bind", lambda *a, **kw: SimpleNamespace(dialect=SimpleNamespace(name=dialect)))
+    assert str(random_order()).lower() == sql
+
+
+def test_random_order_runs_on_sqlite(app):
+    db.session.add_all([Product(name=f"p{i}", gender="M", season="summer", price=10, stock=1) for i in range(3)])
+    db.session.commit()
+
+    assert len(Product.query.order_by(random_order()).all()) == 3
@@ -0,0 +1,72 @@
+import pytest
+
+from app.database import db
+from app.models.chaos_config import ChaosConfig
+from app.services import fragment_cache_service as cache
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache(app):
+    app.config.update(FRAGMENT_CACHE_VERSION_TTL=0, FRAGMENT_CACHE_MAX_BYTES=1024)
+    with cache._lock:
+        cache._entries.clear()
+        cache._total_bytes = 0
+        cache._shared.update(version=None, checked_at=None)
+
+
+def _put(gender, season, html="<ul></ul>"):
+    key = ("product_list", gender or "", season or "", None)
+    cache.put(key, html, tags=[cache.product_list_tag(gender, season)], version=cache.catalog_version())
+    return key
+
+
+def test_purge_drops_only_matching_tags(app):
+    men = _put("M", None)
+    women = _put("F", None)
+    everything = _put(None, None)
+
+    # 新增一件男裝夏季商品：會出現在 M、全部商品，不會出現在 F
+    assert cache.purge(cache.product_tags("M", "summer")) == 2
+    assert cache.get(men) is None
+    assert cache.get(everything) is None
+    assert cache.get(women) == "<ul></ul>"
+
+
+def test_put_rendered_before_purge_is_discarded(app):
+    version = cache.catalog_version()
+    cache.purge(cache.product_tags("M", "summer"))
+
+    key = ("product_list", "", "", None)
+    cache.put(key, "<old/>", tags=[cache.product_list_tag(None, None)], version=version)
+    assert cache.get(key) is None
+
+
+def test_purge_on_another_worker_invalidates_local_fragments(app):
+    key = _put(None, None)
+    assert cache.get(key) is not None
+
+    # 另一個 worker 的 purge：只看得到 DB 上的版本戳記被換掉
+    ChaosConfig.set_value(cache.VERSION_KEY, "other-worker")
+    db.session.commit()
+
+    assert cache.get(key) is None
+    assert cache.stats()["remote_purges"] == 1
+
+
+def test_version_is_not_rechecked_within_ttl(app):
+    app.config["FRAGMENT_CACHE_VERSION_TTL"] = 60
+    key = _put(None, None)
+    ChaosConfig.set_value(cache.VERSION_KEY, "other-worker")
+
+    assert cache.get(key) == "<ul></ul>"
+
+
+def test_evicts_least_recently_used_over_budget(app):
+    a = _put("M", None, "a" * 400)
+    b = _put("F", None, "b" * 400)
+    cache.get(a)
+    c = _put("K", None, "c" * 400)
+
+    assert cache.get(b) is None
+    assert cache.get(a) is not None
+    assert cache.get(c) is not None
@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+
+import pytest
+from PIL import Image
+from sqlalchemy import event
+
+from app.database import db
+from app.models.user import User
+from app.services import identity_service, image_service
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache(app):
+    app.config["IDENTITY_CACHE_TTL"] = 60
+    with identity_service._lock:
+        identity_service._cache.clear()
+
+
+@contextmanager
+def _user_queries():
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        if "users" in statement.lower():
+            statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", _count)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _count)
+
+
+def _user(username="alice", is_admin=False):
+    user = User(username=username, email=f"{username}@example.com", password_hash="x", is_admin=is_admin)
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id  # commit 後會 expire，先讀出來，不然之後算 query 會多一次 refresh
+    return user_id
+
+
+def test_snapshot_is_cached_until_invalidated(app):
+    user_id = _user()
+
+    with _user_queries() as statements:
+        assert identity_service.get_user(user_id).username == "alice"
+        assert identity_service.get_user(user_id).username == "alice"
+    assert len(statements) == 1
+
+    db.session.get(User, user_id).username = "alice2"
+    db.session.commit()
+    assert identity_service.get_user(user_id).username == "alice"  # TTL 內還是舊的
+
+    identity_service.invalidate(user_id)
+    assert identity_service.get_user(user_id).username == "alice2"
+
+
+def test_missing_user_is_cached_as_none(app):
+    with _user_queries() as statements:
+        assert identity_service.get_user(12345) is None
+        assert identity_service.get_user(12345) is None
+    assert len(statements) == 1
+
+
+def test_expired_entry_is_reloaded(app):
+    app.config["IDENTITY_CACHE_TTL"] = 0
+    user_id = _user()
+
+    with _user_queries() as statements:
+        identity_service.get_user(user_id)
+        identity_service.get_user(user_id)
+    assert len(statements) == 2
+
+
+def test_toggle_admin_invalidates_snapshot(app):
+    admin_id = _user("root", is_admin=True)
+    user_id = _user()
+    assert identity_service.get_user(user_id).is_admin is False
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = admin_id
+        sess["is_admin"] = True
+    client.post(f"/admin/users/{user_id}/toggle_admin")
+
+    assert identity_service.get_user(user_id).is_admin is True
+
+
+def test_image_route_does_not_load_user(app, tmp_path):
+    src = tmp_path / "products"
+    src.mkdir()
+    app.config.update(PRODUCT_IMAGE_FOLDER=str(src), PRODUCT_IMAGE_CACHE_FOLDER=str(tmp_path / "cache"))
+    image_service._stat_cache.clear()
+    Image.new("RGB", (10, 10), "white").save(src / "shirt.jpg", format="JPEG")
+    user_id = _user()
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+
+    with _user_queries() as statements:
+        assert client.get("/images/products/shirt.jpg").status_code == 200
+    assert statements == []
@@ -0,0 +1,108 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from app.services import image_service
+
+
+@pytest.fixture
+def images(app, tmp_path):
+    src = tmp_path / "products"
+    cache = tmp_path / "products_cache"
+    src.mkdir()
+    app.config.update(PRODUCT_IMAGE_FOLDER=str(src), PRODUCT_IMAGE_CACHE_FOLDER=str(cache))
+    image_service._stat_cache.clear()
+    Image.new("RGB", (1000, 500), "white").save(src / "shirt.jpg", format="JPEG")
+    return src, cache
+
+
+def _size(data: bytes):
+    with Image.open(io.BytesIO(data)) as img:
+        return img.size
+
+
+def test_resized_variant_is_generated_once_and_cached(app, images):
+    _, cache = images
+    client = app.test_client()
+
+    resp = client.get("/images/products/shirt.jpg?w=320")
+    assert resp.status_code == 200
+    assert _size(resp.data) == (320, 160)
+
+    derivative = cache / "w320" / "shirt.jpg"
+    mtime = derivative.stat().st_mtime_ns
+    assert client.get("/images/products/shirt.jpg?w=320").data == resp.data
+    assert derivative.stat().st_mtime_ns == mtime
+
+
+def test_unsupported_width_serves_original(app, images):
+    _, cache = images
+    resp = app.test_client().get("/images/products/shirt.jpg?w=333")
+
+    assert _size(resp.data) == (1000, 500)
+    assert not cache.exists()
+
+
+def test_variant_is_rebuilt_when_original_changes(app, images):
+    src, cache = images
+    client = app.test_client()
+    client.get("/images/products/shirt.jpg?w=160")
+
+    Image.new("RGB", (400, 400), "black").save(src / "shirt.jpg", format="JPEG")
+    later = os.path.getmtime(cache / "w160" / "shirt.jpg") + 10
+    os.utime(src / "shirt.jpg", (later, later))
+    image_service._stat_cache.clear()
+
+    assert _size(client.get("/images/products/shirt.jpg?w=160").data) == (160, 160)
+
+
+def test_path_traversal_is_rejected(app, images):
+    assert app.test_client().get("/images/products/..%2Fsecret.jpg?w=320").status_code == 404
+
+
+def test_etag_revalidation_returns_304(app, images):
+    client = app.test_client()
+    first = client.get("/images/products/shirt.jpg?w=320")
+    etag = first.headers["ETag"]
+
+    resp = client.get("/images/products/shirt.jpg?w=320", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.data == b""
+    assert resp.headers["ETag"] == etag
+
+    # 不同寬度是不同的 representation
+    other = client.get("/images/products/shirt.jpg?w=640", headers={"If-None-Match": etag})
+    assert other.status_code == 200
+
+
+def test_if_modified_since_returns_304(app, images):
+    client = app.test_client()
+    last_modified = client.get("/images/products/shirt.jpg").headers["Last-Modified"]
+
+    resp = client.get("/images/products/shirt.jpg", headers={"If-Modified-Since": last_modified})
+    assert resp.status_code == 304
+
+
+def test_versioned_url_is_immutable(app, images):
+    with app.test_request_context():
+        url = image_service.product_image_url("shirt.jpg", width=320)
+    assert "w=320" in url and "v=" in url
+
+    resp = app.test_client().get(url)
+    assert resp.cache_control.immutable
+    assert resp.cache_control.max_age == image_service.IMMUTABLE_MAX_AGE
+    assert resp.cache_control.public
+
+
+def test_unversioned_or_stale_version_gets_short_max_age(app, images):
+    client = app.test_client()
+    for url in ("/images/products/shirt.jpg", "/images/products/shirt.jpg?v=old"):
+        resp = client.get(url)
+        assert not resp.cache_control.immutable
+        assert resp.cache_control.max_age == app.config["IMAGE_MAX_AGE"]
+
+
+def test_missing_image_is_404(app, images):
+    assert app.test_client().get("/images/products/nope.jpg").status_code == 404
@@ -0,0 +1,110 @@
+import io
+import os
+import time
+
+import pytest
+
+from app.database import db
+from app.models.image_blob import ImageBlob
+from app.models.product import Product
+from app.models.product_image import ProductImage
+from app.services import image_store_service
+
+
+class _Upload:
+    def __init__(self, data: bytes, filename: str = "photo.PNG"):
+        self.stream = io.BytesIO(data)
+        self.filename = filename
+
+
+@pytest.fixture
+def img_dir(app, tmp_path):
+    app.config["PRODUCT_IMAGE_FOLDER"] = str(tmp_path)
+    return tmp_path
+
+
+def _blob(filename):
+    db.session.expire_all()
+    return ImageBlob.query.filter_by(filename=filename).one_or_none()
+
+
+def test_same_content_is_stored_once(img_dir):
+    first = image_store_service.store_upload(_Upload(b"hello"))
+    db.session.commit()
+    second = image_store_service.store_upload(_Upload(b"hello", "other.png"))
+    db.session.commit()
+
+    assert first == second
+    assert first.endswith(".png")
+    assert _blob(first).ref_count == 2
+    assert sorted(os.listdir(img_dir)) == [first]
+
+
+def test_file_appears_only_after_commit(img_dir):
+    filename = image_store_service.store_upload(_Upload(b"hello"))
+    assert not (img_dir / filename).exists()
+
+    db.session.commit()
+    assert (img_dir / filename).read_bytes() == b"hello"
+
+
+def test_rollback_leaves_no_file(img_dir):
+    image_store_service.store_upload(_Upload(b"hello"))
+    db.session.rollback()
+
+    assert os.listdir(img_dir) == []
+    assert ImageBlob.query.count() == 0
+
+
+def test_sweep_removes_unreferenced_blob_and_reupload_restores_it(img_dir):
+    filename = image_store_service.store_upload(_Upload(b"hello"))
+    db.session.commit()
+    db.session.execute(db.update(ImageBlob).values(ref_count=0))
+    db.session.commit()
+
+    assert image_store_service.sweep_orphans() == 1
+    assert _blob(filename) is None
+    assert not (img_dir / filename).exists()
+
+    image_store_service.store_upload(_Upload(b"hello"))
+    db.session.commit()
+    assert _blob(filename).ref_count == 1
+    assert (img_dir / filename).exists()
+
+
+def test_sweep_keeps_referenced_blobs(img_dir):
+    filename = image_store_service.store_upload(_Upload(b"hello"))
+    db.session.commit()
+
+    assert image_store_service.sweep_orphans() == 0
+    assert (img_dir / filename).exists()
+
+
+def test_stale_upload_temp_files_are_swept(img_dir):
+    stale = img_dir / "crashed.upload"
+    stale.write_bytes(b"x")
+    old = time.time() - image_store_service._STALE_UPLOAD_SECONDS - 10
+    os.utime(stale, (old, old))
+    in_progress = img_dir / "in-progress.upload"
+    in_progress.write_bytes(b"x")
+
+    assert image_store_service.sweep_stale_uploads() == 1
+    assert not stale.exists()
+    assert in_progress.exists()
+
+
+def test_release_product_images_decrements_once_per_use(img_dir):
+    filename = image_store_service.store_upload(_Upload(b"hello"))
+    image_store_service.store_upload(_Upload(b"hello"))
+    image_store_service.store_upload(_Upload(b"hello"))
+    p = Product(name="p", gender="M", season="summer", price=10, stock=1)
+    db.session.add(p)
+    db.session.flush()
+    db.session.add_all([ProductImage(product_id=p.id, filename=filename) for _ in range(2)])
+    db.session.commit()
+
+    image_store_service.release_product_images(p.id)
+    db.session.commit()
+
+    # 3 次引用（其中 2 次是這個商品）→ 剩 1
+    assert _blob(filename).ref_count == 1
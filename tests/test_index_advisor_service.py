@@ -0,0 +1,175 @@
+import pytest
+
+from app.services import index_advisor_service as advisor
+from app.services import slow_query_service
+
+
+def _table(columns, pk=("id",), unique=(), indexes=()):
+    pk = list(pk)
+    unique = [list(u) for u in unique]
+    return {
+        "columns": set(columns),
+        "pk": pk,
+        "unique": unique,
+        "indexes": [list(ix) + [c for c in pk if c not in ix] for ix in indexes] + unique + [pk],
+    }
+
+
+SCHEMA = {
+    "products": _table(
+        ["id", "name", "gender", "season", "active", "created_at"],
+        indexes=[("active", "created_at", "id"), ("active", "gender", "created_at", "id")],
+    ),
+    "product_images": _table(["id", "product_id", "filename", "is_main"]),
+    "users": _table(["id", "username", "email", "created_at"], unique=[("username",), ("email",)]),
+    "orders": _table(["id", "user_id", "status", "created_at", "total_amount"]),
+}
+
+
+def _fp(sql, fid="f1", total_ms=10.0, count=1):
+    return {"id": fid, "fingerprint": slow_query_service.fingerprint(sql), "total_ms": total_ms, "count": count}
+
+
+# ---------- fingerprint ----------
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM t WHERE id = 5 AND name = 'o''brien'", "SELECT * FROM t WHERE id = ? AND name = ?"),
+    ("SELECT * FROM t WHERE name = N'商品'", "SELECT * FROM t WHERE name = ?"),
+    ("SELECT * FROM t WHERE id IN (1, 2, 3)", "SELECT * FROM t WHERE id IN (?)"),
+    ("SELECT * FROM t WHERE id IN (?, ?,?)", "SELECT * FROM t WHERE id IN (?)"),
+    ("SELECT * FROM t WHERE id = @P1 AND x = %(x_1)s AND y = :y", "SELECT * FROM t WHERE id = ? AND x = ? AND y = ?"),
+    ("INSERT INTO t (a, b) VALUES (?, ?), (?, ?)", "INSERT INTO t (a, b) VALUES (?)"),
+    ("SELECT t1.col2 FROM t1\n   WHERE t1.price > -1.5", "SELECT t1.col2 FROM t1 WHERE t1.price > ?"),
+])
+def test_fingerprint_normalises_literals_and_params(sql, expected):
+    assert slow_query_service.fingerprint(sql) == expected
+
+
+def test_same_query_with_different_params_shares_fingerprint():
+    a = slow_query_service.fingerprint("SELECT * FROM orders WHERE user_id = 1 AND id IN (1, 2)")
+    b = slow_query_service.fingerprint("SELECT * FROM orders WHERE user_id = 42 AND id IN (7)")
+    assert a == b
+    assert slow_query_service.fingerprint_id(a) == slow_query_service.fingerprint_id(b)
+
+
+# ---------- _strip_set_clause ----------
+
+def test_strip_set_clause_drops_assignments_keeps_where():
+    sql = advisor._strip_set_clause("UPDATE products SET stock = stock - ?, name = ? WHERE products.id = ?")
+    assert "stock =" not in sql and "name =" not in sql
+    assert sql.endswith("WHERE products.id = ?")
+
+
+def test_strip_set_clause_keeps_correlated_subquery():
+    sql = advisor._strip_set_clause(
+        "UPDATE products SET stock = stock + (SELECT sum(order_items.quantity) FROM order_items "
+        "WHERE order_items.product_id = products.id AND order_items.order_id = ?) WHERE products.id IN (?)"
+    )
+    assert "order_items.order_id = ?" in sql
+    assert "stock =" not in sql
+
+
+def test_strip_set_clause_ignores_select():
+    sql = "SELECT * FROM products WHERE name = ?"
+    assert advisor._strip_set_clause(sql) == sql
+
+
+# ---------- analyze ----------
+
+def test_analyze_keyset_page_is_equality_sort_and_range():
+    fp = slow_query_service.fingerprint(
+        "SELECT products.id FROM products WHERE products.active = 1 AND products.gender = 'M' "
+        "AND products.created_at <= ? AND (products.created_at < ? OR products.id < ?) "
+        "ORDER BY products.created_at DESC, products.id DESC LIMIT ? OFFSET ?"
+    )
+    [usage] = advisor.analyze(fp, SCHEMA)
+
+    assert usage["table"] == "products"
+    assert usage["equality"] == ["active", "gender"]
+    assert usage["sort"] == ["created_at", "id"]
+    # pagination_service 的 keyset 條件：OR 兩邊都是範圍，不拆成單欄 index
+    assert usage["or_branches"] == []
+    assert set(usage["range"]) == {"created_at", "id"}
+
+
+def test_analyze_join_and_aliases():
+    fp = slow_query_service.fingerprint(
+        "SELECT p.id, i.filename FROM products AS p JOIN product_images i ON i.product_id = p.id "
+        "WHERE p.season = 'winter'"
+    )
+    usage = {u["table"]: u for u in advisor.analyze(fp, SCHEMA)}
+
+    assert usage["products"]["equality"] == ["season", "id"]
+    assert usage["product_images"]["equality"] == ["product_id"]
+
+
+def test_analyze_or_of_equalities_are_branches():
+    fp = slow_query_service.fingerprint(
+        "SELECT users.id FROM users WHERE users.username LIKE ? ESCAPE ? OR users.email LIKE ? ESCAPE ?"
+    )
+    [usage] = advisor.analyze(fp, SCHEMA)
+    assert usage["or_branches"] == ["username", "email"]
+    assert usage["equality"] == []
+
+
+def test_analyze_skips_insert_and_unknown_tables():
+    assert advisor.analyze("INSERT INTO products (name) VALUES (?)", SCHEMA) == []
+    assert advisor.analyze("SELECT * FROM audit_log WHERE id = ?", SCHEMA) == []
+
+
+def test_analyze_update_ignores_set_columns():
+    fp = slow_query_service.fingerprint("UPDATE orders SET status = 'paid' WHERE orders.id = 5 AND orders.status = 'pending'")
+    [usage] = advisor.analyze(fp, SCHEMA)
+    assert usage["equality"] == ["id", "status"]
+
+
+# ---------- _covered ----------
+
+def test_covered_equality_prefix_in_any_order():
+    existing = [["gender", "active", "created_at", "id"]]
+    assert advisor._covered(["active", "gender", "created_at", "id"], 2, existing)
+    assert advisor._covered(["active", "gender"], 2, existing)
+
+
+def test_covered_requires_sort_columns_in_order():
+    existing = [["active", "id", "created_at"]]
+    assert not advisor._covered(["active", "created_at", "id"], 1, existing)
+    assert not advisor._covered(["active", "created_at"], 1, [["active"]])
+
+
+# ---------- suggest ----------
+
+def test_suggest_nothing_for_indexed_catalog_queries():
+    fps = [
+        _fp("SELECT products.id FROM products WHERE products.active = 1 "
+            "ORDER BY products.created_at DESC, products.id DESC LIMIT 20", "a"),
+        _fp("SELECT products.id FROM products WHERE products.active = 1 AND products.gender = 'M' "
+            "ORDER BY products.created_at DESC, products.id DESC LIMIT 20", "b"),
+    ]
+    assert advisor.suggest(fps, SCHEMA) == []
+
+
+def test_suggest_missing_index_and_merges_prefixes():
+    fps = [
+        _fp("SELECT * FROM orders WHERE orders.user_id = 1 ORDER BY orders.created_at DESC, orders.id DESC",
+            "list", total_ms=50.0, count=5),
+        _fp("SELECT count(*) FROM orders WHERE orders.user_id = 1", "count", total_ms=20.0, count=2),
+        _fp("SELECT * FROM product_images WHERE product_images.product_id = 3", "imgs", total_ms=5.0),
+    ]
+    suggestions = advisor.suggest(fps, SCHEMA)
+
+    assert [(s["table"], s["columns"]) for s in suggestions] == [
+        ("orders", ["user_id", "created_at", "id"]),
+        ("product_images", ["product_id"]),
+    ]
+    orders = suggestions[0]
+    # (user_id) 被 (user_id, created_at, id) 蓋掉，併進同一個建議
+    assert sorted(orders["fingerprints"]) == ["count", "list"]
+    assert orders["total_ms"] == 70.0 and orders["count"] == 7
+    assert orders["name"] == "ix_orders_user_id_created_at_id"
+
+
+def test_suggest_skips_lookup_by_unique_key():
+    fps = [_fp("SELECT * FROM users WHERE users.username = 'alice'"),
+           _fp("SELECT * FROM orders WHERE orders.id = 3", "pk")]
+    assert advisor.suggest(fps, SCHEMA) == []
@@ -0,0 +1,68 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from app.database import db
+from app.models.order import Order
+from app.models.order_item import OrderItem
+from app.services import order_export_service
+
+ALL = ("", "", "", "")
+
+
+def _order(created_at, items):
+    order = Order(user_id=1, total_amount=10, status="paid", created_at=created_at)
+    db.session.add(order)
+    db.session.flush()
+    for name, qty in items:
+        db.session.add(OrderItem(order_id=order.id, product_id=1, product_name=name, unit_price=5, quantity=qty))
+    db.session.commit()
+    return order
+
+
+def _csv_rows(chunks):
+    text = "".join(chunks)
+    assert text.startswith("\ufeff")
+    return list(csv.reader(io.StringIO(text[1:])))
+
+
+def test_csv_neutralises_formula_cells(app):
+    _order(datetime(2024, 1, 1), [("=HYPERLINK(\"http://evil\")", 1), ("-2+3", 1), ("@SUM(A1)", 1), ("白色 T-shirt", 2)])
+
+    rows = _csv_rows(order_export_service.iter_csv(ALL))
+    names = [r[rows[0].index("product_name")] for r in rows[1:]]
+    assert names == ["'=HYPERLINK(\"http://evil\")", "'-2+3", "'@SUM(A1)", "白色 T-shirt"]
+    # 數字欄位不加前綴
+    assert rows[1][rows[0].index("unit_price")] == "5.00"
+
+
+def test_csv_streams_in_batches_with_one_row_per_item(app):
+    app.config["ORDER_EXPORT_BATCH_SIZE"] = 2
+    t0 = datetime(2024, 1, 1)
+    older = _order(t0, [("a", 1), ("b", 1)])
+    newer = _order(t0 + timedelta(hours=1), [("c", 1)])
+    empty = _order(t0 + timedelta(hours=2), [])
+
+    chunks = list(order_export_service.iter_csv(ALL))
+    assert len(chunks) == 3  # 表頭 + 2 列、2 列、剩下的
+
+    rows = _csv_rows(chunks)
+    assert rows[0] == order_export_service.CSV_COLUMNS
+    assert [int(r[0]) for r in rows[1:]] == [empty.id, newer.id, older.id, older.id]
+    assert rows[1][5:] == ["", "", "", "", ""]
+
+
+def test_ndjson_groups_items_per_order(app):
+    app.config["ORDER_EXPORT_BATCH_SIZE"] = 1
+    t0 = datetime(2024, 1, 1)
+    older = _order(t0, [("a", 1), ("=b", 2)])
+    newer = _order(t0 + timedelta(hours=1), [])
+
+    chunks = list(order_export_service.iter_ndjson(ALL))
+    orders = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert len(chunks) == 2
+    assert [o["order_id"] for o in orders] == [newer.id, older.id]
+    assert orders[0]["items"] == []
+    # JSON 不是試算表，不加前綴
+    assert [(i["product_name"], i["quantity"]) for i in orders[1]["items"]] == [("a", 1), ("=b", 2)]
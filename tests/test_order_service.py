@@ -0,0 +1,194 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.database import db
+from app.models.order import Order
+from app.models.order_item import OrderItem
+from app.models.product import Product
+from app.services import order_service, payment_service
+
+
+def _product(name: str, stock: int) -> Product:
+    p = Product(name=name, gender="M", season="summer", price=10, stock=stock)
+    db.session.add(p)
+    db.session.commit()
+    return p
+
+
+def test_reserve_stock_reports_only_short_lines(app):
+    plenty = _product("plenty", stock=5)
+    short = _product("short", stock=1)
+
+    # plenty 扣完剩 2（< 3），不能因為這樣被誤判成不夠
+    result = order_service._reserve_stock({plenty.id: 3, short.id: 2})
+    db.session.rollback()
+
+    assert result == [short.id]
+    assert db.session.get(Product, plenty.id).stock == 5
+
+
+def test_reserve_stock_all_available(app):
+    a = _product("a", stock=2)
+    b = _product("b", stock=2)
+
+    assert order_service._reserve_stock({a.id: 2, b.id: 1}) == []
+    db.session.commit()
+    assert db.session.get(Product, a.id).stock == 0
+    assert db.session.get(Product, b.id).stock == 1
+
+
+def _order(status: str, lines, created_at=None, user_id: int = 1) -> Order:
+    """lines：[(product, qty)]；庫存視為結帳時已經扣過"""
+    order = Order(user_id=user_id, total_amount=10, status=status, created_at=created_at or datetime.utcnow())
+    db.session.add(order)
+    db.session.flush()
+    for product, qty in lines:
+        db.session.add(OrderItem(order_id=order.id, product_id=product.id, product_name=product.name,
+                                 unit_price=product.price, quantity=qty))
+    db.session.commit()
+    return order
+
+
+def _stock(product_id: int) -> int:
+    db.session.expire_all()
+    return db.session.get(Product, product_id).stock
+
+
+def test_failed_payment_returns_stock(app, monkeypatch):
+    p = _product("p", stock=3)
+    order = _order("pending", [(p, 2), (p, 1)])
+
+    monkeypatch.setattr(payment_service.time, "sleep", lambda s: None)
+    monkeypatch.setattr(payment_service.random, "random", lambda: 0.99)  # 金流失敗
+    assert payment_service.finalize_payment_if_pending(order.id).status == "failed"
+    assert _stock(p.id) == 6
+
+
+def test_paid_order_keeps_stock_reserved(app, monkeypatch):
+    p = _product("p", stock=3)
+    order = _order("pending", [(p, 2)])
+
+    monkeypatch.setattr(payment_service.time, "sleep", lambda s: None)
+    monkeypatch.setattr(payment_service.random, "random", lambda: 0.0)
+    assert payment_service.finalize_payment_if_pending(order.id).status == "paid"
+    assert _stock(p.id) == 3
+
+
+def test_retrying_failed_order_reserves_stock_again(app, monkeypatch):
+    p = _product("p", stock=5)
+    order = _order("failed", [(p, 2)])
+
+    # 不真的丟背景 worker，slot 直接還掉
+    monkeypatch.setattr(payment_service, "_submit", lambda order_id: payment_service._release_slot())
+    assert payment_service.start_payment(order.id).status == "pending"
+    assert _stock(p.id) == 3
+
+
+def test_retrying_failed_order_without_stock_stays_failed(app, monkeypatch):
+    p = _product("p", stock=1)
+    order = _order("failed", [(p, 2)])
+
+    inflight = payment_service.get_metrics()["inflight"]
+    monkeypatch.setattr(payment_service, "_submit", lambda order_id: payment_service._release_slot())
+    with pytest.raises(order_service.OutOfStockError):
+        payment_service.start_payment(order.id)
+    db.session.expire_all()
+    assert db.session.get(Order, order.id).status == "failed"
+    assert _stock(p.id) == 1
+    assert payment_service.get_metrics()["inflight"] == inflight
+
+
+def test_unpaid_orders_expire_and_return_stock(app):
+    app.config["ORDER_UNPAID_TTL"] = 60
+    p = _product("p", stock=0)
+    old = _order("created", [(p, 2)], created_at=datetime.utcnow() - timedelta(minutes=5))
+    fresh = _order("created", [(p, 1)])
+    paying = _order("pending", [(p, 4)], created_at=datetime.utcnow() - timedelta(minutes=5))
+
+    assert order_service.expire_unpaid_orders() == 1
+    db.session.expire_all()
+    assert db.session.get(Order, old.id).status == "failed"
+    assert db.session.get(Order, fresh.id).status == "created"
+    assert db.session.get(Order, paying.id).status == "pending"
+    assert _stock(p.id) == 2
+
+
+def test_list_user_orders_pages_own_orders_with_aggregates(app):
+    p = _product("p", stock=10)
+    q = _product("q", stock=10)
+    t0 = datetime(2024, 1, 1)
+    mine = [_order("paid", [(p, 1), (q, 2)], created_at=t0 + timedelta(minutes=i), user_id=2) for i in range(3)]
+    _order("paid", [(p, 1)], created_at=t0 + timedelta(minutes=10), user_id=3)
+
+    first = order_service.list_user_orders(2, limit=2)
+    assert [o.id for o in first["items"]] == [mine[2].id, mine[1].id]
+    second = order_service.list_user_orders(2, cursor=first["next_cursor"], limit=2)
+    assert [o.id for o in second["items"]] == [mine[0].id]
+    assert second["next_cursor"] is None
+
+    agg = first["aggregates"][mine[2].id]
+    assert agg == {"line_count": 2, "total_qty": 3, "items_total": 30.0}
+    assert set(first["aggregates"]) == {mine[2].id, mine[1].id}
+
+
+def test_item_aggregates_single_query_for_many_orders(app):
+    p = _product("p", stock=10)
+    orders = [_order("paid", [(p, n)]) for n in (1, 2, 3)]
+
+    aggregates = order_service.get_item_aggregates([o.id for o in orders])
+    assert [aggregates[o.id]["total_qty"] for o in orders] == [1, 2, 3]
+    assert order_service.get_item_aggregates([]) == {}
+
+
+def test_unknown_status_is_rejected_by_check_constraint(app):
+    p = _product("p", stock=1)
+    with pytest.raises(IntegrityError):
+        _order("cancelled", [(p, 1)])
+    db.session.rollback()
+    assert "cancelled" not in order_service.ORDER_STATUSES
+
+
+def test_admin_filters_drop_bad_dates_and_match_status(app):
+    filters = order_service.normalize_admin_filters(" PAID ", "", "2024-13-01", "2024-01-31")
+    assert filters == ("PAID", "", "", "2024-01-31")
+
+    p = _product("p", stock=10)
+    paid = _order("paid", [(p, 1)], created_at=datetime(2024, 1, 31, 23, 0))
+    _order("failed", [(p, 1)], created_at=datetime(2024, 1, 15))
+    _order("paid", [(p, 1)], created_at=datetime(2024, 2, 1))
+
+    assert [o.id for o in order_service.admin_order_query(filters).all()] == [paid.id]
+
+
+def test_order_count_is_computed_in_background_and_cached(app):
+    p = _product("p", stock=10)
+    _order("paid", [(p, 1)])
+    _order("paid", [(p, 1)])
+    filters = ("", "paid", "", "")
+    order_service._count_cache.pop(filters, None)
+
+    # 第一次：還沒算過 → 不等 COUNT，回 None
+    assert order_service.get_cached_order_count(filters) is None
+    deadline = time.monotonic() + 5
+    while filters in order_service._count_refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert order_service.get_cached_order_count(filters) == 2
+
+
+def test_admin_deleting_unpaid_order_returns_stock(app):
+    p = _product("p", stock=0)
+    order = _order("created", [(p, 2)])
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["is_admin"] = True
+
+    client.post(f"/admin/orders/{order.id}/delete")
+
+    db.session.expire_all()
+    assert db.session.get(Order, order.id) is None
+    assert _stock(p.id) == 2
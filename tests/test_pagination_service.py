@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+from app.database import db
+from app.models.product import Product
+from app.services import pagination_service
+
+
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def _products(created):
+    """created：每筆的 created_at（可以重複，測同一時間的 tie）"""
+    rows = [Product(name=f"p{i}", gender="M", season="summer", price=10, stock=1, created_at=c)
+            for i, c in enumerate(created)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+def _page(cursor, limit):
+    query = Product.query.filter(Product.active == True)
+    return pagination_service.keyset_page(query, Product.created_at, Product.id, cursor, limit)
+
+
+def test_cursor_round_trip():
+    token = pagination_service.encode_cursor(pagination_service.PREV, T0, 42)
+    assert pagination_service.decode_cursor(token) == (pagination_service.PREV, T0, 42)
+
+
+def test_tampered_cursor_is_first_page():
+    assert pagination_service.decode_cursor("not-a-cursor") is None
+    assert pagination_service.decode_cursor("") is None
+    bad_direction = pagination_service.encode_cursor("x", T0, 1)
+    assert pagination_service.decode_cursor(bad_direction) is None
+
+
+def test_keyset_page_walks_forward_and_back(app):
+    # 5 筆：其中 3 筆同一秒，要靠 id 分先後
+    rows = _products([T0, T0 + timedelta(seconds=1), T0 + timedelta(seconds=1),
+                      T0 + timedelta(seconds=1), T0 + timedelta(seconds=2)])
+    newest_first = [r.id for r in sorted(rows, key=lambda r: (r.created_at, r.id), reverse=True)]
+
+    first = _page(None, 2)
+    assert [p.id for p in first["items"]] == newest_first[:2]
+    assert first["prev_cursor"] is None
+
+    second = _page(first["next_cursor"], 2)
+    assert [p.id for p in second["items"]] == newest_first[2:4]
+
+    last = _page(second["next_cursor"], 2)
+    assert [p.id for p in last["items"]] == newest_first[4:]
+    assert last["next_cursor"] is None
+
+    back = _page(second["prev_cursor"], 2)
+    assert [p.id for p in back["items"]] == newest_first[:2]
+    assert back["prev_cursor"] is None
+
+
+def test_keyset_page_exact_multiple_has_no_empty_next_page(app):
+    _products([T0 + timedelta(seconds=i) for i in range(4)])
+
+    first = _page(None, 2)
+    second = _page(first["next_cursor"], 2)
+    assert len(second["items"]) == 2
+    assert second["next_cursor"] is None
+
+
+def test_keyset_slice_matches_keyset_page():
+    keys = [(T0 + timedelta(seconds=s), i) for s, i in ((3, 5), (2, 4), (2, 3), (1, 2), (0, 1))]
+
+    first = pagination_service.keyset_slice(keys, None, 2)
+    assert first["keys"] == keys[:2] and first["prev_cursor"] is None
+
+    second = pagination_service.keyset_slice(keys, first["next_cursor"], 2)
+    assert second["keys"] == keys[2:4]
+
+    back = pagination_service.keyset_slice(keys, second["prev_cursor"], 2)
+    assert back["keys"] == keys[:2]
+    assert back["prev_cursor"] is None
+
+    last = pagination_service.keyset_slice(keys, second["next_cursor"], 2)
+    assert last["keys"] == keys[4:] and last["next_cursor"] is None
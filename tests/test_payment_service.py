@@ -0,0 +1,138 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database import db
+from app.models.order import Order
+from app.services import payment_service
+
+
+def _order(status: str = "pending") -> Order:
+    order = Order(user_id=1, total_amount=10, status=status)
+    db.session.add(order)
+    db.session.commit()
+    return order
+
+
+def _crash_after_claim(order_id: int, seconds_ago: float) -> None:
+    """模擬 worker 搶到單（pending → processing）之後 process 就掛了"""
+    assert payment_service._claim(order_id) is not None
+    db.session.execute(
+        db.update(Order)
+        .where(Order.id == order_id)
+        .values(processing_at=datetime.utcnow() - timedelta(seconds=seconds_ago))
+    )
+    db.session.commit()
+
+
+def _status(order_id: int) -> str:
+    db.session.expire_all()
+    return db.session.get(Order, order_id).status
+
+
+def test_recover_requeues_processing_order_with_expired_lease(app, monkeypatch):
+    order = _order()
+    _crash_after_claim(order.id, seconds_ago=app.config["PAYMENT_PROCESSING_LEASE"] + 1)
+
+    submitted = []
+    monkeypatch.setattr(payment_service, "_submit", submitted.append)
+    monkeypatch.setattr(payment_service, "_release_slot", lambda: None)
+
+    assert payment_service.recover_pending_orders() == 1
+    assert submitted == [order.id]
+    assert _status(order.id) == "pending"
+
+    # 重新丟回背景之後可以正常跑完
+    monkeypatch.setattr(payment_service.time, "sleep", lambda s: None)
+    finished = payment_service.finalize_payment_if_pending(order.id)
+    assert finished.status in ("paid", "failed")
+    assert finished.processing_at is None
+    assert finished.claim_token is None
+
+
+def test_recover_leaves_live_claim_alone(app, monkeypatch):
+    order = _order()
+    _crash_after_claim(order.id, seconds_ago=0)
+
+    monkeypatch.setattr(payment_service, "_submit", lambda order_id: None)
+    assert payment_service.recover_pending_orders() == 0
+    assert _status(order.id) == "processing"
+
+
+def test_stale_worker_cannot_overwrite_reclaimed_order(app):
+    order = _order()
+    stale_token = payment_service._claim(order.id)
+
+    # lease 過期被撿回去，由新的 worker 重新搶單（同一秒內也一樣拿到不同的 token）
+    expired = datetime.utcnow() - timedelta(hours=1)
+    db.session.execute(
+        db.update(Order).where(Order.id == order.id).values(processing_at=expired)
+    )
+    db.session.commit()
+    payment_service.release_expired_claims()
+    new_token = payment_service._claim(order.id)
+    assert new_token not in (None, stale_token)
+
+    # 舊 worker 的結果寫不進去，新的 worker 可以
+    assert payment_service._complete(order.id, stale_token, True) is False
+    assert _status(order.id) == "processing"
+    assert payment_service._complete(order.id, new_token, False) is True
+    assert _status(order.id) == "failed"
+
+
+class _HeldExecutor:
+    """丟進來的工作先留著不跑（模擬還在佇列裡）"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn):
+        self.jobs.append(fn)
+
+
+def test_periodic_recovery_skips_orders_already_queued_here(app, monkeypatch):
+    order = _order()
+    executor = _HeldExecutor()
+    monkeypatch.setattr(payment_service, "_get_executor", lambda: executor)
+    monkeypatch.setattr(payment_service.time, "sleep", lambda s: None)
+
+    assert payment_service.recover_pending_orders() == 1
+    # 下一輪：還在本 process 的佇列裡，不再丟一次
+    assert payment_service.recover_pending_orders() == 0
+
+    executor.jobs.pop()()
+    assert _status(order.id) in ("paid", "failed")
+    assert order.id not in payment_service._queued
+
+
+
+def test_long_poll_returns_when_status_changes(app):
+    order = _order()
+    assert payment_service.wait_for_status_change(order.id, "created", timeout=5) == "pending"
+
+    started = time.monotonic()
+    assert payment_service.wait_for_status_change(order.id, "pending", timeout=0.2) == "pending"
+    assert time.monotonic() - started < 2
+
+
+def test_long_poll_rejects_past_waiter_limit(app):
+    order = _order()
+    app.config["ORDER_STATUS_LONGPOLL_MAX_WAITERS"] = 0
+
+    with pytest.raises(payment_service.LongPollBusyError):
+        payment_service.wait_for_status_change(order.id, "pending", timeout=5)
+    assert payment_service.get_metrics()["longpoll_waiters"] == 0
+
+
+def test_status_endpoint_tells_client_to_back_off_when_busy(app):
+    order = _order()
+    app.config["ORDER_STATUS_LONGPOLL_MAX_WAITERS"] = 0
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = order.user_id
+
+    resp = client.get(f"/orders/{order.id}/status?since=pending")
+    assert resp.status_code == 200
+    assert resp.get_json() == {"order_id": order.id, "status": "pending"}
+    assert resp.headers["Retry-After"] == str(app.config["ORDER_STATUS_LONGPOLL_RETRY_AFTER"])
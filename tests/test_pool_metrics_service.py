@@ -0,0 +1,66 @@
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from app.database import db
+from app.services import pool_metrics_service
+
+
+def test_histogram_buckets_are_upper_bounds():
+    h = pool_metrics_service.Histogram((1, 10))
+    for value in (0.5, 1, 5, 10, 11):
+        h.observe(value)
+
+    snap = h.snapshot()
+    assert [b["count"] for b in snap["buckets"]] == [2, 2, 1]
+    assert snap["buckets"][-1]["le"] == "+Inf"
+    assert snap["count"] == 5 and snap["max"] == 11
+    assert snap["avg"] == pytest.approx(27.5 / 5)
+
+
+def test_app_engine_uses_timed_pool_and_records_checkouts(app):
+    assert isinstance(db.engine.pool, pool_metrics_service.TimedQueuePool)
+    before = pool_metrics_service.get_metrics(db.engine)
+
+    with db.engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        during = pool_metrics_service.get_metrics(db.engine)
+
+    after = pool_metrics_service.get_metrics(db.engine)
+    assert during["checked_out"] == before["checked_out"] + 1
+    assert after["checkouts"] == before["checkouts"] + 1
+    assert after["checkins"] == before["checkins"] + 1
+    assert after["checkout_wait_ms"]["count"] == before["checkout_wait_ms"]["count"] + 1
+    assert after["checkout_hold_ms"]["count"] == before["checkout_hold_ms"]["count"] + 1
+
+
+def test_checkout_timeout_is_counted(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=pool_metrics_service.TimedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=0.1)
+    pool_metrics_service.install(engine)
+    try:
+        timeouts = pool_metrics_service.get_metrics(engine)["timeouts"]
+        with engine.connect():
+            with pytest.raises(exc.TimeoutError):
+                engine.connect()
+            data = pool_metrics_service.get_metrics(engine)
+
+        assert data["timeouts"] == timeouts + 1
+        assert data["size"] == 1 and data["checked_out"] == 1
+        assert data["checkout_wait_ms"]["max"] >= 100
+    finally:
+        engine.dispose()
+
+
+def test_pool_endpoint_requires_admin(app):
+    client = app.test_client()
+    assert client.get("/admin/metrics/pool").status_code == 302
+
+    with client.session_transaction() as sess:
+        sess["user_id"] = 1
+        sess["is_admin"] = True
+    resp = client.get("/admin/metrics/pool")
+
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["pool_class"] == "TimedQueuePool"
+    assert {"checked_out", "overflow", "checkout_wait_ms", "connection_lifetime_s"} <= set(data)
@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app.database import db
+from app.models.product import Product
+from app.models.product_image import ProductImage
+from app.services import chaos_service, index_advisor_service, product_service, slow_query_service
+
+
+def _products(n: int, images_each: int = 2):
+    for i in range(n):
+        p = Product(name=f"p{i}", gender="M", season="summer", price=10, stock=1)
+        db.session.add(p)
+        db.session.flush()
+        for j in range(images_each):
+            db.session.add(ProductImage(product_id=p.id, filename=f"p{i}_{j}.jpg", is_main=j == 0))
+    db.session.commit()
+
+
+@contextmanager
+def _count_queries():
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", _count)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _count)
+
+
+def test_list_products_loads_images_in_one_query(app):
+    _products(10)
+    db.session.expunge_all()
+    chaos_service.is_enabled(chaos_service.NPLUS1_IMAGES)  # 先把 flag 快取載好，不算進去
+
+    with _count_queries() as statements:
+        page = product_service.list_products()
+        images = [img.filename for p in page["items"] for img in p.images]
+
+    assert len(page["items"]) == 10
+    assert len(images) == 20
+    # 商品 1 個 + 圖片 1 個 IN query，跟商品數量無關
+    assert len(statements) == 2
+
+
+def test_nplus1_chaos_queries_images_per_product(app):
+    chaos_service.set_flag(chaos_service.NPLUS1_IMAGES, True)
+    _products(5)
+    db.session.expunge_all()
+    chaos_service.is_enabled(chaos_service.NPLUS1_IMAGES)
+
+    with _count_queries() as statements:
+        page = product_service.list_products()
+
+    assert all(len(p._nplus1_images) == 2 for p in page["items"])
+    assert len(statements) == 1 + 5
+
+
+def test_catalog_queries_are_served_by_indexes(app):
+    # 每種篩選組合（含帶 cursor 的下一頁）都要有 index 同時蓋到等值欄位跟 created_at, id 排序
+    _products(3, images_each=0)
+    cursor = product_service.list_products(limit=1)["next_cursor"]
+
+    slow_query_service.set_threshold(0)
+    slow_query_service.reset()
+    try:
+        for gender, season in ((None, None), ("M", None), (None, "summer"), ("M", "summer")):
+            product_service.list_products(gender=gender, season=season)
+            product_service.list_products(gender=gender, season=season, cursor=cursor)
+        fingerprints = slow_query_service.get_fingerprints()["fingerprints"]
+    finally:
+        slow_query_service.set_threshold(app.config["SLOW_QUERY_MS"])
+        slow_query_service.reset()
+
+    schema = index_advisor_service.load_schema(db.engine)
+    suggestions = index_advisor_service.suggest(fingerprints, schema)
+    assert [s for s in suggestions if s["table"] == "products"] == []
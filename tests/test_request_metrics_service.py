@@ -0,0 +1,97 @@
+import re
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, text
+
+from app.database import db
+from app.models.product import Product
+from app.services import request_metrics_service
+
+
+_SERVER_TIMING_RE = re.compile(
+    r'db;dur=[\d.]+;desc="(\d+) queries", tpl;dur=([\d.]+), total;dur=([\d.]+)'
+)
+
+
+@pytest.fixture(autouse=True)
+def _empty_metrics(app):
+    with request_metrics_service._lock:
+        request_metrics_service._samples.clear()
+        request_metrics_service._totals.clear()
+        request_metrics_service._slow.clear()
+
+
+@contextmanager
+def _count_queries():
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "after_cursor_execute", _count)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "after_cursor_execute", _count)
+
+
+def _product():
+    product = Product(name="p", gender="M", season="summer", price=10, stock=1)
+    db.session.add(product)
+    db.session.commit()
+    url = f"/products/{product.id}"
+    db.session.remove()
+    return url
+
+
+def _endpoint(name):
+    return next(r for r in request_metrics_service.get_aggregates()["endpoints"] if r["endpoint"] == name)
+
+
+def test_server_timing_counts_request_queries(app):
+    url = _product()
+
+    with _count_queries() as statements:
+        resp = app.test_client().get(url)
+
+    assert resp.status_code == 200
+    m = _SERVER_TIMING_RE.search(resp.headers["Server-Timing"])
+    assert m is not None
+    assert int(m.group(1)) == len(statements) > 0
+    assert float(m.group(2)) > 0  # 商品頁有 render template
+
+    row = _endpoint("product.product_detail")
+    assert row["requests"] == 1 and row["queries_max"] == len(statements)
+
+
+def test_queries_outside_requests_are_not_counted(app):
+    # 背景 thread / 離線腳本沒有 request context：不統計也不會出錯
+    db.session.execute(text("SELECT 1"))
+    assert request_metrics_service._request_stats() is None
+
+    with app.test_request_context("/"):
+        db.session.execute(text("SELECT 1"))
+        db.session.execute(text("SELECT 2"))
+        assert request_metrics_service._request_stats()["queries"] == 2
+
+
+def test_slow_request_is_logged_and_counted(app, caplog):
+    app.config.update(SLOW_REQUEST_QUERIES=0, SLOW_REQUEST_MS=10000)
+    url = _product()
+
+    with caplog.at_level("WARNING"):
+        app.test_client().get(url)
+
+    assert _endpoint("product.product_detail")["slow"] == 1
+    assert any(f"slow request GET {url}" in r.getMessage() for r in caplog.records)
+
+
+def test_window_keeps_latest_samples(app):
+    app.config["REQUEST_METRICS_WINDOW"] = 2
+    client = app.test_client()
+    for _ in range(3):
+        client.get("/")
+
+    row = _endpoint("home.home")
+    assert row["requests"] == 3 and row["window"] == 2
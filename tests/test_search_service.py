@@ -0,0 +1,77 @@
+from app.database import db
+from app.models.chaos_config import ChaosConfig
+from app.models.product import Product
+from app.services import search_service
+
+
+def _product(name: str, description: str = "", active: bool = True) -> Product:
+    p = Product(name=name, gender="M", season="summer", price=10, stock=1,
+                description=description, active=active)
+    db.session.add(p)
+    db.session.commit()
+    return p
+
+
+def test_tokenize_mixes_words_and_cjk_bigrams():
+    assert search_service.tokenize("男生白色 T-shirt", for_query=True) == ["男生", "生白", "白色", "t", "shirt"]
+    # 建索引時另外放單字，單一個中文字也查得到
+    assert set(search_service.tokenize("白色")) == {"白色", "白", "色"}
+    assert search_service.tokenize("白", for_query=True) == ["白"]
+
+
+def test_all_query_tokens_must_match_and_name_ranks_higher(app):
+    in_name = _product("白色 T-shirt")
+    in_description = _product("上衣", description="白色 shirt")
+    _product("黑色 T-shirt")
+    search_service.build_index()
+
+    assert search_service.search_ids("白色 shirt") == [in_name.id, in_description.id]
+
+
+def test_deactivated_product_is_hidden_before_the_index_catches_up(app):
+    keep = _product("白色 T-shirt")
+    gone = _product("白色 polo")
+    search_service.build_index()
+
+    # 別的 worker 下架：這個 worker 的索引還有它
+    db.session.get(Product, gone.id).active = False
+    db.session.commit()
+
+    result = search_service.search_products("白色")
+    assert [p.id for p in result["items"]] == [keep.id]
+    assert result["total"] == 1
+    assert result["pages"] == 1
+
+
+def test_total_and_pages_count_only_active_products(app):
+    for i in range(5):
+        _product(f"白色 {i}", active=True)
+    search_service.build_index()
+    Product.query.filter(Product.name.in_(["白色 0", "白色 1"])).update({"active": False})
+    db.session.commit()
+
+    result = search_service.search_products("白色", per_page=2)
+    assert result["total"] == 3
+    assert result["pages"] == 2
+
+
+def test_refresh_rebuilds_when_another_worker_changed_products(app):
+    search_service.build_index()
+    assert search_service.refresh_if_stale() is False
+
+    # 別的 worker 新增商品：它只更新自己的索引 + 換版本戳記
+    p = _product("條紋襯衫")
+    ChaosConfig.set_value(search_service.VERSION_KEY, "other-worker")
+
+    assert search_service.search_ids("條紋") == []
+    assert search_service.refresh_if_stale() is True
+    assert search_service.search_ids("條紋") == [p.id]
+
+
+def test_local_index_update_does_not_trigger_own_rebuild(app):
+    search_service.build_index()
+    p = _product("條紋襯衫")
+    search_service.index_product(p)
+
+    assert search_service.search_ids("條紋") == [p.id]
+    assert search_service.refresh_if_stale() is False
@@ -0,0 +1,51 @@
+import pytest
+
+from app.database import db
+from app.models.order import Order
+from app.models.sales_rollup import SalesRollup
+from app.services import stats_service
+
+
+@pytest.fixture(autouse=True)
+def _empty_buffer(app):
+    # 其他測試（例如付款）留下的計數不要算進來
+    stats_service._buffer.clear()
+
+
+def _day_rollup():
+    db.session.expire_all()
+    return SalesRollup.query.filter_by(bucket_type=stats_service.DAY).one_or_none()
+
+
+def test_counts_are_buffered_until_flush(app):
+    for _ in range(3):
+        order = Order(user_id=1, total_amount=10, status="created")
+        db.session.add(order)
+        stats_service.record_order_created(order)
+        db.session.commit()
+
+    # 結帳的 transaction 不碰 rollup row
+    assert _day_rollup() is None
+
+    assert stats_service.flush() == 2  # hour + day 各一個 bucket
+    assert _day_rollup().order_count == 3
+
+
+def test_rolled_back_transaction_is_not_counted(app):
+    order = Order(user_id=1, total_amount=10, status="created")
+    db.session.add(order)
+    stats_service.record_order_created(order)
+    db.session.rollback()
+
+    stats_service.flush()
+    assert _day_rollup() is None
+
+
+def test_dashboard_includes_unflushed_counts(app):
+    order = Order(user_id=1, total_amount=10, status="created")
+    db.session.add(order)
+    stats_service.record_order_created(order)
+    db.session.commit()
+
+    dashboard = stats_service.get_dashboard()
+    assert dashboard["daily"][0]["order_count"] == 1
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database import db
+from app.models.user import User
+from app.services import user_service
+
+
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def _empty_index(app):
+    with user_service._idx_lock:
+        user_service._docs = {}
+        user_service._grams = {}
+        user_service._idx_built_at = None
+
+
+def _users(*usernames):
+    rows = [User(username=name, email=f"{name}@example.com", password_hash="x",
+                 created_at=T0 + timedelta(seconds=i))
+            for i, name in enumerate(usernames)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+def _names(page):
+    return [u.username for u in page["items"]]
+
+
+def test_created_at_defaults_to_utc(app):
+    before = datetime.utcnow().replace(microsecond=0)
+    user = User(username="alice", email="alice@example.com", password_hash="x")
+    db.session.add(user)
+    db.session.commit()
+
+    assert before <= user.created_at <= datetime.utcnow()
+
+
+def test_prefix_search_escapes_like_wildcards(app):
+    _users("a_b", "axb", "a%c", "abc")
+
+    assert _names(user_service.search_users("a_", mode="prefix")) == ["a_b"]
+    assert _names(user_service.search_users("a%", mode="prefix")) == ["a%c"]
+    assert _names(user_service.search_users("a", mode="prefix")) == ["abc", "a%c", "axb", "a_b"]
+
+
+def test_prefix_search_matches_email(app):
+    _users("alice", "bob")
+    db.session.query(User).filter_by(username="bob").update({"email": "alice.b@example.com"})
+    db.session.commit()
+
+    assert _names(user_service.search_users("alice", mode="prefix")) == ["bob", "alice"]
+
+
+def test_search_is_paginated_newest_first(app):
+    _users(*[f"user{i}" for i in range(5)])
+
+    first = user_service.search_users("user", mode="prefix", limit=2)
+    assert _names(first) == ["user4", "user3"]
+    second = user_service.search_users("user", mode="prefix", cursor=first["next_cursor"], limit=2)
+    assert _names(second) == ["user2", "user1"]
+    last = user_service.search_users("user", mode="prefix", cursor=second["next_cursor"], limit=2)
+    assert _names(last) == ["user0"]
+    assert last["next_cursor"] is None
+
+
+def test_contains_search_uses_ngram_index_when_enabled(app):
+    _users("alice", "malice", "bob", "a_lic")
+
+    app.config["USER_SEARCH_NGRAM_INDEX"] = False
+    like = user_service.search_users("lic", mode="contains")
+    app.config["USER_SEARCH_NGRAM_INDEX"] = True
+    indexed = user_service.search_users("lic", mode="contains")
+
+    assert _names(like) == _names(indexed) == ["a_lic", "malice", "alice"]
+    assert user_service._idx_built_at is not None
+
+    first = user_service.search_users("lic", mode="contains", limit=2)
+    second = user_service.search_users("lic", mode="contains", cursor=first["next_cursor"], limit=2)
+    assert _names(first) + _names(second) == ["a_lic", "malice", "alice"]